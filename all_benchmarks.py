@@ -0,0 +1,47 @@
+#!/usr/bin/env python3
+
+# Run micro-benchmarks (benchmarks/) and optionally compare with a saved baseline
+#
+#     ./all_benchmarks.py --save baseline.json           # run all and save results
+#     ./all_benchmarks.py --baseline baseline.json       # run all and flag regressions
+#     ./all_benchmarks.py ChecksumBenchmark RoutingTableBenchmark.lookup_trie
+
+import argparse
+import sys
+import benchmarks
+from router_base.benchmark import findBenchmarks, runBenchmarks, compareResults, formatComparison, formatNs, \
+    loadResults, saveResults, DEFAULT_REPEAT, DEFAULT_MIN_TIME, DEFAULT_THRESHOLD
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Run router_base micro-benchmarks")
+    parser.add_argument("names", nargs="*", help="benchmarks to run (<Class> or <Class>.<benchmark> prefixes)")
+    parser.add_argument("--save", metavar="FILE", help="save results as JSON")
+    parser.add_argument("--baseline", metavar="FILE", help="compare with results saved earlier")
+    parser.add_argument("--threshold", type=float, default=DEFAULT_THRESHOLD * 100,
+                        help="slowdown reported as regression, in percent (default: %(default)g)")
+    parser.add_argument("--repeat", type=int, default=DEFAULT_REPEAT, help="rounds per benchmark (default: %(default)d)")
+    parser.add_argument("--min-time", type=float, default=DEFAULT_MIN_TIME, help="seconds per round (default: %(default)g)")
+    parser.add_argument("--list", action="store_true", help="list benchmarks and exit")
+    args = parser.parse_args()
+
+    found = findBenchmarks(benchmarks, args.names)
+    if args.list or not found:
+        print("\n".join(name for name, cls, method in found) or "No benchmarks match", file=sys.stdout if found else sys.stderr)
+        sys.exit(0 if found else 1)
+
+    width = max(len(name) for name, cls, method in found)
+    def progress(name, result):
+        print("%-*s %12s   (median %s)" % (width, name, formatNs(result['ns']), formatNs(result['median'])), flush=True)
+
+    results = runBenchmarks(found, args.repeat, args.min_time, progress)
+    if args.save:
+        saveResults(results, args.save)
+
+    if args.baseline:
+        comparison = compareResults(loadResults(args.baseline), results, args.threshold / 100)
+        print()
+        print(formatComparison(comparison))
+        regressions = [row for row in comparison if row[4] == "regression"]
+        if regressions:
+            print("\n%d benchmark(s) slower than baseline by more than %g%%" % (len(regressions), args.threshold))
+            sys.exit(1)
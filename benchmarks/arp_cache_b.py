@@ -0,0 +1,56 @@
+# -*- Mode: python; py-indent-offset: 4; indent-tabs-mode: nil; coding: utf-8; -*-
+# Copyright 2019 Alex Afanasyev
+#
+# This program is free software: you can redistribute it and/or modify it under the terms of
+# the GNU General Public License as published by the Free Software Foundation, either version
+# 3 of the License, or (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful, but WITHOUT ANY WARRANTY;
+# without even the implied warranty of MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.
+# See the GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License along with this program.
+# If not, see <http://www.gnu.org/licenses/>.
+
+import itertools
+from router_base.arp_cache_base import ArpCacheBase
+from router_base.benchmark import Benchmark
+
+N_ENTRIES = 256
+
+class ArpCacheBenchmark(Benchmark):
+    '''
+    ArpCacheBase operations with N_ENTRIES entries in the cache
+    '''
+
+    def setUp(self):
+        self.cache = ArpCacheBase()
+        self.ips = [0x0a000000 + n for n in range(N_ENTRIES)]
+        for n, ip in enumerate(self.ips):
+            self.cache.insertArpEntry(n.to_bytes(6, 'big'), ip)
+
+    def tearDown(self):
+        self.cache.stop()
+
+    def bench_lookup_hit(self):
+        ips = itertools.cycle(self.ips)
+        lookup = self.cache.lookup
+        return lambda: lookup(next(ips))
+
+    def bench_lookup_miss(self):
+        ips = itertools.cycle([ip + 0x01000000 for ip in self.ips])
+        lookup = self.cache.lookup
+        return lambda: lookup(next(ips))
+
+    def bench_queue_request(self):
+        # packets for 16 unresolved destinations; steady state with the per-request limit
+        # reached drops the oldest packet each time
+        ips = itertools.cycle([0x0b000000 + n for n in range(16)])
+        packet = bytes(98)
+        queueRequest = self.cache.queueRequest
+        return lambda: queueRequest(next(ips), packet, "eth1")
+
+    def bench_insert(self):
+        entries = itertools.cycle([(n.to_bytes(6, 'big'), ip) for n, ip in enumerate(self.ips)])
+        insertArpEntry = self.cache.insertArpEntry
+        return lambda: insertArpEntry(*next(entries))
@@ -0,0 +1,59 @@
+# -*- Mode: python; py-indent-offset: 4; indent-tabs-mode: nil; coding: utf-8; -*-
+# Copyright 2019 Alex Afanasyev
+#
+# This program is free software: you can redistribute it and/or modify it under the terms of
+# the GNU General Public License as published by the Free Software Foundation, either version
+# 3 of the License, or (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful, but WITHOUT ANY WARRANTY;
+# without even the implied warranty of MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.
+# See the GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License along with this program.
+# If not, see <http://www.gnu.org/licenses/>.
+
+from router_base import headers
+from router_base.benchmark import Benchmark
+
+def rawPacket(name):
+    with open("tests/raw-packets/%s" % name, "rb") as f:
+        return f.read()
+
+ARP_FRAME = rawPacket("raw-arp-request.bin")
+ICMP_FRAME = rawPacket("raw-icmp-request.bin")
+
+class HeadersBenchmark(Benchmark):
+    '''
+    Decoding and encoding of each header class (from an ARP request and ICMP echo request)
+    '''
+
+    def bench_ether_decode(self):
+        return lambda: headers.EtherHeader(ICMP_FRAME)
+
+    def bench_ether_encode(self):
+        header = headers.EtherHeader(ICMP_FRAME)
+        return header.encode
+
+    def bench_ip_decode(self):
+        packet = ICMP_FRAME[14:]
+        return lambda: headers.IpHeader(packet)
+
+    def bench_ip_encode(self):
+        header = headers.IpHeader(ICMP_FRAME[14:])
+        return header.encode
+
+    def bench_arp_decode(self):
+        packet = ARP_FRAME[14:]
+        return lambda: headers.ArpHeader(packet)
+
+    def bench_arp_encode(self):
+        header = headers.ArpHeader(ARP_FRAME[14:])
+        return header.encode
+
+    def bench_icmp_decode(self):
+        packet = ICMP_FRAME[34:]
+        return lambda: headers.IcmpHeader(packet)
+
+    def bench_icmp_encode(self):
+        header = headers.IcmpHeader(ICMP_FRAME[34:])
+        return header.encode
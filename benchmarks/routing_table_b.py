@@ -0,0 +1,73 @@
+# -*- Mode: python; py-indent-offset: 4; indent-tabs-mode: nil; coding: utf-8; -*-
+# Copyright 2019 Alex Afanasyev
+#
+# This program is free software: you can redistribute it and/or modify it under the terms of
+# the GNU General Public License as published by the Free Software Foundation, either version
+# 3 of the License, or (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful, but WITHOUT ANY WARRANTY;
+# without even the implied warranty of MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.
+# See the GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License along with this program.
+# If not, see <http://www.gnu.org/licenses/>.
+
+import itertools
+import random
+from router_base.benchmark import Benchmark
+from router_base.routing_table_base import RoutingTableEntry
+from ridikkulus_routing_table import RoutingTable
+
+SIZES = (16, 1024, 65536)
+
+def makeTable(engine, size, seed=1):
+    '''
+    RoutingTable with \p size random prefixes (lengths 8-32, mostly /24) and a default route,
+    and a list of random addresses to look up (1/4 of them inside the table's prefixes)
+    '''
+    rnd = random.Random(seed)
+    table = RoutingTable(engine=engine, cacheSize=0)
+    entries = [RoutingTableEntry(0, "10.0.1.1", 0, "eth0")]
+    prefixes = []
+    for i in range(size - 1):
+        length = rnd.choice([8, 16, 20, 22, 24, 24, 24, 24, 28, 32])
+        mask = (0xffffffff << (32 - length)) & 0xffffffff
+        dest = rnd.getrandbits(32) & mask
+        prefixes.append((dest, length))
+        entries.append(RoutingTableEntry(dest, "10.0.1.1", mask, "eth%d" % (i % 4 + 1)))
+    table.addEntries(entries)
+    addrs = []
+    for i in range(4096):
+        if i % 4 == 0:
+            dest, length = rnd.choice(prefixes)
+            addrs.append(dest | rnd.getrandbits(32 - length))
+        else:
+            addrs.append(rnd.getrandbits(32))
+    return table, addrs
+
+def lookupBenchmark(engine, size):
+    def bench(self):
+        table, addrs = makeTable(engine, size)
+        addrs = itertools.cycle(addrs)
+        lookup = table.lookup
+        return lambda: lookup(next(addrs))
+    return bench
+
+class RoutingTableBenchmark(Benchmark):
+    '''
+    Longest prefix match with each engine at several table sizes (the linear engine only for
+    small tables)
+    '''
+
+    def bench_lookup_cached(self):
+        table, addrs = makeTable("trie", 1024)
+        table.setCacheSize(1024)
+        addrs = itertools.cycle(addrs[:256])
+        lookup = table.lookup
+        return lambda: lookup(next(addrs))
+
+# bench_lookup_<engine>_<size>, without the route cache
+for engine in ("list", "trie", "dir-24-8"):
+    for size in SIZES:
+        if engine != "list" or size <= 1024:
+            setattr(RoutingTableBenchmark, "bench_lookup_%s_%d" % (engine.replace("-", ""), size), lookupBenchmark(engine, size))
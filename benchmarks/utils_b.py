@@ -0,0 +1,29 @@
+# -*- Mode: python; py-indent-offset: 4; indent-tabs-mode: nil; coding: utf-8; -*-
+# Copyright 2019 Alex Afanasyev
+#
+# This program is free software: you can redistribute it and/or modify it under the terms of
+# the GNU General Public License as published by the Free Software Foundation, either version
+# 3 of the License, or (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful, but WITHOUT ANY WARRANTY;
+# without even the implied warranty of MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.
+# See the GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License along with this program.
+# If not, see <http://www.gnu.org/licenses/>.
+
+from router_base.utils import checksum, update_checksum
+from router_base.benchmark import Benchmark
+
+class ChecksumBenchmark(Benchmark):
+
+    def bench_checksum_20(self):
+        data = bytes(range(20))
+        return lambda: checksum(data)
+
+    def bench_checksum_1500(self):
+        data = bytes(range(250)) * 6
+        return lambda: checksum(data)
+
+    def bench_update_checksum(self):
+        return lambda: update_checksum(0x1234, 0x4001, 0x3f01)
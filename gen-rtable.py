@@ -0,0 +1,40 @@
+#!/usr/bin/env python3
+# -*- Mode: python; py-indent-offset: 4; indent-tabs-mode: nil; coding: utf-8; -*-
+# Copyright 2017 Alex Afanasyev (UCLA)
+#
+# This program is free software: you can redistribute it and/or modify it under the terms of
+# the GNU General Public License as published by the Free Software Foundation, either version
+# 3 of the License, or (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful, but WITHOUT ANY WARRANTY;
+# without even the implied warranty of MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.
+# See the GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License along with this program.
+# If not, see <http://www.gnu.org/licenses/>.
+
+# Generate synthetic routing table in RTABLE format, with internet-like prefix lengths
+#
+#     ./gen-rtable.py 100000 RTABLE.100k
+#     ./gen-rtable.py --seed 7 --ifaces sw0-eth1,sw0-eth2 1000 RTABLE.1k
+
+import argparse
+import sys
+
+from router_base.rtable_gen import generateRoutes, writeRtable, DEFAULT_IFACES
+
+def main(argv):
+    parser = argparse.ArgumentParser(description="Generate synthetic routing table")
+    parser.add_argument("count", type=int, help="number of routes (including the default route)")
+    parser.add_argument("output", help="output file")
+    parser.add_argument("--seed", type=int, default=0, help="random seed (default: %(default)d)")
+    parser.add_argument("--ifaces", default=",".join(DEFAULT_IFACES), help="comma-separated interface names (default: %(default)s)")
+    parser.add_argument("--no-default", action="store_true", help="do not include the default route")
+    args = parser.parse_args(argv[1:])
+
+    routes = generateRoutes(args.count, args.seed, args.ifaces.split(","), not args.no_default)
+    writeRtable(routes, args.output)
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main(sys.argv))
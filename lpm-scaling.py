@@ -0,0 +1,59 @@
+#!/usr/bin/env python3
+# -*- Mode: python; py-indent-offset: 4; indent-tabs-mode: nil; coding: utf-8; -*-
+# Copyright 2017 Alex Afanasyev (UCLA)
+#
+# This program is free software: you can redistribute it and/or modify it under the terms of
+# the GNU General Public License as published by the Free Software Foundation, either version
+# 3 of the License, or (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful, but WITHOUT ANY WARRANTY;
+# without even the implied warranty of MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.
+# See the GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License along with this program.
+# If not, see <http://www.gnu.org/licenses/>.
+
+# Measure load time, memory and lookup rate of the routing table as it grows, and cross-check
+# every timed lookup against an ipaddress-based reference implementation
+#
+#     ./lpm-scaling.py                                    # 1k, 10k, 100k, 1M prefixes, trie
+#     ./lpm-scaling.py --engine dir-24-8 --sizes 1000,100000 --lookups 10000
+
+import argparse
+import json
+import os
+import sys
+import tempfile
+
+from router_base.rtable_gen import generateRoutes, writeRtable
+from router_base.lpm_check import measure, formatRow, HEADER
+from ridikkulus_routing_table import RoutingTable
+
+def main(argv):
+    parser = argparse.ArgumentParser(description="Routing table scaling and correctness check")
+    parser.add_argument("--sizes", default="1000,10000,100000,1000000", help="table sizes (default: %(default)s)")
+    parser.add_argument("--engine", default="trie", help="longest prefix match engine (default: %(default)s)")
+    parser.add_argument("--lookups", type=int, default=100000, help="lookups to time and cross-check per size (default: %(default)d)")
+    parser.add_argument("--seed", type=int, default=0, help="random seed (default: %(default)d)")
+    parser.add_argument("--no-memory", action="store_true", help="skip memory measurement (second load with tracemalloc)")
+    parser.add_argument("--json", action="store_true", help="print results as JSON")
+    args = parser.parse_args(argv[1:])
+
+    rows = []
+    if not args.json:
+        print(HEADER)
+    with tempfile.TemporaryDirectory() as tmp:
+        for size in (int(size) for size in args.sizes.split(",")):
+            fileName = os.path.join(tmp, "RTABLE.%d" % size)
+            writeRtable(generateRoutes(size, args.seed), fileName)
+            row = measure(RoutingTable, fileName, args.engine, args.lookups, args.seed, not args.no_memory)
+            rows.append(row)
+            if not args.json:
+                print(formatRow(row), flush=True)
+
+    if args.json:
+        print(json.dumps({'engine': args.engine, 'results': rows}, indent=2))
+    return 1 if any(row['mismatches'] for row in rows) else 0
+
+if __name__ == '__main__':
+    sys.exit(main(sys.argv))
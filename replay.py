@@ -0,0 +1,61 @@
+#!/usr/bin/env python3
+# -*- Mode: python; py-indent-offset: 4; indent-tabs-mode: nil; coding: utf-8; -*-
+# Copyright 2017 Alex Afanasyev (UCLA)
+#
+# This program is free software: you can redistribute it and/or modify it under the terms of
+# the GNU General Public License as published by the Free Software Foundation, either version
+# 3 of the License, or (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful, but WITHOUT ANY WARRANTY;
+# without even the implied warranty of MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.
+# See the GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License along with this program.
+# If not, see <http://www.gnu.org/licenses/>.
+
+
+# Replay captured traffic (pcap, pcapng, or raw frame files) through the router at maximum
+# rate, without Mininet or POX.  Packets sent by the router are captured by a stub pox.
+#
+#     ./replay.py --iface sw0-eth3 tests/raw-packets/*.bin
+#     ./replay.py --iface sw0-eth1 --repeat 1000 --json trace.pcapng
+
+import argparse
+import importlib
+import json
+import sys
+
+from router_base.properties import loadProperties
+from router_base.pcap import readFrames
+from router_base.replay import replay, formatReport
+
+def main(argv):
+    parser = argparse.ArgumentParser(description="Replay packet captures through the router")
+    parser.add_argument("files", nargs="+", help="pcap/pcapng files or raw Ethernet frames")
+    parser.add_argument("--iface", default="sw0-eth3", help="interface the frames are received on (default: %(default)s)")
+    parser.add_argument("--repeat", type=int, default=1, help="number of passes over the frames")
+    parser.add_argument("--config", default="router.config", help="router configuration (default: %(default)s)")
+    parser.add_argument("--router", default="ridikkulus_router:SimpleRouter", help="router class (default: %(default)s)")
+    parser.add_argument("--json", action="store_true", help="print report as JSON")
+    args = parser.parse_args(argv[1:])
+
+    frames = []
+    for fileName in args.files:
+        frames.extend(readFrames(fileName))
+
+    moduleName, className = args.router.split(":")
+    router = getattr(importlib.import_module(moduleName), className)()
+    try:
+        router.configure(loadProperties(args.config))
+        report = replay(router, frames, args.iface, args.repeat)
+    finally:
+        router.arpCache.stop()
+
+    if args.json:
+        print(json.dumps(report, indent=2))
+    else:
+        print(formatReport(report))
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main(sys.argv))
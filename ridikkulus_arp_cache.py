@@ -52,7 +52,9 @@ class ArpCache(ArpCacheBase):
         '''
         IMPLEMENT THIS METHOD
 
-        This method is automatically called every second
+        This method is automatically called (by ArpCacheBase.tick) about a second
+        after the request was queued or last sent, for as long as the request stays
+        in the queue
 
         This method should handle sending ARP requests if necessary.
         The high-level logic:
@@ -69,21 +71,3 @@ class ArpCache(ArpCacheBase):
         '''
 
         pass
-
-    def periodicCheckArpRequestsAndCacheEntries(self):
-        '''
-        This method is called every second. For each request sent out,
-        it calls out a method you need to implement to check whether
-        to re-send or remove the request, and then cleans up no longer valid
-        entries in the ARP cache.
-        '''
-        for request in self.arpRequests:
-            self.resendOrRemoveQueuedRequest(request)
-
-        entriesToRemove = []
-        for entry in self.cacheEntries:
-            if not entry.isValid:
-                entriesToRemove.append(entry)
-
-        for entry in entriesToRemove:
-            self.cacheEntries.remove(entry)
@@ -13,7 +13,7 @@
 # You should have received a copy of the GNU General Public License along with this program.
 # If not, see <http://www.gnu.org/licenses/>.
 
-from router_base import SimpleRouterBase, PoxConnectorApp
+from router_base import SimpleRouterBase, PoxConnectorApp, AsyncConnectorApp
 
 from ridikkulus_routing_table import RoutingTable
 from ridikkulus_arp_cache import ArpCache
@@ -23,8 +23,10 @@ from router_base.mac_address import MacAddress
 from router_base.ip_address import IpAddress
 from router_base.interface import Interface
 from router_base.utils import checksum, print_hdrs
+from router_base.stats import DROP_UNKNOWN_IFACE, DROP_UNSUPPORTED, DROP_BAD_CHECKSUM, DROP_TTL_EXPIRED, DROP_NO_ROUTE
 
 import sys
+import logging
 
 class SimpleRouter(SimpleRouterBase):
 
@@ -42,6 +44,7 @@ class SimpleRouter(SimpleRouterBase):
         iface = self.findIfaceByName(inIface)
         if not iface:
             print("Received packet, but interface is unknown, ignoring", file=sys.stderr)
+            self.countDrop(DROP_UNKNOWN_IFACE)
             return
 
         # all incoming packets are guaranteed to be Ethernet, so unconditionally process them as Ethernet
@@ -55,8 +58,13 @@ class SimpleRouter(SimpleRouterBase):
 
         \p etherPacket packet buffer that starts with the Ethernet header
         \p iface instance of Interface class (it has .name, .mac, and .ip members)
+
+        The packet is wrapped into memoryview, so slicing it for the next layer
+        (and decoding headers from it) does not copy the frame.  Use bytes(...) on
+        a view only when a copy is actually needed.
         '''
 
+        etherPacket = memoryview(etherPacket)
         etherHeader = EtherHeader()
         offset = etherHeader.decode(etherPacket)
         restOfPacket = etherPacket[offset:]
@@ -69,9 +77,9 @@ class SimpleRouter(SimpleRouterBase):
             self.processArp(restOfPacket, etherHeader, iface)
         elif etherHeader.type == 0x0800:
             self.processIp(restOfPacket, iface)
-        else
+        else:
             # ignore packets that neither ARP nor IP
-            pass
+            self.countDrop(DROP_UNSUPPORTED)
 
     def processArp(self, arpPacket, origEtherHeader, iface):
         '''
@@ -90,6 +98,10 @@ class SimpleRouter(SimpleRouterBase):
           the request was received:  `aprPacket.tip == iface.ip`.  If no match, then the request is not for 
           you and should be ignored.
         - if it is response, then you should decode and call self.arpCache.handleIncomingArpReply()
+
+        Replies (and other packets the router originates: ARP requests, echo replies, ICMP errors)
+        can be generated from pre-encoded templates of the interface, e.g.,
+        `iface.templates.arpReply(arpHeader.sha, arpHeader.sip)` (see router_base/packet_templates.py)
         '''
         pass
 
@@ -104,7 +116,8 @@ class SimpleRouter(SimpleRouterBase):
         What needs to be implemented here:
         - decode IP header
         - check if IP packet to ONE OF ROUTER'S IP addresses (can be do any interface that the router
-          has and all of such packets should be treated equally).  You can use self.findIfaceByIp() method.
+          has and all of such packets should be treated equally).  You can use self.findIfaceByIp() method
+          or check `int(ipHeader.dst) in self.localIps` (a single set lookup).
           If no interface found, then this packet is for someone else and you should call self.processIpToForward()
         - If it is for the router, then call self.processIpToSelf
         '''
@@ -165,6 +178,8 @@ class SimpleRouter(SimpleRouterBase):
         First, check if checksum is valid and TTL is enough to forward.  You need to report errors
         (properly respond with ICMP correct) to the source: need to create new ICMP header, new IP header,
         new Ethernet header, etc.  Don't forget to calculate proper checksums for ICMP and IP headers.
+        Count dropped packets with self.countDrop(DROP_BAD_CHECKSUM), self.countDrop(DROP_TTL_EXPIRED),
+        self.countDrop(DROP_NO_ROUTE), ... (see router_base/stats.py), so they show up in `show-arp.py stats`.
 
         entry = self.routingTable.lookup()
 
@@ -205,5 +220,11 @@ class SimpleRouter(SimpleRouterBase):
 
 if __name__ == '__main__':
     rtr = SimpleRouter()
-    app = PoxConnectorApp(rtr)
+    # --async: talk to the controller over sockets (SimpleRouter.Endpoint) instead of Ice
+    if "--async" in sys.argv or PoxConnectorApp is None:
+        if "--async" not in sys.argv:
+            logging.getLogger("riddikulus.connector").warning("Ice is not installed, falling back to AsyncConnectorApp")
+        app = AsyncConnectorApp(rtr)
+    else:
+        app = PoxConnectorApp(rtr)
     app.main(sys.argv, "router.config")
@@ -19,18 +19,6 @@ class RoutingTable(RoutingTableBase):
     def lookup(self, ip):
         """Lookup entry in the routing table (longest prefix match)"""
 
-        # Hints:
-        # - Iterate over entries
-        # for entry in self.entries:
-        #    ...
-        #
-        # - To get IP address as integer
-        #   int(ip)
-        #   int(entry.dest)
-        #   int(entry.mask)
-        #   int(entry.gw)
-        
-        ##########################
-        ## TODO: IMPLEMENT THIS ##
-        ##########################
-        raise RuntimeError("NOT IMPLEMENTED YET")
+        # Prefix index (router_base/lpm.py) is built from self.entries when the table is
+        # loaded and updated by addEntry, so the lookup does not depend on the table size.
+        return self.longestPrefixMatch(ip)
@@ -12,7 +12,17 @@
 # You should have received a copy of the GNU General Public License along with this program.
 # If not, see <http://www.gnu.org/licenses/>.
 
-from .pox_connector_app import PoxConnectorApp
+import logging
+
+try:
+    from .pox_connector_app import PoxConnectorApp
+except ModuleNotFoundError as e:
+    if e.name != "Ice":
+        raise
+    # Ice is not installed, only AsyncConnectorApp is available
+    logging.getLogger("riddikulus.connector").info("Ice is not installed, PoxConnectorApp is not available")
+    PoxConnectorApp = None
+from .async_connector import AsyncConnectorApp
 
 from .simple_router_base import SimpleRouterBase
 from .routing_table_base import RoutingTableBase, RoutingTableEntry
@@ -15,11 +15,41 @@
 import time
 import io
 import threading
+from types import MappingProxyType
 from .mac_address import MacAddress
 from .ip_address import IpAddress
+from .timer_wheel import TimerWheel
 
 SR_ARPCACHE_TO = 30
 
+# Interval between checks of a queued ARP request (resendOrRemoveQueuedRequest calls)
+ARP_REQUEST_INTERVAL = 1
+
+# Default granularity of ARP timers, in seconds
+ARP_TIMER_RESOLUTION = 0.1
+
+# What to do with a packet that would exceed a queue limit
+DROP_OLDEST = "drop-oldest"   # make room by dropping the oldest queued packet(s)/request
+DROP_NEWEST = "drop-newest"   # drop the packet being queued
+
+class QueueLimit:
+    '''
+    Limit on queued packets awaiting ARP resolution (0 means unlimited)
+    '''
+    def __init__(self, limit, policy=DROP_OLDEST):
+        if policy not in (DROP_OLDEST, DROP_NEWEST):
+            raise RuntimeError("Unknown drop policy `%s` (expected %s or %s)" % (policy, DROP_OLDEST, DROP_NEWEST))
+        self.limit = limit
+        self.policy = policy
+
+    def __str__(self):
+        return "%d (%s)" % (self.limit, self.policy)
+
+# Default limits
+ARP_MAX_PACKETS_PER_REQUEST = QueueLimit(64, DROP_OLDEST)
+ARP_MAX_QUEUED_BYTES = QueueLimit(4 * 1024 * 1024, DROP_OLDEST)
+ARP_MAX_REQUESTS = QueueLimit(1024, DROP_NEWEST)
+
 class ArpRequest:
     def __init__(self, ip, iface):
       self.ip = ip
@@ -27,21 +57,59 @@ class ArpRequest:
       self.nTimesSent = 0
       self.packets = []
 
+      # total size of self.packets (managed by ArpCacheBase)
+      self.queuedBytes = 0
+
       # Last time this ARP request was sent. You should update this. If
       # the ARP request was never sent, self.timeSent == None
       self.timeSent = time.time()
 
+      # retransmission timer (managed by ArpCacheBase)
+      self.timer = None
+
 class ArpEntry:
     def __init__(self, mac, ip):
         self.mac = MacAddress(mac)
         self.ip = IpAddress(ip)
         self.timeAdded = time.time()
         self.isValid = True
-        
+
+        # expiration timer (managed by ArpCacheBase)
+        self.timer = None
+
 class ArpCacheBase:
-    def __init__(self):
-        self.cacheEntries = []
-        self.arpRequests = []  
+    # cacheEntries: read-only view of the mapping of integer IP -> ArpEntry
+    # arpRequests:  dict of integer IP -> ArpRequest (in the order requests were queued)
+    #
+    # Writers (holding the mutex) update the entries dict in place; a single dict read or
+    # write is atomic, so lookup() reads it through cacheEntries without taking the mutex.
+    # The mutex is only needed for cache updates and the request queue.
+    #
+    # Instead of sweeping all entries and requests every second, each cache entry's
+    # expiration and each request's next check are registered in a timer wheel; the
+    # ticker only handles items that are actually due.
+    #
+    # Packets waiting for ARP resolution are bounded by the number of packets per
+    # request, total bytes across all requests, and the number of outstanding requests
+    # (see setQueueLimits).  Dropped packets are counted in droppedPackets/droppedBytes,
+    # packets discarded with a request that was never answered in unresolvedPackets.
+    # Results of lookup() are counted in hits/misses (without the mutex).
+
+    def __init__(self, resolution=ARP_TIMER_RESOLUTION):
+        self.__entries = {}
+        self.cacheEntries = MappingProxyType(self.__entries)
+        self.arpRequests = {}
+        self.timers = TimerWheel(resolution)
+
+        self.maxPacketsPerRequest = ARP_MAX_PACKETS_PER_REQUEST
+        self.maxQueuedBytes = ARP_MAX_QUEUED_BYTES
+        self.maxRequests = ARP_MAX_REQUESTS
+        self.queuedBytes = 0
+        self.droppedPackets = 0
+        self.droppedBytes = 0
+        self.unresolvedPackets = 0
+        self.hits = 0
+        self.misses = 0
 
         self.shouldStop = False
 
@@ -53,29 +121,70 @@ class ArpCacheBase:
         self.shouldStop = True
         self.tickerThread.join()
 
+    def setTimerResolution(self, resolution):
+        '''
+        Set granularity (in seconds, can be below one second) of cache entry expiration
+        and request retransmission timers
+        '''
+        self.mutex.acquire()
+        try:
+            self.timers.setResolution(resolution)
+        finally:
+            self.mutex.release()
+
+    def setQueueLimits(self, maxPacketsPerRequest=None, maxQueuedBytes=None, maxRequests=None):
+        '''
+        Set limits (QueueLimit instances) on packets queued while waiting for ARP
+        resolution.  Limits that are None are left unchanged.
+        '''
+        self.mutex.acquire()
+        if maxPacketsPerRequest is not None:
+            self.maxPacketsPerRequest = maxPacketsPerRequest
+        if maxQueuedBytes is not None:
+            self.maxQueuedBytes = maxQueuedBytes
+        if maxRequests is not None:
+            self.maxRequests = maxRequests
+        self.mutex.release()
+
+    def getQueueMemory(self):
+        '''
+        Report current usage of the ARP request queue: number of requests, number of
+        queued packets, total size of queued packets, and drop counters
+        '''
+        self.mutex.acquire()
+        usage = {
+            'requests': len(self.arpRequests),
+            'packets': sum(len(request.packets) for request in self.arpRequests.values()),
+            'bytes': self.queuedBytes,
+            'droppedPackets': self.droppedPackets,
+            'droppedBytes': self.droppedBytes,
+            }
+        self.mutex.release()
+        return usage
+
     def reset(self):
         self.mutex.acquire()
-        self.cacheEntries = []
-        self.arpRequests = []  
+        self.__entries.clear()
+        self.arpRequests = {}
+        self.queuedBytes = 0
+        self.timers.clear()
         self.mutex.release()
         
     def lookup(self, ip):
         '''
         Checks if an IP->MAC mapping is in the cache. IP is in network byte order.
         You must free the returned structure if it is not NULL.
-        '''
 
-        self.mutex.acquire()
+        Does not block: reads the cache entries without the mutex.
+        '''
 
-        found = None
-        for entry in self.cacheEntries:
-            if entry.isValid and entry.ip == ip:
-                found = entry
-                break
+        found = self.cacheEntries.get(int(ip))
+        if found is not None and found.isValid:
+            self.hits += 1
+            return found
 
-        self.mutex.release()
-
-        return found
+        self.misses += 1
+        return None
     
     def queueRequest(self, ip, packet, iface):
         '''
@@ -87,41 +196,109 @@ class ArpCacheBase:
         A pointer to the ARP request is returned; it should not be freed. The caller
         can remove the ARP request from the queue by calling sr_arpreq_destroy.
 
-        :returns True if request for this IP already existed
+        The queue is subject to limits set by setQueueLimits: depending on the limit's
+        policy either the packet is dropped, or the oldest packets (or the oldest
+        request) are dropped to make room for it.
+
+        :returns True if request for this IP already existed, or if the request
+                 could not be created because of the maxRequests limit or the packet
+                 was dropped by the other limits (in all cases no new ARP request
+                 should be sent)
         '''
 
         self.mutex.acquire()
+        try:
+            key = int(ip)
+            size = len(packet)
+            requestExisted = False
+            queuedRequest = self.arpRequests.get(key)
+            if queuedRequest is None:
+                limit = self.maxRequests
+                if limit.limit and len(self.arpRequests) >= limit.limit:
+                    if limit.policy == DROP_NEWEST:
+                        self.__countDrop(size)
+                        return True
+                    while len(self.arpRequests) >= limit.limit:
+                        self.__dropRequest(next(iter(self.arpRequests.values())))
 
-        queuedRequest = None
-        requestExisted = False
-        for request in self.arpRequests:
-            if request.ip == ip:
-                queuedRequest = request
-                break
-        if queuedRequest is None:
-            queuedRequest = ArpRequest(ip, iface)
-            self.arpRequests.append(queuedRequest)
-        else:
-            requestExisted = True
-
-        queuedRequest.packets.append(packet)
-        
-        self.mutex.release()
+                queuedRequest = ArpRequest(ip, iface)
+                self.arpRequests[key] = queuedRequest
+                queuedRequest.timer = self.timers.schedule(queuedRequest.timeSent + ARP_REQUEST_INTERVAL, queuedRequest)
+            else:
+                requestExisted = True
+
+            limit = self.maxPacketsPerRequest
+            if limit.limit and len(queuedRequest.packets) >= limit.limit:
+                if limit.policy == DROP_NEWEST:
+                    return self.__rejectPacket(size, queuedRequest, requestExisted)
+                while len(queuedRequest.packets) >= limit.limit:
+                    self.__dropPacket(queuedRequest)
+
+            limit = self.maxQueuedBytes
+            if limit.limit and self.queuedBytes + size > limit.limit:
+                if limit.policy == DROP_NEWEST or size > limit.limit:
+                    return self.__rejectPacket(size, queuedRequest, requestExisted)
+                for request in list(self.arpRequests.values()):
+                    while request.packets and self.queuedBytes + size > limit.limit:
+                        self.__dropPacket(request)
+                    if self.queuedBytes + size <= limit.limit:
+                        break
+
+            queuedRequest.packets.append(packet)
+            queuedRequest.queuedBytes += size
+            self.queuedBytes += size
+            return requestExisted
+        finally:
+            self.mutex.release()
+
+    def __rejectPacket(self, size, request, requestExisted):
+        # packet is dropped; a request created just for it is not kept without packets
+        self.__countDrop(size)
+        if not requestExisted:
+            self.__removeRequest(request)
+            return True
         return requestExisted
+
+    def __countDrop(self, size):
+        self.droppedPackets += 1
+        self.droppedBytes += size
+
+    def __dropPacket(self, request):
+        size = len(request.packets.pop(0))
+        request.queuedBytes -= size
+        self.queuedBytes -= size
+        self.__countDrop(size)
+
+    def __dropRequest(self, request):
+        for packet in request.packets:
+            self.__countDrop(len(packet))
+        self.__removeRequest(request)
     
     def removeRequest(self, arpRequest):
         '''
         Frees all memory associated with this arp request entry. If this arp request
         entry is on the arp request queue, it is removed from the queue.
+
+        If there is no valid cache entry for the request's IP (the request was not
+        answered), its queued packets are counted in unresolvedPackets.
         '''
 
         self.mutex.acquire()
         try:
-            self.arpRequests.remove(arpRequest)
-        except:
-            pass
+            key = int(arpRequest.ip)
+            entry = self.cacheEntries.get(key)
+            if self.arpRequests.get(key) is arpRequest and (entry is None or not entry.isValid):
+                self.unresolvedPackets += len(arpRequest.packets)
+            self.__removeRequest(arpRequest)
+        finally:
+            self.mutex.release()
 
-        self.mutex.release()
+    def __removeRequest(self, arpRequest):
+        key = int(arpRequest.ip)
+        if self.arpRequests.get(key) is arpRequest:
+            del self.arpRequests[key]
+            self.queuedBytes -= arpRequest.queuedBytes
+        self.timers.cancel(arpRequest.timer)
 
     def insertArpEntry(self, mac, ip):
         '''
@@ -129,65 +306,100 @@ class ArpCacheBase:
         
         1) Looks up this IP in the request queue. If it is found, returns a pointer
            to the ArpRequest with this IP. Otherwise, returns None.
-        2) Inserts this IP to MAC mapping in the cache, and marks it valid.
+        2) Inserts this IP to MAC mapping in the cache (replacing the existing entry for
+           this IP, if any), and marks it valid.
         '''
 
         self.mutex.acquire()
 
+        key = int(ip)
         entry = ArpEntry(mac, ip)
-        self.cacheEntries.append(entry)
+        oldEntry = self.__entries.get(key)
+        if oldEntry is not None:
+            self.timers.cancel(oldEntry.timer)
+        self.__entries[key] = entry
+        entry.timer = self.timers.schedule(entry.timeAdded + SR_ARPCACHE_TO, entry)
+        foundRequest = self.arpRequests.get(key)
 
-        foundRequest = None
-        for request in self.arpRequests:
-            if request.ip == ip:
-                foundRequest = request
-                break
-        
         self.mutex.release()
 
         return foundRequest
-        
+
+    def removeEntries(self, entries):
+        '''
+        Remove \p entries (iterable of ArpEntry) from the ARP cache
+        '''
+        self.mutex.acquire()
+
+        for entry in entries:
+            key = int(entry.ip)
+            if self.__entries.get(key) is entry:
+                del self.__entries[key]
+                self.timers.cancel(entry.timer)
+
+        self.mutex.release()
+
     def clear(self):
         '''
         Clear all entries in ARP cache and requests.
         '''
         self.mutex.acquire()
-        self.cacheEntries = []
-        self.arpRequests = []
+        self.__entries.clear()
+        self.arpRequests = {}
+        self.queuedBytes = 0
+        self.timers.clear()
         self.mutex.release()
 
     def __str__(self):
-        self.mutex.acquire()
         f = io.StringIO()
         print(f"{'MAC':20} {'IP':18} {'AGE':20}  {'Is Valid'}", file=f)
         print("----------------------------------------------------------------------", file=f)
 
         now = time.time()
-        for entry in self.cacheEntries:
+        for entry in list(self.cacheEntries.values()): # copied, entries can change meanwhile
             print(f"{str(entry.mac):20} {str(entry.ip):18} {now - entry.timeAdded:12.2f} seconds  {entry.isValid}", file=f)
-      
-        self.mutex.release()
 
         return f.getvalue()
       
-    def __ticker(self):
+    def tick(self, now=None):
         '''
-        Thread which sweeps through the cache and invalidates entries that were added
-        more than SR_ARPCACHE_TO seconds ago.
+        Expire cache entries and check queued requests whose timers are due.
+
+        For each due request, calls resendOrRemoveQueuedRequest (to be implemented by
+        the subclass); if the request is still queued afterwards, it is checked again
+        ARP_REQUEST_INTERVAL after its timeSent.
         '''
+        if now is None:
+            now = time.time()
 
-        while not self.shouldStop:
-            time.sleep(1)
+        self.mutex.acquire()
+        try:
+            expired = []
+            for item in self.timers.advance(now):
+                if isinstance(item, ArpEntry):
+                    item.isValid = False
+                    expired.append(item)
+                    continue
 
-            self.mutex.acquire()
+                key = int(item.ip)
+                if self.arpRequests.get(key) is not item:
+                    continue
+                # calling the "implementation" method
+                self.resendOrRemoveQueuedRequest(item)
+                if self.arpRequests.get(key) is item:
+                    nextCheck = (item.timeSent or now) + ARP_REQUEST_INTERVAL
+                    item.timer = self.timers.schedule(max(nextCheck, now + self.timers.resolution), item)
 
-            now = time.time()
-            for entry in self.cacheEntries:
-                if entry.isValid and (now - entry.timeAdded > SR_ARPCACHE_TO):
-                    entry.isValid = False
+            if expired:
+                self.removeEntries(expired)
+        finally:
+            self.mutex.release()
 
-            try:
-                # calling the "implementation" method
-                self.periodicCheckArpRequestsAndCacheEntries()
-            finally:
-                self.mutex.release()
+    def __ticker(self):
+        '''
+        Thread which wakes up every timer resolution period to process due timers
+        '''
+
+        while not self.shouldStop:
+            time.sleep(self.timers.resolution)
+            self.tick()
@@ -0,0 +1,226 @@
+# -*- Mode: python; py-indent-offset: 4; indent-tabs-mode: nil; coding: utf-8; -*-
+# Copyright 2021 Alex Afanasyev
+#
+# This program is free software: you can redistribute it and/or modify it under the terms of
+# the GNU General Public License as published by the Free Software Foundation, either version
+# 3 of the License, or (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful, but WITHOUT ANY WARRANTY;
+# without even the implied warranty of MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.
+# See the GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License along with this program.
+# If not, see <http://www.gnu.org/licenses/>.
+
+# asyncio-based connector: alternative to PoxConnectorApp that talks to the controller
+# over UDP or Unix-domain sockets (see socket_protocol.py) and runs without the Ice
+# runtime.  Packet handling, ARP timers and the keepalive all run on one event loop.
+#
+# The controller endpoint is configured with SimpleRouter.Endpoint, e.g.,
+# `udp:127.0.0.1:8889` or `unix:/tmp/riddikulus.sock`.
+
+import asyncio
+import signal
+import logging
+import sys
+
+from .properties import loadProperties
+from .socket_protocol import HELLO, IFACES, PACKET, PING, PONG, MessageDecoder, encodeMessage, encodePacket, \
+    decodePacket, decodeIfaces
+
+log = logging.getLogger("riddikulus.async_connector")
+
+DEFAULT_ENDPOINT = "udp:127.0.0.1:8889"
+DEFAULT_KEEPALIVE = 1 # seconds; connection is considered broken after 3 missed intervals
+
+class Channel(asyncio.Protocol, asyncio.DatagramProtocol):
+    '''
+    Protocol for both stream (Unix) and datagram (UDP) transports: decodes received
+    messages and passes them as a list of (type, body) to \p onMessages(channel, messages, addr)
+    '''
+
+    def __init__(self, onMessages, onLost=None, datagram=False):
+        self.onMessages = onMessages
+        self.onLost = onLost
+        self.datagram = datagram
+        self.decoder = MessageDecoder()
+        self.transport = None
+
+    def connection_made(self, transport):
+        self.transport = transport
+
+    def data_received(self, data):
+        self.onMessages(self, self.decoder.feed(data), None)
+
+    def datagram_received(self, data, addr):
+        self.onMessages(self, MessageDecoder().feed(data), addr)
+
+    def error_received(self, exc):
+        log.warning("Socket error: %s" % exc)
+
+    def connection_lost(self, exc):
+        if self.onLost:
+            self.onLost(self)
+
+    def send(self, data, addr=None):
+        if self.datagram:
+            self.transport.sendto(data, addr)
+        else:
+            self.transport.write(data)
+
+    def close(self):
+        if self.transport:
+            self.transport.close()
+
+def parseEndpoint(endpoint):
+    '''
+    Split \p endpoint into ("udp", (host, port)) or ("unix", path)
+    '''
+    kind, _, address = endpoint.partition(":")
+    if kind == "udp":
+        host, _, port = address.rpartition(":")
+        return kind, (host, int(port))
+    elif kind == "unix" and address:
+        return kind, address
+    raise RuntimeError("Invalid endpoint `%s`, expected udp:<host>:<port> or unix:<path>" % endpoint)
+
+async def connect(endpoint, onMessages, onLost=None):
+    '''
+    Connect to \p endpoint, returns Channel
+    '''
+    loop = asyncio.get_running_loop()
+    kind, address = parseEndpoint(endpoint)
+    factory = lambda: Channel(onMessages, onLost, datagram=(kind == "udp"))
+    if kind == "udp":
+        transport, channel = await loop.create_datagram_endpoint(factory, remote_addr=address)
+    else:
+        transport, channel = await loop.create_unix_connection(factory, address)
+    return channel
+
+class SocketInjector:
+    '''
+    Implements the PacketInjector operations used by the router on top of a Channel
+    '''
+    def __init__(self, channel):
+        self.channel = channel
+
+    def sendPacket(self, packet, outIface):
+        self.channel.send(encodePacket(packet, outIface))
+
+    begin_sendPacket = sendPacket
+
+class AsyncConnectorApp:
+    '''
+    Runs \p simpleRouter on an asyncio event loop, connected to the controller through
+    SimpleRouter.Endpoint.  Configuration is read from the same properties file as for
+    PoxConnectorApp (the Tester interface is only available with Ice).
+    '''
+
+    def __init__(self, simpleRouter):
+        self.router = simpleRouter
+        self.channel = None
+        self.done = None
+        self.lastHeard = 0
+
+    def main(self, argv, configFile=None):
+        '''
+        Load properties from \p configFile and `--Name=value` arguments and run until the
+        connection to the controller is lost
+        '''
+        props = loadProperties(configFile, argv[1:])
+        try:
+            return asyncio.run(self.run(props))
+        except KeyboardInterrupt:
+            return 0
+
+    async def run(self, props):
+        loop = asyncio.get_running_loop()
+        self.done = loop.create_future()
+        self.router.configure(props)
+
+        endpoint = props.getPropertyWithDefault("SimpleRouter.Endpoint", DEFAULT_ENDPOINT)
+        keepalive = float(props.getPropertyWithDefault("SimpleRouter.Keepalive", DEFAULT_KEEPALIVE))
+        try:
+            self.channel = await connect(endpoint, self.handleMessages, lambda channel: self.stop(1))
+        except OSError as e:
+            log.error("ERROR: Cannot connect to controller at %s: %s" % (endpoint, e))
+            return -1
+        self.router.pox = SocketInjector(self.channel)
+
+        # ARP timers are driven by the event loop instead of the ticker thread
+        self.router.arpCache.stop()
+        self.lastHeard = loop.time()
+        tasks = [loop.create_task(self.ticker()), loop.create_task(self.keepalive(keepalive))]
+
+        # SIGHUP reloads the routing table in a worker thread while packets keep being handled
+        # (only possible when the loop runs in the main thread)
+        try:
+            loop.add_signal_handler(signal.SIGHUP, lambda: loop.run_in_executor(None, self.router.reloadRoutingTable))
+            reloadOnHup = True
+        except (AttributeError, NotImplementedError, RuntimeError, ValueError):
+            reloadOnHup = False
+
+        self.channel.send(encodeMessage(HELLO))
+        try:
+            return await self.done
+        finally:
+            for task in tasks:
+                task.cancel()
+            if reloadOnHup:
+                loop.remove_signal_handler(signal.SIGHUP)
+            self.router.stopCapture()
+            if self.router.batcher:
+                self.router.batcher.stop()
+            self.channel.close()
+
+    def stop(self, result=0):
+        if self.done and not self.done.done():
+            self.done.set_result(result)
+
+    def handleMessages(self, channel, messages, addr):
+        # errors are logged for each message (as Ice does for each call) instead of being
+        # propagated to the event loop, which would close the connection
+        self.lastHeard = asyncio.get_running_loop().time()
+        packets = []
+        for type, body in messages:
+            try:
+                if type == PACKET:
+                    packets.append(decodePacket(body))
+                    continue
+                self.deliverPackets(packets)
+                packets = []
+                if type == IFACES:
+                    self.router.reset(decodeIfaces(body))
+                elif type != PONG:
+                    log.warning("Unexpected message type %d from controller" % type)
+            except Exception:
+                log.exception("Error while handling message type %d from controller" % type)
+        self.deliverPackets(packets)
+
+    def deliverPackets(self, packets):
+        '''
+        Pass received \p packets to the router (handlePackets handles errors for each packet
+        of a batch)
+        '''
+        try:
+            if len(packets) == 1:
+                self.router.receivePacket(*packets[0])
+            elif packets:
+                self.router.handlePackets(packets)
+        except Exception:
+            log.exception("Error while handling packets from controller")
+
+    async def ticker(self):
+        while True:
+            await asyncio.sleep(self.router.arpCache.timers.resolution)
+            self.router.arpCache.tick()
+
+    async def keepalive(self, interval):
+        loop = asyncio.get_running_loop()
+        while True:
+            await asyncio.sleep(interval)
+            if loop.time() - self.lastHeard > 3 * interval:
+                print("Connection to controller broken, exiting...", file=sys.stderr)
+                self.stop(1)
+                return
+            self.channel.send(encodeMessage(PING))
@@ -0,0 +1,160 @@
+# -*- Mode: python; py-indent-offset: 4; indent-tabs-mode: nil; coding: utf-8; -*-
+# Copyright 2021 Alex Afanasyev
+#
+# This program is free software: you can redistribute it and/or modify it under the terms of
+# the GNU General Public License as published by the Free Software Foundation, either version
+# 3 of the License, or (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful, but WITHOUT ANY WARRANTY;
+# without even the implied warranty of MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.
+# See the GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License along with this program.
+# If not, see <http://www.gnu.org/licenses/>.
+
+
+# Micro-benchmarks of the packet processing hot paths (see benchmarks/ and all_benchmarks.py)
+#
+# A benchmark is a method named bench_* of a Benchmark subclass; it prepares its data and
+# returns the operation to time (a function without arguments):
+#
+#     class ChecksumBenchmark(Benchmark):
+#         def bench_checksum_20(self):
+#             data = bytes(20)
+#             return lambda: checksum(data)
+#
+# Each operation is timed in `repeat` rounds of about `minTime` seconds; the best round gives
+# the reported time per call (nanoseconds), which is the least affected by other load.
+
+import json
+import platform
+import time
+import timeit
+
+DEFAULT_REPEAT = 5
+DEFAULT_MIN_TIME = 0.2 # seconds per round
+DEFAULT_THRESHOLD = 0.10 # relative slowdown reported as regression
+
+class Benchmark:
+    '''
+    Base class of benchmark groups; setUp()/tearDown() are called around each benchmark
+    '''
+
+    def setUp(self):
+        pass
+
+    def tearDown(self):
+        pass
+
+def findBenchmarks(module, names=()):
+    '''
+    List of (name, class, method name) for all benchmarks in \p module, where name is
+    "<Class>.<benchmark>" (without bench_ prefix); if \p names is not empty, only benchmarks
+    whose names start with one of \p names are included
+    '''
+    found = []
+    for className in dir(module):
+        cls = getattr(module, className)
+        if not isinstance(cls, type) or not issubclass(cls, Benchmark) or cls is Benchmark:
+            continue
+        for methodName in dir(cls):
+            if methodName.startswith("bench_"):
+                name = "%s.%s" % (className, methodName[len("bench_"):])
+                if not names or any(name.startswith(prefix) for prefix in names):
+                    found.append((name, cls, methodName))
+    return found
+
+def timeOperation(operation, repeat=DEFAULT_REPEAT, minTime=DEFAULT_MIN_TIME):
+    '''
+    Time \p operation; returns dict with best and median time per call (ns) and number of
+    calls per round.  \p operation is called once before timing, so one-time work done on
+    the first call (lazy initialization, caches) does not distort the calibration
+    '''
+    operation()
+    timer = timeit.Timer(operation)
+    # calibrate number of calls so that a round takes at least minTime
+    number = 1
+    while True:
+        elapsed = timer.timeit(number)
+        if elapsed >= minTime:
+            break
+        if elapsed < minTime / 100:
+            number *= 10
+        else:
+            number = max(number * 2, int(number * minTime / elapsed) + 1)
+
+    rounds = sorted(timer.repeat(repeat, number))
+    return {
+        'ns': rounds[0] / number * 1e9,
+        'median': rounds[len(rounds) // 2] / number * 1e9,
+        'calls': number,
+        }
+
+def runBenchmarks(benchmarks, repeat=DEFAULT_REPEAT, minTime=DEFAULT_MIN_TIME, progress=None):
+    '''
+    Run \p benchmarks (as returned by findBenchmarks) and return results dict, suitable for
+    saving as JSON and as a baseline for compareResults.  \p progress(name, result) is called
+    after each benchmark
+    '''
+    results = {}
+    for name, cls, methodName in benchmarks:
+        instance = cls()
+        instance.setUp()
+        try:
+            results[name] = timeOperation(getattr(instance, methodName)(), repeat, minTime)
+        finally:
+            instance.tearDown()
+        if progress:
+            progress(name, results[name])
+    return {
+        'python': platform.python_version(),
+        'machine': platform.machine(),
+        'time': time.strftime("%Y-%m-%dT%H:%M:%S"),
+        'benchmarks': results,
+        }
+
+def compareResults(baseline, results, threshold=DEFAULT_THRESHOLD):
+    '''
+    Compare \p results with \p baseline (both as returned by runBenchmarks).  Returns list
+    of (name, baseline ns, current ns, ratio, status) for benchmarks present in both, where
+    status is "regression" if current time exceeds baseline by more than \p threshold
+    (fraction), "improvement" if it is lower by more than \p threshold, and "" otherwise
+    '''
+    comparison = []
+    base = baseline['benchmarks']
+    for name, result in results['benchmarks'].items():
+        if name not in base:
+            continue
+        ratio = result['ns'] / base[name]['ns'] if base[name]['ns'] > 0 else 1.0
+        status = "regression" if ratio > 1 + threshold else "improvement" if ratio < 1 - threshold else ""
+        comparison.append((name, base[name]['ns'], result['ns'], ratio, status))
+    return comparison
+
+def formatNs(ns):
+    if ns >= 1e6:
+        return "%.2f ms" % (ns / 1e6)
+    if ns >= 1e3:
+        return "%.2f us" % (ns / 1e3)
+    return "%.1f ns" % ns
+
+def formatResults(results):
+    width = max([len(name) for name in results['benchmarks']] + [10])
+    return "\n".join("%-*s %12s   (median %s)" % (width, name, formatNs(result['ns']), formatNs(result['median']))
+                     for name, result in results['benchmarks'].items())
+
+def formatComparison(comparison):
+    width = max([len(row[0]) for row in comparison] + [10])
+    lines = ["%-*s %12s %12s %8s" % (width, "Benchmark", "Baseline", "Current", "Change")]
+    for name, base, current, ratio, status in comparison:
+        lines.append("%-*s %12s %12s %+7.1f%% %s" % (width, name, formatNs(base), formatNs(current), (ratio - 1) * 100,
+                                                   status.upper()))
+    return "\n".join(line.rstrip() for line in lines)
+
+def loadResults(fileName):
+    with open(fileName, "rt") as f:
+        return json.load(f)
+
+def saveResults(results, fileName):
+    with open(fileName, "wt") as f:
+        json.dump(results, f, indent=2)
+        f.write("\n")
@@ -0,0 +1,151 @@
+# -*- Mode: python; py-indent-offset: 4; indent-tabs-mode: nil; coding: utf-8; -*-
+# Copyright 2021 Alex Afanasyev
+#
+# This program is free software: you can redistribute it and/or modify it under the terms of
+# the GNU General Public License as published by the Free Software Foundation, either version
+# 3 of the License, or (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful, but WITHOUT ANY WARRANTY;
+# without even the implied warranty of MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.
+# See the GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License along with this program.
+# If not, see <http://www.gnu.org/licenses/>.
+
+# Live capture of received and sent frames
+#
+# record() (called on the packet path) claims the next slot of a preallocated ring and
+# copies the frame (up to snaplen bytes) into it; a writer thread periodically moves
+# recorded frames from the ring into rotating pcapng files <prefix>-NNNNN.pcapng.  If the
+# writer falls more than one ring behind, the overwritten frames are counted as lost.
+
+import itertools
+import os
+import threading
+import time
+from array import array
+
+from .pcap import PcapngWriter, PCAPNG_INBOUND, PCAPNG_OUTBOUND
+
+INBOUND = PCAPNG_INBOUND
+OUTBOUND = PCAPNG_OUTBOUND
+
+DEFAULT_SLOTS = 4096
+DEFAULT_SNAPLEN = 1514
+DEFAULT_FILE_SIZE = 16 * 1024 * 1024
+DEFAULT_FILE_COUNT = 10
+FLUSH_INTERVAL = 0.1 # seconds
+
+class Capture:
+    '''
+    Capture into ring of \p slots frames of up to \p snaplen bytes, written to files
+    <\p prefix>-NNNNN.pcapng of about \p fileSize bytes each; only the last \p fileCount
+    files are kept (0 keeps all)
+    '''
+
+    def __init__(self, prefix, slots=DEFAULT_SLOTS, snaplen=DEFAULT_SNAPLEN, fileSize=DEFAULT_FILE_SIZE,
+                 fileCount=DEFAULT_FILE_COUNT):
+        self.prefix = prefix
+        self.slots = slots
+        self.snaplen = snaplen
+        self.fileSize = fileSize
+        self.fileCount = fileCount
+
+        # preallocated ring; slot i holds frame number n (n % slots == i) once seq[i] == n + 1
+        # (0 while the slot is being written)
+        self.ring = bytearray(slots * snaplen)
+        self.view = memoryview(self.ring)
+        self.seq = array('Q', bytes(8 * slots))
+        self.lengths = array('I', bytes(4 * slots))
+        self.times = array('d', bytes(8 * slots))
+        self.ifaces = [None] * slots
+        self.directions = bytearray(slots)
+        self.counter = itertools.count() # next() is atomic
+
+        self.written = 0
+        self.lost = 0
+        # files still on disk (older ones are deleted by rotation) and number of files opened
+        self.files = []
+        self.fileNumber = 0
+        self.writer = None
+
+        self.shouldStop = threading.Event()
+        self.writerThread = threading.Thread(target=self.__writer, name="capture-writer", daemon=True)
+        self.writerThread.start()
+
+    def record(self, frame, iface, direction):
+        '''
+        Copy \p frame received (INBOUND) or sent (OUTBOUND) on interface \p iface into the ring
+        '''
+        n = next(self.counter)
+        slot = n % self.slots
+        self.seq[slot] = 0 # being written
+        offset = slot * self.snaplen
+        length = min(len(frame), self.snaplen)
+        self.view[offset:offset + length] = frame[:length]
+        self.lengths[slot] = len(frame)
+        self.times[slot] = time.time()
+        self.ifaces[slot] = iface
+        self.directions[slot] = direction
+        self.seq[slot] = n + 1
+
+    def stop(self):
+        '''
+        Write remaining frames, close the current file and return summary; 'files' lists
+        the files that are still on disk, 'deleted' is the number of files removed by rotation
+        '''
+        self.shouldStop.set()
+        self.writerThread.join()
+        return {'written': self.written, 'lost': self.lost, 'files': list(self.files),
+                'deleted': self.fileNumber - len(self.files)}
+
+    def __openFile(self):
+        if self.writer:
+            self.writer.close()
+        self.fileNumber += 1
+        fileName = "%s-%05d.pcapng" % (self.prefix, self.fileNumber)
+        self.files.append(fileName)
+        self.writer = PcapngWriter(fileName, self.snaplen)
+        if self.fileCount and len(self.files) > self.fileCount:
+            try:
+                os.unlink(self.files.pop(0))
+            except OSError:
+                pass
+
+    def __flush(self, position):
+        # write frames from number `position` up to the last completely recorded one
+        while True:
+            slot = position % self.slots
+            seq = self.seq[slot]
+            if seq <= position:
+                return position # not recorded yet
+            if seq > position + 1:
+                # overwritten by a newer frame before we got to it
+                self.lost += 1
+                position += 1
+                continue
+
+            length = self.lengths[slot]
+            offset = slot * self.snaplen
+            frame = bytes(self.view[offset:offset + min(length, self.snaplen)])
+            timestamp, iface, direction = self.times[slot], self.ifaces[slot], self.directions[slot]
+            if self.seq[slot] != seq:
+                continue # overwritten while copying, re-check the slot
+
+            if self.writer is None or self.writer.tell() >= self.fileSize:
+                self.__openFile()
+            self.writer.write(frame, timestamp, iface, direction, length)
+            self.written += 1
+            position += 1
+
+    def __writer(self):
+        position = 0
+        while True:
+            stopping = self.shouldStop.wait(FLUSH_INTERVAL)
+            position = self.__flush(position)
+            if self.writer:
+                self.writer.flush()
+            if stopping:
+                break
+        if self.writer:
+            self.writer.close()
@@ -14,7 +14,7 @@
 
 import struct
 from enum import Enum
-from functools import partial
+from ipaddress import IPv4Address
 from .ip_address import IpAddress
 from .mac_address import MacAddress
 
@@ -22,147 +22,282 @@ ETHER_ADDR_LEN = 6
 IP_MAXPACKET = 65535
 ICMP_DATA_SIZE = 28
 
-class Base:
-    def __init__(self, buf=None, **kwargs):
-        if buf:
-            self.decode(buf)
-        else:
-            for key, value in kwargs.items():
-                setattr(self, key, value)
-
-    def __str__(self):
-        def keyName(key):
-            parts = key.split('__')
-            if len(parts) == 1:
-                return parts[0]
+# Kinds of header fields
+INT = 0   # integer (or bytes for "Ns" formats), stored as is
+MAC = 1   # MAC address: stored as 6 bytes, MacAddress when read
+IP = 2    # IPv4 address: stored as integer, IpAddress when read
+
+class Field:
+    '''
+    Declaration of a header field
+
+    \p fmt    struct format code of the field (fields with \p bits share the code with
+              the following bit fields until all bits of the code are used)
+    \p kind   INT, MAC, or IP
+    \p bits   width of the bit field, most significant bits first
+    \p init   whether the field is a parameter of the header constructor
+    \p check  (field, value, message) -- setting the field raises RuntimeError(message)
+              unless the other field has the value
+    '''
+    def __init__(self, name, fmt, kind=INT, default=None, bits=None, init=True, check=None):
+        self.name = name
+        self.fmt = fmt
+        self.kind = kind
+        self.bits = bits
+        self.init = init
+        self.check = check
+        if default is None:
+            default = b'\0' * ETHER_ADDR_LEN if kind == MAC else 0
+        self.default = default
+        # instance slot holding the wire value
+        self.slot = name if kind == INT else "_" + name
+
+def _ipValue(value):
+    if type(value) is int:
+        return value
+    if isinstance(value, IPv4Address):
+        return int(value)
+    return int(IpAddress(value))
+
+def _macValue(value):
+    if type(value) is bytes and len(value) == ETHER_ADDR_LEN:
+        return value
+    return MacAddress(value).addr
+
+class HeaderMeta(type):
+    '''
+    Generates header class from its FIELDS specification: __slots__, precompiled
+    struct.Struct (STRUCT), and the __init__, decode, encode, and encodeInto methods,
+    plus accessors for MAC and IP fields.  Methods defined in the class body take
+    precedence over the generated ones.
+    '''
+
+    def __new__(mcs, name, bases, ns):
+        fields = ns.get("FIELDS")
+        if fields is None:
+            ns.setdefault("__slots__", ())
+            return super().__new__(mcs, name, bases, ns)
+
+        extraSlots = tuple(ns.get("EXTRA_SLOTS", ()))
+        ns["__slots__"] = tuple(field.slot for field in fields) + extraSlots
+        ns["DISPLAY"] = tuple(field.name for field in fields) + extraSlots
+
+        # group bit fields into struct items
+        formats = []
+        items = [] # list of lists of (field, shift, mask)
+        used = 0
+        for field in fields:
+            if field.bits is None:
+                formats.append(field.fmt)
+                items.append([(field, 0, None)])
+                continue
+            width = struct.calcsize(field.fmt) * 8
+            if used == 0:
+                formats.append(field.fmt)
+                items.append([])
+            used += field.bits
+            items[-1].append((field, width - used, (1 << field.bits) - 1))
+            if used == width:
+                used = 0
+        compiled = struct.Struct("!" + "".join(formats))
+        ns["STRUCT"] = compiled
+        ns["SIZE"] = compiled.size
+
+        env = {
+            "_unpack_from": compiled.unpack_from,
+            "_pack": compiled.pack,
+            "_pack_into": compiled.pack_into,
+            "_ipValue": _ipValue,
+            "_macValue": _macValue,
+            "IpAddress": IpAddress,
+            "MacAddress": MacAddress,
+            }
+        code = []
+
+        # decode
+        targets = []
+        post = []
+        for i, item in enumerate(items):
+            if item[0][2] is None:
+                targets.append("self.%s" % item[0][0].slot)
             else:
-                return parts[1]
-        return type(self).__name__ + ": " + " ".join(["%s=%s" % (keyName(k),v) for k,v in vars(self).items()])
+                targets.append("_b%d" % i)
+                for field, shift, mask in item:
+                    post.append("    self.%s = _b%d >> %d & %d" % (field.slot, i, shift, mask))
+        checks = []
+        for field in fields:
+            if field.check and field.check not in checks:
+                checks.append(field.check)
+        for n, (other, value, message) in enumerate(checks):
+            env["_check%d" % n] = (value, message)
+            post.append("    if self.%s != _check%d[0]: raise RuntimeError(_check%d[1])" % (other, n, n))
+        code.append("def decode(self, packet, offset=0):")
+        code.append("    (%s,) = _unpack_from(packet, offset)" % ", ".join(targets))
+        code.extend(post)
+        code.append("    return %d" % compiled.size)
+
+        # encode / encodeInto
+        values = []
+        for item in items:
+            if item[0][2] is None:
+                values.append("self.%s" % item[0][0].slot)
+            else:
+                values.append(" | ".join("(self.%s & %d) << %d" % (field.slot, mask, shift) for field, shift, mask in item))
+        code.append("def encode(self):")
+        code.append("    return _pack(%s)" % ", ".join(values))
+        code.append("def encodeInto(self, buffer, offset=0):")
+        code.append("    _pack_into(buffer, offset, %s)" % ", ".join(values))
+        code.append("    return %d" % compiled.size)
+
+        # __init__
+        params = []
+        body = []
+        for field in fields:
+            env["_d_" + field.name] = field.default
+            if field.init:
+                params.append("%s=_d_%s" % (field.name, field.name))
+                body.append("        self.%s = %s" % (field.name, field.name))
+            else:
+                body.append("        self.%s = _d_%s" % (field.name, field.name))
+        code.append("def __init__(self, buf=None, %s):" % ", ".join(params))
+        code.append("    if buf:")
+        code.append("        self.decode(buf)")
+        code.append("    else:")
+        code.extend(body)
+
+        # accessors
+        for field in fields:
+            if field.kind == INT:
+                continue
+            convertGet, convertSet = ("IpAddress", "_ipValue") if field.kind == IP else ("MacAddress", "_macValue")
+            code.append("def _get_%s(self):" % field.name)
+            code.append("    return %s(self.%s)" % (convertGet, field.slot))
+            code.append("def _set_%s(self, value):" % field.name)
+            if field.check:
+                n = checks.index(field.check)
+                code.append("    if self.%s != _check%d[0]: raise RuntimeError(_check%d[1])" % (field.check[0], n, n))
+            code.append("    self.%s = %s(value)" % (field.slot, convertSet))
+
+        exec("\n".join(code), env)
+
+        for method in ("decode", "encode", "encodeInto", "__init__"):
+            ns.setdefault(method, env[method])
+        for field in fields:
+            if field.kind != INT:
+                ns.setdefault(field.name, property(env["_get_" + field.name], env["_set_" + field.name]))
+
+        return super().__new__(mcs, name, bases, ns)
+
+class Base(metaclass=HeaderMeta):
+    def __str__(self):
+        def value(v):
+            if isinstance(v, memoryview):
+                return bytes(v)
+            return v
+        items = []
+        for name in self.DISPLAY:
+            try:
+                items.append("%s=%s" % (name, value(getattr(self, name))))
+            except AttributeError:
+                pass # not set for this header (e.g., id/seqNum of ICMP error messages)
+        return type(self).__name__ + ": " + " ".join(items)
+
+# All decode(packet, offset=0) methods accept bytes, bytearray or memoryview and read
+# the header directly at \p offset, without slicing the packet.  Variable-length data
+# (IcmpHeader.data) is a slice of \p packet, i.e., a zero-copy view when \p packet is
+# a memoryview.
+#
+# encodeInto(buffer, offset=0) writes the header into a writable buffer (e.g., bytearray)
+# and returns the header length.
 
 # Ethernet Header
 class EtherHeader(Base):
-    # dhost (6 bytes): destination ethernet address
-    # shost (6 bytes): source ethernet address
-    # type  (2 bytes): packet type ID
-
-    def __init__(self, buf=None, dhost = b'\0' * ETHER_ADDR_LEN, shost = b'\0' * ETHER_ADDR_LEN, type = 0):
-        super().__init__(buf=buf, dhost=dhost, shost=shost, type=type)
-
-    def encode(self):
-        return struct.pack("!6s6sH", bytes(self.dhost), bytes(self.shost), self.type)
-
-    def decode(self, packet):
-        (self.dhost, self.shost, self.type) = struct.unpack("!6s6sH", packet[:14])
-        return 14
+    FIELDS = (
+        # dhost (6 bytes): destination ethernet address
+        Field("dhost", "6s", MAC),
+        # shost (6 bytes): source ethernet address
+        Field("shost", "6s", MAC),
+        # type  (2 bytes): packet type ID
+        Field("type", "H"),
+        )
 
     def next_level(self):
         return self.type
 
-    def __get_mac(name, self):
-        return getattr(self, "__%s" % name)
-
-    def __set_mac(name, self, value):
-        setattr(self, "__%s" % name, MacAddress(value))
-
-    shost = property(partial(__get_mac, "shost"), partial(__set_mac, "shost"))
-    dhost = property(partial(__get_mac, "dhost"), partial(__set_mac, "dhost"))
-
 # IPv4 Header
 class IpHeader(Base):
     class Protocol(Enum):
         Icmp = 1
 
-    # v  (4 bits):   IPv4 version (4 bits)
-    # hl (4 bits):   Header length (4 bits)
-    # tos (1 byte):  type of service
-    # len (2 bytes): total length
-    # id  (2 bytes): identification
-    # off (2 bytes): fragment offset field and flags
-    # ttl (1 byte):  time to live
-    # p   (1 byte):  protocol
-    # sum (2 bytes): checksum
-    # src (4 bytes): source address
-    # dst (4 bytes): dest address
-
-    def __init__(self, buf=None, hl=0, tos=0, len=0, id=0, off=0, ttl=0, p=0, sum=0, src=0, dst=0):
-        super().__init__(buf=buf, v=4, hl=hl, tos=tos, len=len, id=id, off=off, ttl=ttl, p=p, sum=sum, src=src, dst=dst)
-
-    def encode(self):
-        versionAndHeaderLength = (self.v << 4) | self.hl
-        return struct.pack("!BBHHHBBHLL", versionAndHeaderLength,
-                           self.tos, self.len, self.id, self.off, self.ttl, self.p, self.sum, int(self.src), int(self.dst))
-
-    def decode(self, packet):
-        self.v = 0 # to preserve the order
-        self.hl = 0
-        (versionAndHeaderLength, self.tos, self.len, self.id, self.off, self.ttl, self.p, self.sum, self.src, self.dst) = struct.unpack("!BBHHHBBHLL", packet[:20])
-        self.v = versionAndHeaderLength >> 4
-        self.hl = versionAndHeaderLength & 0x0F
-        return 20
+    FIELDS = (
+        # v  (4 bits):   IPv4 version (4 bits)
+        Field("v", "B", bits=4, default=4, init=False),
+        # hl (4 bits):   Header length (4 bits)
+        Field("hl", "B", bits=4),
+        # tos (1 byte):  type of service
+        Field("tos", "B"),
+        # len (2 bytes): total length
+        Field("len", "H"),
+        # id  (2 bytes): identification
+        Field("id", "H"),
+        # off (2 bytes): fragment offset field and flags
+        Field("off", "H"),
+        # ttl (1 byte):  time to live
+        Field("ttl", "B"),
+        # p   (1 byte):  protocol
+        Field("p", "B"),
+        # sum (2 bytes): checksum
+        Field("sum", "H"),
+        # src (4 bytes): source address
+        Field("src", "L", IP),
+        # dst (4 bytes): dest address
+        Field("dst", "L", IP),
+        )
 
     def next_level(self):
         return self.p
 
-    def __get_ip(name, self):
-        return getattr(self, "__%s" % name)
-
-    def __set_ip(name, self, value):
-        setattr(self, "__%s" % name, IpAddress(value))
-
-    src = property(partial(__get_ip, "src"), partial(__set_ip, "src"))
-    dst = property(partial(__get_ip, "dst"), partial(__set_ip, "dst"))
-
 class ArpHeader(Base):
     class Opcode:
         Request = 1
         Reply = 2
 
-    # hrd (2 bytes): format of hardware address
-    # pro (2 bytes): format of protocol address
-    # hln (1 byte):  length of hardware address
-    # pln (1 byte):  length of protocol address
-    # op  (2 bytes): ARP opcode (command)
-    # sha (6 bytes): sender hardware address
-    # sip (4 bytes): sender IPv4 address
-    # tha (6 bytes): target hardware address
-    # tip (4 bytes): target IP address
-
-    def __init__(self, buf=None, pro=0, hln=0, pln=0, op=0, sha=b'\0' * ETHER_ADDR_LEN, sip=0, tha=b'\0' * ETHER_ADDR_LEN, tip=0):
-        super().__init__(buf=buf, hrd=1, pro=0x0800, hln=hln, pln=pln, op=op, sha=sha, sip=sip, tha=tha, tip=tip)
-
-    def encode(self):
-        return struct.pack("!HHBBH6sL6sL", self.hrd, self.pro, self.hln, self.pln, self.op, bytes(self.sha), int(self.sip), bytes(self.tha), int(self.tip))
-
-    def decode(self, packet):
-        (self.hrd, self.pro, self.hln, self.pln, self.op, self.sha, self.sip, self.tha, self.tip) = struct.unpack("!HHBBH6sL6sL", packet[:28])
-        return 28
-
-    def __get_mac(name, self):
-        return getattr(self, "__%s" % name)
-
-    def __set_mac(name, self, value):
-        if self.hrd != 1:
-            raise RuntimeError("Current implementation of ArpHeader only support Ethernet addresses")
-        setattr(self, "__%s" % name, MacAddress(value))
-
-    sha = property(partial(__get_mac, "sha"), partial(__set_mac, "sha"))
-    tha = property(partial(__get_mac, "tha"), partial(__set_mac, "tha"))
-
-    def __get_ip(name, self):
-        return getattr(self, "__%s" % name)
-
-    def __set_ip(name, self, value):
-        if self.pro != 0x0800:
-            raise RuntimeError("Current implementation of ArpHeader only support IPv4 addresses")
-        setattr(self, "__%s" % name, IpAddress(value))
-
-    sip = property(partial(__get_ip, "sip"), partial(__set_ip, "sip"))
-    tip = property(partial(__get_ip, "tip"), partial(__set_ip, "tip"))
+    ETHERNET = ("hrd", 1, "Current implementation of ArpHeader only support Ethernet addresses")
+    IPV4 = ("pro", 0x0800, "Current implementation of ArpHeader only support IPv4 addresses")
+
+    FIELDS = (
+        # hrd (2 bytes): format of hardware address
+        Field("hrd", "H", default=1, init=False),
+        # pro (2 bytes): format of protocol address
+        Field("pro", "H", default=0x0800),
+        # hln (1 byte):  length of hardware address
+        Field("hln", "B"),
+        # pln (1 byte):  length of protocol address
+        Field("pln", "B"),
+        # op  (2 bytes): ARP opcode (command)
+        Field("op", "H"),
+        # sha (6 bytes): sender hardware address
+        Field("sha", "6s", MAC, check=ETHERNET),
+        # sip (4 bytes): sender IPv4 address
+        Field("sip", "L", IP, check=IPV4),
+        # tha (6 bytes): target hardware address
+        Field("tha", "6s", MAC, check=ETHERNET),
+        # tip (4 bytes): target IP address
+        Field("tip", "L", IP, check=IPV4),
+        )
+
+ICMP_ECHO = struct.Struct("!BBHHH")
+ICMP_ERROR = struct.Struct("!BBHL")
 
 class IcmpHeader(Base):
-    # type (1 byte):  ICMP Type
-    # code (2 bytes): ICMP Code
-    # sum  (2 bytes): ICMP Checksum
+    FIELDS = (
+        # type (1 byte):  ICMP Type
+        Field("type", "B"),
+        # code (2 bytes): ICMP Code
+        Field("code", "B"),
+        # sum  (2 bytes): ICMP Checksum
+        Field("sum", "H"),
+        )
 
     # if type == 3 or type == 11 or type == 4:
     #   unused (4 bytes): Unusued space
@@ -172,12 +307,15 @@ class IcmpHeader(Base):
     #   id (2 bytes):           If code = 0, an identifier to aid in matching echos and replies, may be zero.
     #   seqNum (2 bytes):       If code = 0, a sequence number to aid in matching echos and replies, may be zero.
     #   data (variable length): Opaque data
+    EXTRA_SLOTS = ("id", "seqNum", "data")
 
     def __init__(self, buf=None, type=0, code=0, sum=0, **kwargs):
         if buf:
             self.decode(buf)
         else:
-            super().__init__(buf=buf, type=type, code=code, sum=sum)
+            self.type = type
+            self.code = code
+            self.sum = sum
             if self.type in [0, 8]:
                 self.id = kwargs.get('id', 0)
                 self.seqNum = kwargs.get('seqNum', 0)
@@ -188,26 +326,35 @@ class IcmpHeader(Base):
                 raise RuntimeError("Unsupported ICMP type: %d" % self.type)
 
     def encode(self):
-        pkt = struct.pack("!BBH", self.type, self.code, self.sum)
         if self.type in [0, 8]:
-            pkt = pkt + struct.pack("!HH", self.id, self.seqNum) + self.data
+            return ICMP_ECHO.pack(self.type, self.code, self.sum, self.id, self.seqNum) + self.data
         elif self.type in [3, 4, 11]:
-            pkt = pkt + struct.pack("!L", 0) + self.data
+            return ICMP_ERROR.pack(self.type, self.code, self.sum, 0) + self.data
         else:
             raise RuntimeError("Unsupported ICMP type: %d" % self.type)
-        return pkt
 
-    def decode(self, packet):
-        (self.type, self.code, self.sum) = struct.unpack("!BBH", packet[0:4])
+    def encodeInto(self, buffer, offset=0):
         if self.type in [0, 8]:
-            (self.id, self.seqNum) = struct.unpack("!HH", packet[4:8])
-            self.data = packet[8:]
-            return 8 + len(self.data)
+            ICMP_ECHO.pack_into(buffer, offset, self.type, self.code, self.sum, self.id, self.seqNum)
         elif self.type in [3, 4, 11]:
-            self.data = packet[8:]
-            return 8 + len(self.data)
+            ICMP_ERROR.pack_into(buffer, offset, self.type, self.code, self.sum, 0)
+        else:
+            raise RuntimeError("Unsupported ICMP type: %d" % self.type)
+        end = offset + 8 + len(self.data)
+        buffer[offset + 8:end] = self.data
+        return end - offset
+
+    def decode(self, packet, offset=0):
+        type = packet[offset]
+        if type in [0, 8]:
+            (self.type, self.code, self.sum, self.id, self.seqNum) = ICMP_ECHO.unpack_from(packet, offset)
+        elif type in [3, 4, 11]:
+            (self.type, self.code, self.sum, unused) = ICMP_ERROR.unpack_from(packet, offset)
         else:
+            (self.type, self.code, self.sum) = IcmpHeader.STRUCT.unpack_from(packet, offset)
             raise RuntimeError("Unsupported ICMP type: %d" % self.type)
+        self.data = packet[offset + 8:]
+        return 8 + len(self.data)
 
 Stack = {
     EtherHeader: {
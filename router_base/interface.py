@@ -20,6 +20,21 @@ class Interface:
         self.name = name
         self.mac = MacAddress(mac)
         self.ip = IpAddress(ip)
+        # PacketTemplates for packets originated on this interface (set by SimpleRouterBase.reset)
+        self.templates = None
 
     def __str__(self):
       return "%s (%s, %s)" % (self.name, self.ip, self.mac)
+
+class InterfaceIndex:
+    '''
+    Router interfaces \p ifaces with lookups by name, integer IP address and MAC bytes, and
+    the set of integer IP addresses of the router.  Never modified after construction:
+    SimpleRouterBase.reset builds a new index and publishes it with a single assignment
+    '''
+    def __init__(self, ifaces=()):
+        self.ifaces = list(ifaces)
+        self.byName = {iface.name: iface for iface in self.ifaces}
+        self.byIp = {int(iface.ip): iface for iface in self.ifaces}
+        self.byMac = {iface.mac.addr: iface for iface in self.ifaces}
+        self.localIps = frozenset(self.byIp)
@@ -0,0 +1,91 @@
+# -*- Mode: python; py-indent-offset: 4; indent-tabs-mode: nil; coding: utf-8; -*-
+# Copyright 2021 Alex Afanasyev
+#
+# This program is free software: you can redistribute it and/or modify it under the terms of
+# the GNU General Public License as published by the Free Software Foundation, either version
+# 3 of the License, or (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful, but WITHOUT ANY WARRANTY;
+# without even the implied warranty of MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.
+# See the GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License along with this program.
+# If not, see <http://www.gnu.org/licenses/>.
+
+# In-process stand-in for the POX controller, for tests and benchmarks without mininet
+#
+#     injector = LocalPacketInjector([Port("sw0-eth1", "00:00:00:00:00:01"), ...])
+#     injector.attach(router)              # router.pox = injector, router.reset(ports)
+#     injector.deliver(frames, batchSize=32)
+#     injector.sent                        # [(packet, outIface), ...]
+
+from .packet_batcher import PacketBatcher, BatchingUnsupported
+
+class Port:
+    '''
+    Router port description, same fields as pox::Iface
+    '''
+    def __init__(self, name, mac, port=0):
+        self.name = name
+        self.mac = mac
+        self.port = port
+
+class LocalPacketInjector:
+    '''
+    Implements the PacketInjector operations used by the router (as a direct, synchronous
+    replacement of the pox proxy) and delivers received frames to the router through
+    receivePacket or the batched handlePackets entry point.  With \p supportsBatches False
+    it behaves like a controller without sendPackets (raises BatchingUnsupported)
+    '''
+
+    def __init__(self, ports=(), supportsBatches=True):
+        self.ports = list(ports)
+        self.supportsBatches = supportsBatches
+        self.router = None
+        self.sent = []
+        self.nSendCalls = 0
+
+    def attach(self, router, batcher=None):
+        '''
+        Make this injector the router's pox peer and reset router with the injector's ports.
+        \p batcher is an optional dict of PacketBatcher parameters to batch outgoing packets
+        '''
+        self.router = router
+        router.pox = self
+        if batcher is not None:
+            router.batcher = PacketBatcher(self.sendPacket, self.sendPackets, **batcher)
+        router.reset(self.ports)
+
+    def deliver(self, frames, batchSize=1):
+        '''
+        Deliver \p frames (sequence of (packet, inIface)) to the router, with one upcall per
+        frame if \p batchSize is 1, or in batches of \p batchSize frames otherwise
+        '''
+        if batchSize <= 1:
+            for packet, inIface in frames:
+                self.router.receivePacket(packet, inIface)
+            return
+        frames = list(frames)
+        for start in range(0, len(frames), batchSize):
+            self.router.handlePackets(frames[start:start + batchSize])
+
+    # PacketInjector operations
+    def sendPacket(self, packet, outIface, current=None):
+        self.nSendCalls += 1
+        self.sent.append((packet, outIface))
+
+    begin_sendPacket = sendPacket
+
+    def sendPackets(self, packets, current=None):
+        if not self.supportsBatches:
+            raise BatchingUnsupported()
+        self.nSendCalls += 1
+        self.sent.extend(packets)
+
+    begin_sendPackets = sendPackets
+
+    def getIfaces(self, current=None):
+        return self.ports
+
+    def ice_ping(self):
+        pass
@@ -0,0 +1,387 @@
+# -*- Mode: python; py-indent-offset: 4; indent-tabs-mode: nil; coding: utf-8; -*-
+# Copyright 2021 Alex Afanasyev
+#
+# This program is free software: you can redistribute it and/or modify it under the terms of
+# the GNU General Public License as published by the Free Software Foundation, either version
+# 3 of the License, or (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful, but WITHOUT ANY WARRANTY;
+# without even the implied warranty of MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.
+# See the GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License along with this program.
+# If not, see <http://www.gnu.org/licenses/>.
+
+# Longest prefix match indexes for the routing table.
+#
+# Indexes do not store RoutingTableEntry objects; they map (prefix, length) to the
+# position of the entry in RoutingTableBase.entries.  When several entries have exactly
+# the same prefix and length, the one with the smallest position wins, the same as
+# a linear scan that only replaces the best match with a strictly longer one.
+#
+# All indexes implement the same interface: insert(prefix, length, value),
+# remove(prefix, length), lookup(addr), copy(), clear() and len().  The index used by the routing table is selected by name from
+# `Engines` (see RoutingTable.Engine property in router.config).
+
+from array import array
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+ADDR_BITS = 32
+ADDR_MASK = 0xffffffff
+
+def prefixLength(mask):
+    '''
+    Convert integer netmask into prefix length.  Raises RuntimeError if the mask
+    is not contiguous (e.g., 255.0.255.0)
+    '''
+    length = bin(mask).count('1')
+    if mask != (ADDR_MASK << (ADDR_BITS - length)) & ADDR_MASK:
+        raise RuntimeError("Non-contiguous network mask: 0x%08x" % mask)
+    return length
+
+class TrieNode:
+    __slots__ = ("prefix", "length", "value", "children")
+
+    def __init__(self, prefix, length, value=None):
+        self.prefix = prefix
+        self.length = length
+        self.value = value
+        self.children = [None, None]
+
+class PrefixTrie:
+    '''
+    Path-compressed binary (Patricia) trie.  Every node keeps the full prefix and its
+    length, so chains of single-child nodes are collapsed into one edge and the lookup
+    visits at most ADDR_BITS + 1 nodes regardless of the number of prefixes.
+    '''
+
+    def __init__(self):
+        self.root = TrieNode(0, 0)
+        self.size = 0
+
+    @staticmethod
+    def __bit(addr, pos):
+        return (addr >> (ADDR_BITS - 1 - pos)) & 1
+
+    @staticmethod
+    def __commonLength(a, b, limit):
+        diff = (a ^ b) & ADDR_MASK
+        length = ADDR_BITS - diff.bit_length()
+        return min(length, limit)
+
+    def insert(self, prefix, length, value):
+        '''
+        Add \p value for \p prefix / \p length.  \p prefix must already be masked.
+        '''
+        node = self.root
+        while True:
+            if node.length == length:
+                if node.value is None:
+                    self.size += 1
+                    node.value = value
+                elif value < node.value:
+                    node.value = value
+                return
+
+            bit = PrefixTrie.__bit(prefix, node.length)
+            child = node.children[bit]
+            if child is None:
+                node.children[bit] = TrieNode(prefix, length, value)
+                self.size += 1
+                return
+
+            common = PrefixTrie.__commonLength(prefix, child.prefix, min(length, child.length))
+            if common == child.length:
+                node = child
+                continue
+
+            # split the edge: new node covers the common part of both prefixes
+            mask = (ADDR_MASK << (ADDR_BITS - common)) & ADDR_MASK
+            if common == length:
+                split = TrieNode(prefix, length, value)
+                self.size += 1
+            else:
+                split = TrieNode(prefix & mask, common)
+            split.children[PrefixTrie.__bit(child.prefix, common)] = child
+            node.children[bit] = split
+            if common == length:
+                return
+            split.children[PrefixTrie.__bit(prefix, common)] = TrieNode(prefix, length, value)
+            self.size += 1
+            return
+
+    def remove(self, prefix, length):
+        '''
+        Remove value for \p prefix / \p length (nodes are kept, only the value is cleared)
+        '''
+        node = self.root
+        while node is not None and node.length < length:
+            node = node.children[PrefixTrie.__bit(prefix, node.length)]
+        if node is not None and node.length == length and node.prefix == prefix and node.value is not None:
+            node.value = None
+            self.size -= 1
+
+    def copy(self):
+        '''
+        Independent copy of the trie
+        '''
+        trie = PrefixTrie()
+        trie.size = self.size
+        trie.root = TrieNode(self.root.prefix, self.root.length, self.root.value)
+        stack = [(self.root, trie.root)]
+        while stack:
+            node, copied = stack.pop()
+            for bit, child in enumerate(node.children):
+                if child is not None:
+                    copied.children[bit] = TrieNode(child.prefix, child.length, child.value)
+                    stack.append((child, copied.children[bit]))
+        return trie
+
+    def lookup(self, addr):
+        '''
+        Return value of the longest prefix matching \p addr (integer), or None
+        '''
+        best = None
+        node = self.root
+        while node is not None:
+            length = node.length
+            if (addr ^ node.prefix) >> (ADDR_BITS - length) if length else 0:
+                break
+            if node.value is not None:
+                best = node.value
+            if length == ADDR_BITS:
+                break
+            node = node.children[(addr >> (ADDR_BITS - 1 - length)) & 1]
+        return best
+
+    def clear(self):
+        self.root = TrieNode(0, 0)
+        self.size = 0
+
+    def __len__(self):
+        return self.size
+
+class LinearIndex:
+    '''
+    Plain list of prefixes, scanned in full on every lookup
+    '''
+
+    def __init__(self):
+        self.prefixes = []
+
+    def insert(self, prefix, length, value):
+        mask = (ADDR_MASK << (ADDR_BITS - length)) & ADDR_MASK
+        self.prefixes.append((prefix, mask, length, value))
+
+    def remove(self, prefix, length):
+        self.prefixes = [item for item in self.prefixes if item[0] != prefix or item[2] != length]
+
+    def copy(self):
+        index = LinearIndex()
+        index.prefixes = list(self.prefixes)
+        return index
+
+    def lookup(self, addr):
+        best = None
+        bestLength = -1
+        for prefix, mask, length, value in self.prefixes:
+            if (addr & mask) == prefix and (length > bestLength or (length == bestLength and value < best)):
+                best = value
+                bestLength = length
+        return best
+
+    def clear(self):
+        self.prefixes = []
+
+    def __len__(self):
+        return len(self.prefixes)
+
+class Dir248Index:
+    '''
+    DIR-24-8 forwarding table: one array with an element for every /24 plus 256-element
+    overflow blocks for /24s that contain longer prefixes.  Array elements are
+    value + 1 (0 means no route); elements of the /24 array with LONG_FLAG set hold
+    the number of the overflow block instead.  A lookup is one or two array reads.
+
+    The /24 array alone takes 64MB.  After inserts and removals the arrays are regenerated
+    from the list of prefixes by getTables(); until then lookups keep using the arrays of
+    the previous build (no arrays: no match), so they never pay for or wait on a build.
+    RoutingTableBase makes its changes in a copy of the index and builds it before
+    publishing.  Prebuilt arrays (e.g., memory-mapped from a routing table snapshot) can
+    be installed with setTables.
+    '''
+
+    TBL24_BITS = 24
+    LONG_BITS = ADDR_BITS - TBL24_BITS
+    LONG_FLAG = 0x80000000
+
+    def __init__(self):
+        self.prefixes = {}
+        self.loadPrefixes = None
+        self.tables = None
+        self.dirty = True
+
+    def setTables(self, tbl24, tblLong, prefixes):
+        '''
+        Use prebuilt arrays \p tbl24 and \p tblLong (sequences of integers, e.g. memoryview
+        cast to 'I') for lookups.  \p prefixes is a function that returns an iterable of
+        (prefix, length, value) the arrays were built from; it is only called if the index
+        needs to be rebuilt after an insert
+        '''
+        self.prefixes = None
+        self.loadPrefixes = prefixes
+        self.tables = (tbl24, tblLong)
+        self.dirty = False
+
+    def getTables(self):
+        '''
+        Return lookup arrays (tbl24, tblLong), building them if there were changes since
+        the last build
+        '''
+        if self.dirty:
+            self.tables = self.__build(self.__getPrefixes())
+            self.dirty = False
+        return self.tables
+
+    def __getPrefixes(self):
+        if self.prefixes is None:
+            self.prefixes = {}
+            for prefix, length, value in self.loadPrefixes():
+                current = self.prefixes.get((length, prefix))
+                if current is None or value < current:
+                    self.prefixes[(length, prefix)] = value
+            self.loadPrefixes = None
+        return self.prefixes
+
+    def insert(self, prefix, length, value):
+        self.__getPrefixes()
+        current = self.prefixes.get((length, prefix))
+        if current is None or value < current:
+            self.prefixes[(length, prefix)] = value
+        self.dirty = True
+
+    def remove(self, prefix, length):
+        if self.__getPrefixes().pop((length, prefix), None) is not None:
+            self.dirty = True
+
+    def copy(self):
+        '''
+        Copy of the index; the lookup arrays are shared until the copy is modified
+        '''
+        index = Dir248Index()
+        index.prefixes = dict(self.__getPrefixes())
+        index.tables = self.tables
+        index.dirty = self.dirty
+        return index
+
+    def __build(self, prefixes):
+        tbl24 = array('I', bytes(4 << self.TBL24_BITS))
+        tblLong = array('I')
+
+        # shorter prefixes first, so longer ones overwrite them
+        for (length, prefix), value in sorted(prefixes.items()):
+            element = value + 1
+            if length <= self.TBL24_BITS:
+                start = prefix >> self.LONG_BITS
+                count = 1 << (self.TBL24_BITS - length)
+                tbl24[start:start + count] = array('I', [element]) * count
+            else:
+                slot = prefix >> self.LONG_BITS
+                current = tbl24[slot]
+                if current & self.LONG_FLAG:
+                    block = current & ~self.LONG_FLAG
+                else:
+                    block = len(tblLong) >> self.LONG_BITS
+                    tblLong.extend(array('I', [current]) * (1 << self.LONG_BITS))
+                    tbl24[slot] = self.LONG_FLAG | block
+                start = (block << self.LONG_BITS) | (prefix & ((1 << self.LONG_BITS) - 1))
+                count = 1 << (ADDR_BITS - length)
+                tblLong[start:start + count] = array('I', [element]) * count
+
+        return (tbl24, tblLong)
+
+    def lookup(self, addr):
+        tables = self.tables
+        if tables is None:
+            return None
+        tbl24, tblLong = tables
+
+        element = tbl24[addr >> self.LONG_BITS]
+        if element & self.LONG_FLAG:
+            element = tblLong[((element & ~self.LONG_FLAG) << self.LONG_BITS) | (addr & 0xff)]
+        if element:
+            return element - 1
+        return None
+
+    def clear(self):
+        self.prefixes = {}
+        self.loadPrefixes = None
+        self.tables = None
+        self.dirty = True
+
+    def __len__(self):
+        return len(self.__getPrefixes())
+
+class VectorIndex:
+    '''
+    Batch longest prefix match over NumPy arrays.  Prefixes are grouped by length; for
+    each length (longest first) destination addresses are masked and matched against
+    the sorted prefixes of that length with a single searchsorted call.
+    '''
+
+    def __init__(self, dests, masks):
+        '''
+        \p dests and \p masks are sequences of integer destinations and masks, in the
+        order of RoutingTableBase.entries
+        '''
+        if numpy is None:
+            raise RuntimeError("Batch lookup requires NumPy, which is not installed")
+
+        dests = numpy.asarray(dests, dtype=numpy.uint32)
+        masks = numpy.asarray(masks, dtype=numpy.uint32)
+        lengths = numpy.unpackbits(masks.view(numpy.uint8)).reshape(-1, ADDR_BITS).sum(axis=1)
+        positions = numpy.arange(len(dests), dtype=numpy.int64)
+
+        self.groups = []
+        for length in sorted(set(lengths.tolist()), reverse=True):
+            selected = lengths == length
+            prefixes = dests[selected] & masks[selected]
+            values = positions[selected]
+            # for duplicate prefixes keep the earliest entry
+            order = numpy.lexsort((values, prefixes))
+            prefixes, first = numpy.unique(prefixes[order], return_index=True)
+            mask = numpy.uint32((ADDR_MASK << (ADDR_BITS - length)) & ADDR_MASK)
+            self.groups.append((mask, prefixes, values[order][first]))
+
+    def lookupMany(self, addrs):
+        '''
+        Return int64 array with the position of the matching entry for every address
+        in \p addrs (-1 if no entry matches)
+        '''
+        addrs = numpy.asarray(addrs, dtype=numpy.uint32)
+        result = numpy.full(addrs.shape, -1, dtype=numpy.int64)
+        pending = numpy.arange(addrs.size)
+        flat = result.reshape(-1)
+        addrs = addrs.reshape(-1)
+
+        for mask, prefixes, values in self.groups:
+            if pending.size == 0:
+                break
+            keys = addrs[pending] & mask
+            found = numpy.searchsorted(prefixes, keys)
+            found[found == prefixes.size] = 0
+            matched = prefixes[found] == keys
+            flat[pending[matched]] = values[found[matched]]
+            pending = pending[~matched]
+
+        return result
+
+Engines = {
+    "list": LinearIndex,
+    "trie": PrefixTrie,
+    "dir-24-8": Dir248Index,
+    }
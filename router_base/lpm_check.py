@@ -0,0 +1,131 @@
+# -*- Mode: python; py-indent-offset: 4; indent-tabs-mode: nil; coding: utf-8; -*-
+# Copyright 2021 Alex Afanasyev
+#
+# This program is free software: you can redistribute it and/or modify it under the terms of
+# the GNU General Public License as published by the Free Software Foundation, either version
+# 3 of the License, or (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful, but WITHOUT ANY WARRANTY;
+# without even the implied warranty of MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.
+# See the GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License along with this program.
+# If not, see <http://www.gnu.org/licenses/>.
+
+
+# Scaling and correctness checks of the routing table lookup on large (synthetic) tables
+#
+# ReferenceLpm is an independent longest prefix match built on the ipaddress module, used to
+# cross-check RoutingTable.lookup on random addresses.
+
+import ipaddress
+import random
+import time
+import tracemalloc
+
+from .rtable_gen import generateRoutes, writeRtable
+
+class ReferenceLpm:
+    '''
+    Longest prefix match over \p entries (RoutingTableEntry list, e.g. table.entries) using
+    ipaddress networks: one dict of networks per prefix length, probed from /32 down to /0.
+    Like RoutingTableBase, the first of duplicate prefixes wins
+    '''
+
+    def __init__(self, entries):
+        self.networks = {}
+        for entry in entries:
+            network = ipaddress.IPv4Network((str(entry.dest), str(entry.mask)), strict=False)
+            self.networks.setdefault(network.prefixlen, {}).setdefault(network, entry)
+        self.lengths = sorted(self.networks, reverse=True)
+
+    def lookup(self, ip):
+        addr = ipaddress.IPv4Address(int(ip))
+        for length in self.lengths:
+            entry = self.networks[length].get(ipaddress.IPv4Network((addr, length), strict=False))
+            if entry is not None:
+                return entry
+        return None
+
+def randomAddresses(table, count, seed=0):
+    '''
+    \p count random addresses; half of them are taken from inside the table's prefixes (at
+    random positions, including prefix boundaries), the rest are uniformly random
+    '''
+    rnd = random.Random(seed)
+    entries = table.entries
+    addrs = []
+    for i in range(count):
+        if entries and i % 2 == 0:
+            entry = entries[rnd.randrange(len(entries))]
+            mask = int(entry.mask)
+            host = rnd.choice((0, ~mask & 0xffffffff, rnd.getrandbits(32) & ~mask))
+            addrs.append(int(entry.dest) & mask | host)
+        else:
+            addrs.append(rnd.getrandbits(32))
+    return addrs
+
+def crossCheck(table, addrs, reference=None):
+    '''
+    Compare table.lookup with ReferenceLpm for \p addrs; returns list of mismatches
+    (address, table result, reference result)
+    '''
+    if reference is None:
+        reference = ReferenceLpm(table.entries)
+    mismatches = []
+    for addr in addrs:
+        found = table.lookup(addr)
+        expected = reference.lookup(addr)
+        if found is not expected:
+            mismatches.append((addr, found, expected))
+    return mismatches
+
+def measure(tableClass, fileName, engine, nLookups=100000, seed=0, memory=True):
+    '''
+    Load RTABLE \p fileName into a new \p tableClass(engine=\p engine, cacheSize=0) and
+    measure it.  Returns dict with number of entries, load time (s), memory allocated by
+    the loaded table (bytes, measured in a second load with tracemalloc, None if not
+    \p memory), lookups per second on \p nLookups random addresses and the number of
+    mismatches with ReferenceLpm on all of these addresses (checked in a separate pass
+    after timing)
+    '''
+    started = time.perf_counter()
+    table = tableClass(engine=engine, cacheSize=0)
+    table.load(fileName) # builds the index, including dir-24-8 lookup arrays
+    loadTime = time.perf_counter() - started
+
+    allocated = None
+    if memory:
+        tracemalloc.start()
+        try:
+            before = tracemalloc.get_traced_memory()[0]
+            traced = tableClass(engine=engine, cacheSize=0)
+            traced.load(fileName)
+            allocated = tracemalloc.get_traced_memory()[0] - before
+            del traced
+        finally:
+            tracemalloc.stop()
+
+    addrs = randomAddresses(table, nLookups, seed)
+    lookup = table.lookup
+    started = time.perf_counter()
+    for addr in addrs:
+        lookup(addr)
+    elapsed = time.perf_counter() - started
+
+    mismatches = crossCheck(table, addrs)
+    return {
+        'entries': len(table.entries),
+        'loadSeconds': loadTime,
+        'memoryBytes': allocated,
+        'lookupsPerSecond': len(addrs) / elapsed if elapsed > 0 else 0.0,
+        'checked': len(addrs),
+        'mismatches': len(mismatches),
+        }
+
+HEADER = "%10s %10s %12s %14s %10s" % ("Entries", "Load (s)", "Memory (MB)", "Lookups/s", "Mismatch")
+
+def formatRow(row):
+    memory = "%.1f" % (row['memoryBytes'] / 2**20) if row['memoryBytes'] is not None else "-"
+    return "%10d %10.2f %12s %14.0f %5d/%d" % (row['entries'], row['loadSeconds'], memory,
+                                              row['lookupsPerSecond'], row['mismatches'], row['checked'])
@@ -0,0 +1,143 @@
+# -*- Mode: python; py-indent-offset: 4; indent-tabs-mode: nil; coding: utf-8; -*-
+# Copyright 2021 Alex Afanasyev
+#
+# This program is free software: you can redistribute it and/or modify it under the terms of
+# the GNU General Public License as published by the Free Software Foundation, either version
+# 3 of the License, or (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful, but WITHOUT ANY WARRANTY;
+# without even the implied warranty of MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.
+# See the GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License along with this program.
+# If not, see <http://www.gnu.org/licenses/>.
+
+import threading
+import time
+import logging
+
+log = logging.getLogger("riddikulus.packet_batcher")
+
+DEFAULT_MAX_PACKETS = 64
+DEFAULT_MAX_BYTES = 256 * 1024
+DEFAULT_MAX_DELAY = 200 # microseconds
+
+class BatchingUnsupported(Exception):
+    '''
+    Raised by the sendPackets callable when the peer does not implement the batched operation
+    '''
+    pass
+
+class PacketBatcher:
+    '''
+    Coalesces outgoing packets into batches for the PacketInjector::sendPackets operation.
+
+    A batch is flushed when it reaches \p maxPackets packets or \p maxBytes bytes, or
+    \p maxDelay microseconds after its first packet was queued, whichever happens first.
+    Packets are sent in the order they were queued (batches are handed to \p sendPackets
+    under the batcher's lock, so it is expected to be asynchronous, e.g., begin_sendPackets).
+
+    \p sendPacket(packet, iface)  sends single packet
+    \p sendPackets(batch)         sends list of (packet, iface) tuples; raises
+                                  BatchingUnsupported (or the owner calls unsupported(batch)
+                                  when it learns that asynchronously) if the peer lacks the
+                                  operation, after which all packets are sent one by one
+    '''
+
+    def __init__(self, sendPacket, sendPackets, maxPackets=DEFAULT_MAX_PACKETS, maxBytes=DEFAULT_MAX_BYTES,
+                 maxDelay=DEFAULT_MAX_DELAY):
+        self.sendPacket = sendPacket
+        self.sendPackets = sendPackets
+        self.maxPackets = maxPackets
+        self.maxBytes = maxBytes
+        self.maxDelay = maxDelay / 1e6
+        self.batching = sendPackets is not None and maxPackets > 1
+
+        self.batch = []
+        self.batchBytes = 0
+        self.deadline = None
+        self.nBatches = 0
+
+        self.mutex = threading.Condition()
+        self.shouldStop = False
+        self.flusher = None
+
+    def send(self, packet, iface):
+        '''
+        Queue \p packet to be sent on interface \p iface
+        '''
+        if not self.batching:
+            self.sendPacket(packet, iface)
+            return
+
+        with self.mutex:
+            self.batch.append((packet, iface))
+            self.batchBytes += len(packet)
+            if len(self.batch) >= self.maxPackets or self.batchBytes >= self.maxBytes:
+                self.__send(self.__take())
+            elif self.deadline is None:
+                self.deadline = time.monotonic() + self.maxDelay
+                if self.flusher is None:
+                    self.flusher = threading.Thread(target=self.__flusher, daemon=True)
+                    self.flusher.start()
+                self.mutex.notify()
+
+    def flush(self):
+        '''
+        Send all queued packets now
+        '''
+        with self.mutex:
+            batch = self.__take()
+            if batch:
+                self.__send(batch)
+
+    def unsupported(self, batch):
+        '''
+        Disable batching and resend \p batch as individual packets
+        '''
+        with self.mutex:
+            if self.batching:
+                log.warning("Peer does not support batched sendPackets, sending packets one by one")
+            self.batching = False
+            for packet, iface in batch + self.__take():
+                self.sendPacket(packet, iface)
+
+    def stop(self):
+        '''
+        Flush queued packets and stop the flusher thread
+        '''
+        with self.mutex:
+            self.shouldStop = True
+            self.mutex.notify()
+        if self.flusher:
+            self.flusher.join()
+            self.flusher = None
+        self.flush()
+
+    def __take(self):
+        batch = self.batch
+        self.batch = []
+        self.batchBytes = 0
+        self.deadline = None
+        return batch
+
+    # called with the mutex held, so batches are sent in order
+    def __send(self, batch):
+        if not self.batching:
+            for packet, iface in batch:
+                self.sendPacket(packet, iface)
+            return
+        self.nBatches += 1
+        try:
+            self.sendPackets(batch)
+        except BatchingUnsupported:
+            self.unsupported(batch)
+
+    def __flusher(self):
+        while True:
+            with self.mutex:
+                while not self.shouldStop and (self.deadline is None or self.deadline > time.monotonic()):
+                    self.mutex.wait(None if self.deadline is None else self.deadline - time.monotonic())
+                if self.shouldStop:
+                    return
+                self.__send(self.__take())
@@ -0,0 +1,142 @@
+# -*- Mode: python; py-indent-offset: 4; indent-tabs-mode: nil; coding: utf-8; -*-
+# Copyright 2021 Alex Afanasyev
+#
+# This program is free software: you can redistribute it and/or modify it under the terms of
+# the GNU General Public License as published by the Free Software Foundation, either version
+# 3 of the License, or (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful, but WITHOUT ANY WARRANTY;
+# without even the implied warranty of MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.
+# See the GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License along with this program.
+# If not, see <http://www.gnu.org/licenses/>.
+
+import struct
+from array import array
+from .headers import EtherHeader, IpHeader, ArpHeader, IcmpHeader, ETHER_ADDR_LEN, ICMP_DATA_SIZE, _ipValue, _macValue
+from .utils import checksum
+from .stats import GENERATED, GEN_ARP_REQUEST, GEN_ARP_REPLY, GEN_ECHO_REPLY, GEN_TIME_EXCEEDED, GEN_PORT_UNREACHABLE
+
+BROADCAST = b'\xff' * ETHER_ADDR_LEN
+
+ETHER_SIZE = EtherHeader.SIZE
+IP_SIZE = IpHeader.SIZE
+ICMP_SIZE = 8
+
+# ICMP types and codes of the generated messages
+ICMP_ECHO_REPLY = 0
+ICMP_DEST_UNREACHABLE = 3
+ICMP_PORT_UNREACHABLE = 3
+ICMP_TIME_EXCEEDED = 11
+
+DEFAULT_TTL = 64
+
+# variable parts of the templates
+_ETHER_DHOST = struct.Struct("!6s")
+_ARP_TARGET = struct.Struct("!6sL")            # tha, tip
+_IP_LEN_ID = struct.Struct("!HH")              # len, id
+_IP_SUM = struct.Struct("!H")
+_IP_DST = struct.Struct("!L")
+_ICMP_ECHO = struct.Struct("!HH")              # id, seqNum
+
+_ARP_TARGET_OFFSET = ETHER_SIZE + 18
+_IP_OFFSET = ETHER_SIZE
+_ICMP_OFFSET = ETHER_SIZE + IP_SIZE
+
+class PacketTemplates:
+    '''
+    Pre-encoded packets originated by the router on interface \p iface: ARP requests and
+    replies, ICMP echo replies and ICMP errors.  Everything that depends only on the
+    interface (source MAC and IP, Ethernet type, ARP and IP constants) is encoded once;
+    generating a packet copies the template and patches in the destination, id/seq,
+    lengths and checksums.
+
+    Templates are rebuilt by SimpleRouterBase.reset() and available as `iface.templates`.
+    All methods return a new bytearray with the complete Ethernet frame.  Each generated
+    packet is counted in \p generated (array indexed by stats.GEN_* constants, shared with
+    the router's ForwardingStats).
+    '''
+
+    def __init__(self, iface, ttl=DEFAULT_TTL, generated=None):
+        self.iface = iface
+        self.generated = generated if generated is not None else array('Q', bytes(8 * len(GENERATED)))
+        mac = iface.mac.addr
+
+        arp = ArpHeader(hln=ETHER_ADDR_LEN, pln=4, sha=mac, sip=iface.ip)
+        arp.op = ArpHeader.Opcode.Request
+        self.arpRequestTemplate = EtherHeader(dhost=BROADCAST, shost=mac, type=0x0806).encode() + arp.encode()
+        arp.op = ArpHeader.Opcode.Reply
+        self.arpReplyTemplate = EtherHeader(shost=mac, type=0x0806).encode() + arp.encode()
+
+        # len, id, sum and dst are left zero and patched for each packet
+        ip = IpHeader(hl=5, ttl=ttl, p=IpHeader.Protocol.Icmp.value, src=iface.ip)
+        ipHeader = ip.encode()
+        self.ipPartialSum = 0xffff - checksum(ipHeader) # one's complement sum modulo 0xffff
+
+        ether = EtherHeader(shost=mac, type=0x0800).encode()
+        self.echoReplyTemplate = ether + ipHeader + IcmpHeader(type=ICMP_ECHO_REPLY).encode()
+        self.timeExceededTemplate = ether + ipHeader + IcmpHeader(type=ICMP_TIME_EXCEEDED).encode()
+        self.portUnreachableTemplate = ether + ipHeader + IcmpHeader(type=ICMP_DEST_UNREACHABLE, code=ICMP_PORT_UNREACHABLE).encode()
+
+    def arpRequest(self, tip):
+        '''
+        ARP request for target IP address \p tip
+        '''
+        self.generated[GEN_ARP_REQUEST] += 1
+        packet = bytearray(self.arpRequestTemplate)
+        _ARP_TARGET.pack_into(packet, _ARP_TARGET_OFFSET, b'\0' * ETHER_ADDR_LEN, _ipValue(tip))
+        return packet
+
+    def arpReply(self, tha, tip):
+        '''
+        ARP reply to host with MAC address \p tha and IP address \p tip
+        '''
+        self.generated[GEN_ARP_REPLY] += 1
+        tha = _macValue(tha)
+        packet = bytearray(self.arpReplyTemplate)
+        _ETHER_DHOST.pack_into(packet, 0, tha)
+        _ARP_TARGET.pack_into(packet, _ARP_TARGET_OFFSET, tha, _ipValue(tip))
+        return packet
+
+    def echoReply(self, dhost, dst, id, seqNum, data, ipId=0):
+        '''
+        ICMP echo reply to \p dst (sent to next-hop MAC \p dhost), echoing \p id, \p seqNum
+        and \p data of the request
+        '''
+        self.generated[GEN_ECHO_REPLY] += 1
+        return self.__icmp(self.echoReplyTemplate, dhost, dst, ipId, data, (id, seqNum))
+
+    def timeExceeded(self, dhost, dst, origIpPacket, ipId=0):
+        '''
+        ICMP time exceeded to \p dst (sent to next-hop MAC \p dhost), quoting the IP header
+        and the first 8 bytes of data of \p origIpPacket
+        '''
+        self.generated[GEN_TIME_EXCEEDED] += 1
+        return self.__icmp(self.timeExceededTemplate, dhost, dst, ipId, origIpPacket[:ICMP_DATA_SIZE])
+
+    def portUnreachable(self, dhost, dst, origIpPacket, ipId=0):
+        '''
+        ICMP port unreachable to \p dst (sent to next-hop MAC \p dhost), quoting the IP header
+        and the first 8 bytes of data of \p origIpPacket
+        '''
+        self.generated[GEN_PORT_UNREACHABLE] += 1
+        return self.__icmp(self.portUnreachableTemplate, dhost, dst, ipId, origIpPacket[:ICMP_DATA_SIZE])
+
+    def __icmp(self, template, dhost, dst, ipId, data, echo=None):
+        packet = bytearray(template)
+        packet += data
+        _ETHER_DHOST.pack_into(packet, 0, _macValue(dhost))
+
+        dst = _ipValue(dst)
+        length = len(packet) - ETHER_SIZE
+        _IP_LEN_ID.pack_into(packet, _IP_OFFSET + 2, length, ipId)
+        _IP_DST.pack_into(packet, _IP_OFFSET + 16, dst)
+        # patch zero len/id/dst into the precomputed sum (RFC 1624); all three fields are
+        # 16-bit aligned, so adding their values modulo 0xffff adds their 16-bit words
+        _IP_SUM.pack_into(packet, _IP_OFFSET + 10, 0xffff - (self.ipPartialSum + length + ipId + dst) % 0xffff)
+
+        if echo is not None:
+            _ICMP_ECHO.pack_into(packet, _ICMP_OFFSET + 4, *echo)
+        _IP_SUM.pack_into(packet, _ICMP_OFFSET + 2, checksum(memoryview(packet)[_ICMP_OFFSET:]))
+        return packet
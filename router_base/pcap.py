@@ -0,0 +1,249 @@
+# -*- Mode: python; py-indent-offset: 4; indent-tabs-mode: nil; coding: utf-8; -*-
+# Copyright 2021 Alex Afanasyev
+#
+# This program is free software: you can redistribute it and/or modify it under the terms of
+# the GNU General Public License as published by the Free Software Foundation, either version
+# 3 of the License, or (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful, but WITHOUT ANY WARRANTY;
+# without even the implied warranty of MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.
+# See the GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License along with this program.
+# If not, see <http://www.gnu.org/licenses/>.
+
+# Reading and writing of packet captures (pcap and pcapng, Ethernet link type only)
+
+import mmap
+import struct
+import time
+
+LINKTYPE_ETHERNET = 1
+
+PCAP_MAGIC_USEC = 0xa1b2c3d4
+PCAP_MAGIC_NSEC = 0xa1b23c4d
+PCAPNG_SHB = 0x0a0d0d0a
+PCAPNG_BYTE_ORDER_MAGIC = 0x1a2b3c4d
+PCAPNG_IDB = 1
+PCAPNG_SPB = 3
+PCAPNG_EPB = 6
+PCAPNG_OPT_TSRESOL = 9
+
+DEFAULT_SNAPLEN = 65535
+
+class PcapReader:
+    '''
+    Memory-mapped reader of pcap or pcapng file \p fileName.  Iterating yields
+    (timestamp, frame) tuples, where frame is a memoryview into the mapped file (valid
+    until the reader is closed; use bytes(frame) to keep it).
+
+        with PcapReader("trace.pcap") as reader:
+            for timestamp, frame in reader:
+                ...
+    '''
+
+    def __init__(self, fileName):
+        self.fileName = fileName
+        with open(fileName, "rb") as f:
+            self.map = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        self.buf = memoryview(self.map)
+        if len(self.buf) < 4:
+            self.close()
+            raise RuntimeError("%s is not a pcap or pcapng file" % fileName)
+
+        magic = self.buf[:4].tobytes()
+        if magic == struct.pack("<I", PCAPNG_SHB):
+            self.frames = self.__pcapng
+        elif magic in (struct.pack(order + "I", value) for order in "<>" for value in (PCAP_MAGIC_USEC, PCAP_MAGIC_NSEC)):
+            self.frames = self.__pcap
+        else:
+            self.close()
+            raise RuntimeError("%s is not a pcap or pcapng file" % fileName)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    def __iter__(self):
+        return self.frames()
+
+    def close(self):
+        if self.buf is not None:
+            self.buf.release()
+            self.buf = None
+            self.map.close()
+
+    def __pcap(self):
+        buf = self.buf
+        order = "<" if struct.unpack_from("<I", buf)[0] in (PCAP_MAGIC_USEC, PCAP_MAGIC_NSEC) else ">"
+        magic, major, minor, zone, sigfigs, snaplen, linkType = struct.unpack_from(order + "IHHiIII", buf)
+        if linkType != LINKTYPE_ETHERNET:
+            raise RuntimeError("Unsupported link type %d in %s (only Ethernet)" % (linkType, self.fileName))
+        scale = 1e-9 if magic == PCAP_MAGIC_NSEC else 1e-6
+
+        record = struct.Struct(order + "IIII")
+        offset = 24
+        while offset + record.size <= len(buf):
+            seconds, fraction, length, origLength = record.unpack_from(buf, offset)
+            offset += record.size
+            if offset + length > len(buf):
+                break # truncated file
+            yield (seconds + fraction * scale, buf[offset:offset + length])
+            offset += length
+
+    def __pcapng(self):
+        buf = self.buf
+        order = "<"
+        interfaces = [] # (link type, timestamp scale)
+        offset = 0
+        while offset + 12 <= len(buf):
+            blockType = struct.unpack_from(order + "I", buf, offset)[0]
+            if blockType == PCAPNG_SHB:
+                # each section may use different byte order
+                order = "<" if struct.unpack_from("<I", buf, offset + 8)[0] == PCAPNG_BYTE_ORDER_MAGIC else ">"
+                interfaces = []
+            blockLength = struct.unpack_from(order + "I", buf, offset + 4)[0]
+            if blockLength < 12 or offset + blockLength > len(buf):
+                break # truncated file
+            body = offset + 8
+            end = offset + blockLength - 4
+
+            if blockType == PCAPNG_IDB:
+                linkType = struct.unpack_from(order + "H", buf, body)[0]
+                interfaces.append((linkType, self.__tsresol(buf, order, body + 8, end)))
+            elif blockType == PCAPNG_EPB:
+                iface, high, low, length, origLength = struct.unpack_from(order + "IIIII", buf, body)
+                linkType, scale = interfaces[iface]
+                if linkType == LINKTYPE_ETHERNET:
+                    start = body + 20
+                    yield ((high << 32 | low) * scale, buf[start:start + length])
+            elif blockType == PCAPNG_SPB:
+                origLength = struct.unpack_from(order + "I", buf, body)[0]
+                if interfaces and interfaces[0][0] == LINKTYPE_ETHERNET:
+                    start = body + 4
+                    yield (0.0, buf[start:start + min(origLength, end - start)])
+            offset += blockLength
+
+    @staticmethod
+    def __tsresol(buf, order, offset, end):
+        scale = 1e-6
+        while offset + 4 <= end:
+            code, length = struct.unpack_from(order + "HH", buf, offset)
+            if code == 0:
+                break
+            if code == PCAPNG_OPT_TSRESOL:
+                value = buf[offset + 4]
+                scale = 2.0 ** -(value & 0x7f) if value & 0x80 else 10.0 ** -value
+            offset += 4 + (length + 3) // 4 * 4
+        return scale
+
+def readFrames(fileName):
+    '''
+    Return list of frames (bytes) from pcap/pcapng file \p fileName, or, for other files,
+    the whole file as a single raw Ethernet frame (e.g., tests/raw-packets/*.bin)
+    '''
+    try:
+        reader = PcapReader(fileName)
+    except RuntimeError:
+        with open(fileName, "rb") as f:
+            return [f.read()]
+    with reader:
+        return [bytes(frame) for timestamp, frame in reader]
+
+class PcapWriter:
+    '''
+    Writes frames into pcap file \p fileName (microsecond timestamps)
+    '''
+
+    HEADER = struct.Struct("<IHHiIII")
+    RECORD = struct.Struct("<IIII")
+
+    def __init__(self, fileName, snaplen=DEFAULT_SNAPLEN):
+        self.snaplen = snaplen
+        self.file = open(fileName, "wb")
+        self.file.write(PcapWriter.HEADER.pack(PCAP_MAGIC_USEC, 2, 4, 0, 0, snaplen, LINKTYPE_ETHERNET))
+
+    def write(self, frame, timestamp=None):
+        if timestamp is None:
+            timestamp = time.time()
+        seconds = int(timestamp)
+        captured = frame[:self.snaplen]
+        self.file.write(PcapWriter.RECORD.pack(seconds, int((timestamp - seconds) * 1e6), len(captured), len(frame)))
+        self.file.write(captured)
+
+    def flush(self):
+        self.file.flush()
+
+    def close(self):
+        self.file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+# pcapng enhanced packet block flags (direction)
+PCAPNG_INBOUND = 1
+PCAPNG_OUTBOUND = 2
+
+class PcapngWriter:
+    '''
+    Writes frames into pcapng file \p fileName, with a separate interface (IDB with if_name)
+    for each interface name and packet direction flags (microsecond timestamps)
+    '''
+
+    def __init__(self, fileName, snaplen=DEFAULT_SNAPLEN):
+        self.snaplen = snaplen
+        self.interfaces = {}
+        self.file = open(fileName, "wb")
+        self.__block(PCAPNG_SHB, struct.pack("<IHHq", PCAPNG_BYTE_ORDER_MAGIC, 1, 0, -1))
+
+    def __block(self, type, body):
+        body += b'\0' * (-len(body) % 4)
+        self.file.write(struct.pack("<II", type, len(body) + 12))
+        self.file.write(body)
+        self.file.write(struct.pack("<I", len(body) + 12))
+
+    @staticmethod
+    def __option(code, value):
+        return struct.pack("<HH", code, len(value)) + value + b'\0' * (-len(value) % 4)
+
+    def write(self, frame, timestamp=None, iface="", direction=0, origLength=None):
+        '''
+        Write \p frame received (PCAPNG_INBOUND) or sent (PCAPNG_OUTBOUND) on interface \p iface.
+        \p origLength is the length of the frame on the wire if \p frame is truncated
+        '''
+        ifaceId = self.interfaces.get(iface)
+        if ifaceId is None:
+            ifaceId = self.interfaces[iface] = len(self.interfaces)
+            options = self.__option(2, iface.encode()) + self.__option(0, b'') # if_name, opt_endofopt
+            self.__block(PCAPNG_IDB, struct.pack("<HHI", LINKTYPE_ETHERNET, 0, self.snaplen) + options)
+        if timestamp is None:
+            timestamp = time.time()
+        if origLength is None:
+            origLength = len(frame)
+        captured = frame[:self.snaplen]
+        ts = int(timestamp * 1e6)
+        body = struct.pack("<IIIII", ifaceId, ts >> 32, ts & 0xffffffff, len(captured), origLength) + captured
+        body += b'\0' * (-len(body) % 4)
+        if direction:
+            body += self.__option(2, struct.pack("<I", direction)) + self.__option(0, b'') # epb_flags
+        self.__block(PCAPNG_EPB, body)
+
+    def tell(self):
+        return self.file.tell()
+
+    def flush(self):
+        self.file.flush()
+
+    def close(self):
+        self.file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
@@ -14,6 +14,7 @@
 
 import Ice
 import os
+import signal
 import sys
 import logging
 import threading
@@ -29,19 +30,43 @@ if not slice_dir:
 Ice.loadSlice("", ["-I%s" % slice_dir, "%s/pox.ice" % os.path.dirname(os.path.realpath(__file__))])
 import pox
 
+from .packet_batcher import PacketBatcher, DEFAULT_MAX_PACKETS, DEFAULT_MAX_BYTES, DEFAULT_MAX_DELAY
+from .workers import WorkerPool, DEFAULT_RING_SIZE
+from .capture import INBOUND
+from .stats import formatStats
+
 class PacketHandler(pox.PacketHandler):
-    def __init__(self, router):
+    def __init__(self, router, workers=None):
         self.router = router
+        # WorkerPool that processes packets, if the router runs in multi-process mode
+        self.workers = workers
 
     def handlePacket(self, packet, inIface, current):
-      self.router.handlePacket(packet, inIface)
+      if self.workers:
+        if self.router.capture:
+          self.router.capture.record(packet, inIface, INBOUND)
+        self.workers.dispatch(packet, inIface)
+      else:
+        self.router.receivePacket(packet, inIface)
+
+    def handlePackets(self, packets, current):
+      if self.workers:
+        if self.router.capture:
+          for p in packets:
+            self.router.capture.record(p.packet, p.iface, INBOUND)
+        self.workers.dispatchMany([(p.packet, p.iface) for p in packets])
+      else:
+        self.router.handlePackets([(p.packet, p.iface) for p in packets])
 
     def resetRouter(self, ports, current):
       self.router.reset(ports)
+      if self.workers:
+        self.workers.reset(ports)
 
 class Tester(pox.Tester):
-    def __init__(self, router):
+    def __init__(self, router, workers=None):
         self.router = router
+        self.workers = workers
 
     def getArp(self, current):
         return str(self.router.getArp())
@@ -49,35 +74,70 @@ class Tester(pox.Tester):
     def getRoutingTable(self, current):
         return str(self.router.getRoutingTable())
 
+    def startCapture(self, prefix, current):
+        try:
+            return self.router.startCapture(prefix)
+        except RuntimeError as e:
+            return str(e)
+
+    def stopCapture(self, current):
+        return self.router.stopCapture()
+
+    def reloadRoutingTable(self, current):
+        result = self.router.reloadRoutingTable()
+        if self.workers:
+            self.workers.reloadRoutingTable()
+        return result
+
+    def getStats(self, format, current):
+        # in multi-process mode packets are counted by the workers
+        try:
+            stats = self.workers.getStats() if self.workers else self.router.getStats()
+        except RuntimeError as e:
+            return str(e)
+        return formatStats(stats, format)
+
 class PoxConnectorApp(Ice.Application):
   def __init__(self, simpleRouter):
     super().__init__()
     self.router = simpleRouter
   
   def run(self, argv):
-    rtFile = self.communicator().getProperties().getPropertyWithDefault("RoutingTable", "RTABLE")
-    self.router.getRoutingTable().load(rtFile)
+    # SIGHUP reloads the routing table (see interruptCallback)
+    self.callbackOnInterrupt()
+    self.tester = None
+    self.router.configure(self.communicator().getProperties())
 
     self.router.pox = pox.PacketInjectorPrx.checkedCast(self.communicator().propertyToProxy("SimpleRouter.Proxy").ice_twoway())
     if not self.router.pox:
       log.error("ERROR: Cannot connect to POX controller or invalid configuration of the controller")
       return -1
 
-    ifFile = self.communicator().getProperties().getPropertyWithDefault("Ifconfig", "IP_CONFIG")
-    self.router.loadIfconfig(ifFile)
+    self.router.batcher = self.createBatcher()
+
+    # multi-process mode: this process only shards received packets across the workers
+    # and sends packets coming back from them
+    workers = None
+    nWorkers = self.communicator().getProperties().getPropertyAsIntWithDefault("SimpleRouter.Workers", 0)
+    if nWorkers > 0:
+      ringSize = self.communicator().getProperties().getPropertyAsIntWithDefault("SimpleRouter.Workers.RingSize", DEFAULT_RING_SIZE)
+      workers = WorkerPool(type(self.router), self.communicator().getProperties().getPropertiesForPrefix(""),
+                           nWorkers, self.router.sendPacket, ringSize)
 
     adapter = self.communicator().createObjectAdapter("")
     ident = Ice.Identity()
     ident.name = Ice.generateUUID()
     ident.category = ""
 
-    adapter.add(PacketHandler(self.router), ident)
+    adapter.add(PacketHandler(self.router, workers), ident)
     adapter.activate()
     self.router.pox.ice_getConnection().setAdapter(adapter)
     self.router.pox.addPacketHandler(ident)
 
     ifaces = self.router.pox.getIfaces()
     self.router.reset(ifaces)
+    if workers:
+      workers.reset(ifaces)
 
     def poxPinger(self):
         while not self.shouldStop:
@@ -93,11 +153,55 @@ class PoxConnectorApp(Ice.Application):
     checkThread.start()
 
     testAdapter = self.communicator().createObjectAdapterWithEndpoints("Tester", "tcp -p 65500")
-    testAdapter.add(Tester(self.router), self.communicator().stringToIdentity("Tester"))
+    self.tester = Tester(self.router, workers)
+    testAdapter.add(self.tester, self.communicator().stringToIdentity("Tester"))
     testAdapter.activate()
 
     self.communicator().waitForShutdown()
     self.shouldStop = True
     self.router.arpCache.stop()
+    self.router.stopCapture()
+    if workers:
+      workers.stop()
+    if self.router.batcher:
+      self.router.batcher.stop()
     checkThread.join()
     return 0
+
+  def interruptCallback(self, sig):
+    if sig == signal.SIGHUP:
+      # reload in a separate thread, packets keep being forwarded meanwhile
+      if self.tester:
+        threading.Thread(target=self.tester.reloadRoutingTable, args=(None,)).start()
+    else:
+      self.communicator().shutdown()
+
+  def createBatcher(self):
+    '''
+    Create PacketBatcher for outgoing packets according to SimpleRouter.Batch.* properties,
+    or return None if batching is disabled or POX does not implement sendPackets
+    '''
+    props = self.communicator().getProperties()
+    maxPackets = props.getPropertyAsIntWithDefault("SimpleRouter.Batch.MaxPackets", DEFAULT_MAX_PACKETS)
+    maxBytes = props.getPropertyAsIntWithDefault("SimpleRouter.Batch.MaxBytes", DEFAULT_MAX_BYTES)
+    maxDelay = props.getPropertyAsIntWithDefault("SimpleRouter.Batch.MaxDelay", DEFAULT_MAX_DELAY)
+    if maxPackets <= 1:
+      return None
+
+    try:
+      self.router.pox.sendPackets([])
+    except Ice.OperationNotExistException:
+      log.warning("POX controller does not support sendPackets, packets will be sent one by one")
+      return None
+
+    injector = self.router.pox
+    def sendPackets(batch):
+      def onException(ex):
+        if isinstance(ex, Ice.OperationNotExistException):
+          batcher.unsupported(batch)
+        else:
+          log.error("sendPackets failed: %s" % ex)
+      injector.begin_sendPackets([pox.Packet(packet, iface) for packet, iface in batch], _ex=onException)
+
+    batcher = PacketBatcher(injector.begin_sendPacket, sendPackets, maxPackets, maxBytes, maxDelay)
+    return batcher
@@ -0,0 +1,53 @@
+# -*- Mode: python; py-indent-offset: 4; indent-tabs-mode: nil; coding: utf-8; -*-
+# Copyright 2021 Alex Afanasyev
+#
+# This program is free software: you can redistribute it and/or modify it under the terms of
+# the GNU General Public License as published by the Free Software Foundation, either version
+# 3 of the License, or (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful, but WITHOUT ANY WARRANTY;
+# without even the implied warranty of MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.
+# See the GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License along with this program.
+# If not, see <http://www.gnu.org/licenses/>.
+
+class PropertyDict:
+    '''
+    Router properties with the Ice.Properties accessors used by SimpleRouterBase.configure(),
+    for running without the Ice runtime (and for passing properties to worker processes)
+    '''
+    def __init__(self, props=None):
+        self.props = dict(props or {})
+
+    def getPropertyWithDefault(self, name, default):
+        return self.props.get(name, default)
+
+    def getPropertyAsIntWithDefault(self, name, default):
+        value = self.props.get(name, "")
+        return int(value) if value else default
+
+    def setProperty(self, name, value):
+        self.props[name] = value
+
+def loadProperties(fileName=None, args=()):
+    '''
+    Load properties from Ice-style configuration file \p fileName (`name = value` lines,
+    `#` comments), overridden by `--name=value` items of \p args
+    '''
+    props = PropertyDict()
+    if fileName:
+        with open(fileName, "rt") as f:
+            for cnt, line in enumerate(f):
+                line = line.split("#", 1)[0].strip()
+                if not line:
+                    continue
+                if "=" not in line:
+                    raise RuntimeError("Error on line %d of %s: expected `name = value`, got [%s]" % (cnt + 1, fileName, line))
+                name, value = line.split("=", 1)
+                props.setProperty(name.strip(), value.strip())
+    for arg in args:
+        if arg.startswith("--") and "=" in arg:
+            name, value = arg[2:].split("=", 1)
+            props.setProperty(name, value)
+    return props
@@ -0,0 +1,90 @@
+# -*- Mode: python; py-indent-offset: 4; indent-tabs-mode: nil; coding: utf-8; -*-
+# Copyright 2021 Alex Afanasyev
+#
+# This program is free software: you can redistribute it and/or modify it under the terms of
+# the GNU General Public License as published by the Free Software Foundation, either version
+# 3 of the License, or (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful, but WITHOUT ANY WARRANTY;
+# without even the implied warranty of MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.
+# See the GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License along with this program.
+# If not, see <http://www.gnu.org/licenses/>.
+
+# Replay of captured frames through the router, without Mininet or POX
+
+import math
+import time
+
+from .local_injector import LocalPacketInjector, Port
+
+PERCENTILES = (50, 90, 99, 99.9)
+
+def percentile(sortedValues, p):
+    '''
+    \p p-th percentile (nearest rank) of non-empty sorted list \p sortedValues
+    '''
+    rank = math.ceil(p / 100 * len(sortedValues))
+    return sortedValues[max(0, min(len(sortedValues), rank) - 1)]
+
+def localPorts(router, names=None):
+    '''
+    Ports with synthetic MAC addresses for interfaces \p names (by default, all interfaces
+    referenced by the routing table)
+    '''
+    if names is None:
+        names = sorted({entry.ifName for entry in router.getRoutingTable().entries})
+    return [Port(name, (n + 1).to_bytes(6, 'big')) for n, name in enumerate(names)]
+
+def replay(router, frames, inIface, repeat=1, injector=None):
+    '''
+    Feed \p frames (sequence of bytes) \p repeat times into router.handlePacket as if received
+    on interface \p inIface, with a LocalPacketInjector as the router's pox (created for
+    the router's configured interfaces, unless \p injector is given).
+
+    Returns dict with number of input and output frames, elapsed time, packets per second,
+    and per-packet handlePacket latency percentiles (microseconds)
+    '''
+    if injector is None:
+        injector = LocalPacketInjector(localPorts(router))
+        injector.attach(router)
+
+    handlePacket = router.handlePacket
+    clock = time.perf_counter_ns
+    latencies = []
+    record = latencies.append
+    sentBefore = len(injector.sent)
+
+    started = clock()
+    for i in range(repeat):
+        for frame in frames:
+            begin = clock()
+            handlePacket(frame, inIface)
+            record(clock() - begin)
+    elapsed = (clock() - started) / 1e9
+    if router.batcher:
+        router.batcher.flush()
+
+    latencies.sort()
+    report = {
+        'input': len(latencies),
+        'output': len(injector.sent) - sentBefore,
+        'seconds': elapsed,
+        'pps': len(latencies) / elapsed if elapsed > 0 else 0.0,
+        'latency': {},
+        }
+    if latencies:
+        report['latency'] = {"p%g" % p: percentile(latencies, p) / 1e3 for p in PERCENTILES}
+        report['latency']['max'] = latencies[-1] / 1e3
+        report['latency']['mean'] = sum(latencies) / len(latencies) / 1e3
+    return report
+
+def formatReport(report):
+    lines = ["Input frames:   %d" % report['input'],
+             "Output frames:  %d" % report['output'],
+             "Elapsed:        %.3f s" % report['seconds'],
+             "Throughput:     %.0f packets/s" % report['pps']]
+    if report['latency']:
+        lines.append("Latency (us):   " + "  ".join("%s=%.2f" % (name, value) for name, value in report['latency'].items()))
+    return "\n".join(lines)
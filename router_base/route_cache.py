@@ -0,0 +1,91 @@
+# -*- Mode: python; py-indent-offset: 4; indent-tabs-mode: nil; coding: utf-8; -*-
+# Copyright 2021 Alex Afanasyev
+#
+# This program is free software: you can redistribute it and/or modify it under the terms of
+# the GNU General Public License as published by the Free Software Foundation, either version
+# 3 of the License, or (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful, but WITHOUT ANY WARRANTY;
+# without even the implied warranty of MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.
+# See the GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License along with this program.
+# If not, see <http://www.gnu.org/licenses/>.
+
+import threading
+from collections import OrderedDict
+
+DEFAULT_ROUTE_CACHE_SIZE = 1024
+
+class RouteCache:
+    '''
+    Bounded LRU cache of longest prefix match results keyed on integer destination
+    address.  "No route" results are cached as well.
+
+    Every clear() bumps the generation number; results computed against an older
+    generation are not stored, so a lookup racing with a table update cannot put
+    a stale result back into the cache.
+    '''
+
+    MISS = object()
+
+    def __init__(self, capacity=DEFAULT_ROUTE_CACHE_SIZE):
+        self.capacity = capacity
+        self.entries = OrderedDict()
+        self.generation = 0
+        self.mutex = threading.Lock()
+
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, addr):
+        '''
+        Return cached result for \p addr or RouteCache.MISS (not counted when the cache
+        is disabled)
+        '''
+        if self.capacity <= 0:
+            return RouteCache.MISS
+        with self.mutex:
+            try:
+                result = self.entries[addr]
+            except KeyError:
+                self.misses += 1
+                return RouteCache.MISS
+            self.entries.move_to_end(addr)
+            self.hits += 1
+            return result
+
+    def put(self, addr, result, generation):
+        '''
+        Store \p result for \p addr, unless the cache was cleared after \p generation
+        was obtained
+        '''
+        if self.capacity <= 0:
+            return
+        with self.mutex:
+            if generation != self.generation:
+                return
+            self.entries[addr] = result
+            if len(self.entries) > self.capacity:
+                self.entries.popitem(last=False)
+                self.evictions += 1
+
+    def resize(self, capacity):
+        with self.mutex:
+            self.capacity = capacity
+            while len(self.entries) > max(capacity, 0):
+                self.entries.popitem(last=False)
+                self.evictions += 1
+
+    def clear(self):
+        with self.mutex:
+            self.entries.clear()
+            self.generation += 1
+
+    def __len__(self):
+        return len(self.entries)
+
+    def __str__(self):
+        return "RouteCache: size=%d capacity=%d hits=%d misses=%d evictions=%d" % (
+            len(self.entries), self.capacity, self.hits, self.misses, self.evictions)
@@ -13,7 +13,12 @@
 # If not, see <http://www.gnu.org/licenses/>.
 
 from .ip_address import IpAddress
+from .lpm import Engines, VectorIndex, prefixLength
+from .route_cache import RouteCache, DEFAULT_ROUTE_CACHE_SIZE
+from . import rtable_snapshot
 import io
+import socket
+import threading
 from functools import partial
 
 class RoutingTableEntry:
@@ -41,24 +46,262 @@ class RoutingTableEntry:
     def __str__(self):
         return f"{str(self.dest):18} {str(self.mask):18} {str(self.gw):18} {self.ifName}"
     
+def routeKey(entry):
+    '''
+    (dest, gw, mask, ifName) of RoutingTableEntry \p entry, with integer addresses
+    '''
+    return (int(entry.dest), int(entry.gw), int(entry.mask), entry.ifName)
+
+def parseRoute(line):
+    '''
+    (dest, gw, mask, ifName) of RTABLE line \p line, with integer addresses.  Raises
+    ValueError or OSError (invalid address) if the line cannot be parsed
+    '''
+    dest, gw, mask, iface = line.split()
+    aton = lambda addr: int.from_bytes(socket.inet_pton(socket.AF_INET, addr), 'big')
+    return (aton(dest), aton(gw), aton(mask), iface)
+
 class RoutingTableBase:
 
-    def __init__(self):
-        self.entries = []
-    
+    def __init__(self, engine="trie", cacheSize=DEFAULT_ROUTE_CACHE_SIZE):
+        # entries and the prefix index (which maps prefixes to positions in entries) are
+        # published together as one (entries, index) tuple, so that a lookup never combines
+        # the index of one version of the table with the entries of another
+        self.routes = ([], None)
+        self.cache = RouteCache(cacheSize)
+        self.snapshot = False
+        self.reloadMutex = threading.Lock()
+        self.setEngine(engine)
+
+    entries = property(lambda self: self.routes[0], lambda self, entries: setattr(self, "routes", (entries, self.routes[1])))
+    index = property(lambda self: self.routes[1], lambda self, index: setattr(self, "routes", (self.routes[0], index)))
+
+    def __publish(self, entries, index):
+        self.routes = (entries, index)
+        self.vectorIndex = None
+        self.cache.clear()
+
+    def setEngine(self, engine):
+        '''
+        Select longest prefix match engine by name (see router_base.lpm.Engines) and
+        re-index existing entries
+        '''
+        try:
+            index = Engines[engine]()
+        except KeyError:
+            raise RuntimeError("Unknown routing table engine `%s` (expected one of: %s)" % (engine, ", ".join(Engines)))
+        self.__indexEntries(index)
+        if self.entries:
+            self.__buildIndex(index)
+        self.engine = engine
+        self.__publish(self.entries, index)
+
+    def setCacheSize(self, cacheSize):
+        '''
+        Set maximum number of destinations in the route cache (0 disables the cache)
+        '''
+        self.cache.resize(cacheSize)
+
+    def setSnapshot(self, enabled):
+        '''
+        Enable use of compiled snapshots (<file>.snapshot, see router_base.rtable_snapshot)
+        when loading the routing table into an empty table
+        '''
+        self.snapshot = enabled
+
+    def __indexEntries(self, index, entries=None):
+        if entries is None:
+            entries = self.entries
+        if isinstance(entries, rtable_snapshot.SnapshotEntries):
+            for prefix, length, pos in entries.prefixes():
+                index.insert(prefix, length, pos)
+            return
+        for pos, entry in enumerate(entries):
+            mask = int(entry.mask)
+            index.insert(int(entry.dest) & mask, prefixLength(mask), pos)
+
+    @staticmethod
+    def __buildIndex(index):
+        # engines with lookup arrays (dir-24-8) build them before the index is published,
+        # their lookups only use arrays that are already built
+        if hasattr(index, "getTables"):
+            index.getTables()
+
+    def __loadSnapshot(self, file):
+        snapshot = rtable_snapshot.openSnapshot(file)
+        if snapshot is None:
+            return False
+
+        entries = rtable_snapshot.SnapshotEntries(snapshot, RoutingTableEntry)
+        index = Engines[self.engine]()
+        if snapshot.tables is not None and hasattr(index, "setTables"):
+            index.setTables(*snapshot.tables, prefixes=entries.prefixes)
+        else:
+            self.__indexEntries(index, entries)
+            self.__buildIndex(index)
+        self.__publish(entries, index)
+
+        if snapshot.tables is None and hasattr(index, "getTables"):
+            # add prebuilt index for this engine to the snapshot
+            rtable_snapshot.saveSnapshot(file, snapshot.sourceHash, entries, index.getTables())
+        return True
+
     def load(self, file):
         """Load routing table from file"""
 
-        with open(file, "rt") as f:
-            for line in f:
-                dest, gw, mask, iface = line.split()
-                entry = RoutingTableEntry(dest, gw, mask, iface)
-                self.addEntry(entry)
+        useSnapshot = self.snapshot and not self.entries
+        if useSnapshot and self.__loadSnapshot(file):
+            return
+
+        lines, digest = rtable_snapshot.readSource(file)
+        self.addEntries([RoutingTableEntry(*line.split()) for line in lines])
+
+        if useSnapshot:
+            tables = self.index.getTables() if hasattr(self.index, "getTables") else None
+            rtable_snapshot.saveSnapshot(file, digest, self.entries, tables)
 
     def addEntry(self, entry):
         if not isinstance(entry, RoutingTableEntry):
             raise RuntimeError(".addEntry method expects RoutingTableEntry as the only parameter")
-        self.entries.append(entry)
+        self.addEntries([entry])
+
+    def addEntries(self, newEntries):
+        '''
+        Append RoutingTableEntry objects \p newEntries.
+
+        Engines with lookup arrays (dir-24-8) rebuild them for every call, so entries
+        should be added in batches: the entries are added to copies of the entries and the
+        index, which are built and then published together like in reload(), and lookups
+        keep using the current table meanwhile
+        '''
+        prefixes = []
+        for entry in newEntries:
+            if not isinstance(entry, RoutingTableEntry):
+                raise RuntimeError(".addEntries method expects RoutingTableEntry objects")
+            mask = int(entry.mask)
+            prefixes.append((int(entry.dest) & mask, prefixLength(mask))) # raises for invalid masks
+
+        with self.reloadMutex:
+            entries, index = self.routes
+            if hasattr(index, "getTables") or not isinstance(entries, list): # snapshot entries are read-only
+                entries, index = list(entries), index.copy()
+            for entry, (prefix, length) in zip(newEntries, prefixes):
+                entries.append(entry)
+                index.insert(prefix, length, len(entries) - 1)
+            self.__buildIndex(index)
+            self.__publish(entries, index)
+
+    def reload(self, file):
+        '''
+        Replace contents of the table with routing table \p file while the table is in use.
+
+        The file is compared with the current entries: unchanged entries (same dest, gw,
+        mask and interface) keep their RoutingTableEntry objects, and only prefixes whose
+        entries were added or removed or whose first entry moved are updated in a copy of
+        the index.  Entries stay in the order of the file, so the result (including which
+        of duplicate prefixes wins) is the same as load() of the file into an empty table.
+        The new entries and index are then published with a single reference assignment,
+        so a concurrent lookup sees either the old or the new table.
+
+        Returns (number of added entries, number of removed entries).  If the file cannot
+        be read or parsed, the table is not changed
+        '''
+        lines, digest = rtable_snapshot.readSource(file)
+        routes = [parseRoute(line) for line in lines]
+
+        with self.reloadMutex:
+            entries, index = self.routes
+            keys = [routeKey(entry) for entry in entries]
+            if keys == routes:
+                return (0, 0)
+
+            # reuse unchanged entries, the first of identical ones first
+            unchanged = {}
+            for entry, key in zip(reversed(entries), reversed(keys)):
+                unchanged.setdefault(key, []).append(entry)
+            newEntries = []
+            added = 0
+            for key in routes:
+                reused = unchanged.get(key)
+                if reused:
+                    newEntries.append(reused.pop())
+                else:
+                    newEntries.append(RoutingTableEntry(*key))
+                    added += 1
+            removed = sum(len(reused) for reused in unchanged.values())
+
+            lengths = {}
+            def firstPositions(keys):
+                # position of the first entry with each (prefix, length), the one the index returns
+                first = {}
+                for pos, (dest, gw, mask, ifName) in enumerate(keys):
+                    length = lengths.get(mask)
+                    if length is None:
+                        length = lengths[mask] = prefixLength(mask)
+                    first.setdefault((dest & mask, length), pos)
+                return first
+
+            current = firstPositions(keys)
+            first = firstPositions(routes)
+            changed = [(prefix, length, pos) for (prefix, length), pos in first.items()
+                       if current.pop((prefix, length), None) != pos]
+            if len(changed) + len(current) > len(first) // 2:
+                # most entries moved (e.g., lines added or removed near the top of the file),
+                # a new index is cheaper than updating a copy
+                index = Engines[self.engine]()
+                for (prefix, length), pos in first.items():
+                    index.insert(prefix, length, pos)
+            else:
+                index = index.copy()
+                for prefix, length, pos in changed:
+                    index.remove(prefix, length)
+                    index.insert(prefix, length, pos)
+                for prefix, length in current:
+                    index.remove(prefix, length)
+            self.__buildIndex(index) # before the index is published
+
+            self.__publish(newEntries, index)
+
+            if self.snapshot:
+                rtable_snapshot.saveSnapshot(file, digest, newEntries, index.getTables() if hasattr(index, "getTables") else None)
+            return (added, removed)
+
+    def longestPrefixMatch(self, ip):
+        '''
+        Find entry with the longest prefix matching \p ip (IpAddress or integer) using
+        the route cache and then the prefix index.  Returns None if no entry matches.
+        '''
+        addr = int(ip)
+        entry = self.cache.get(addr)
+        if entry is not RouteCache.MISS:
+            return entry
+
+        generation = self.cache.generation
+        entries, index = self.routes
+        pos = index.lookup(addr)
+        entry = entries[pos] if pos is not None else None
+        self.cache.put(addr, entry, generation)
+        return entry
+
+    def lookupMany(self, addrs):
+        '''
+        Longest prefix match for a NumPy uint32 array of addresses.  Returns int64 array
+        of positions in self.entries (-1 where there is no matching entry).
+
+        Requires NumPy; the vectorized index is built on the first call after the table
+        changes.
+        '''
+        entries = self.entries
+        cached = self.vectorIndex
+        if cached is not None and cached[0] is entries:
+            vectorIndex = cached[1]
+        else:
+            if isinstance(entries, rtable_snapshot.SnapshotEntries):
+                vectorIndex = VectorIndex(entries.snapshot.dests, entries.snapshot.masks)
+            else:
+                vectorIndex = VectorIndex([int(entry.dest) for entry in entries], [int(entry.mask) for entry in entries])
+            self.vectorIndex = (entries, vectorIndex)
+        return vectorIndex.lookupMany(addrs)
 
     def __str__(self):
         f = io.StringIO()
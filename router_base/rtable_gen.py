@@ -0,0 +1,83 @@
+# -*- Mode: python; py-indent-offset: 4; indent-tabs-mode: nil; coding: utf-8; -*-
+# Copyright 2021 Alex Afanasyev
+#
+# This program is free software: you can redistribute it and/or modify it under the terms of
+# the GNU General Public License as published by the Free Software Foundation, either version
+# 3 of the License, or (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful, but WITHOUT ANY WARRANTY;
+# without even the implied warranty of MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.
+# See the GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License along with this program.
+# If not, see <http://www.gnu.org/licenses/>.
+
+
+# Synthetic routing tables in RTABLE format
+#
+# Prefix lengths follow the distribution of a full IPv4 BGP table (mostly /24, then /22-/23
+# and /16-/21, a few shorter prefixes and host routes).  Part of the prefixes are more-specifics
+# of earlier (shorter) prefixes, so that lookups have to choose between nested matches, as in
+# real tables.
+
+import ipaddress
+import random
+
+# (prefix length, relative weight in %)
+PREFIX_LENGTHS = (
+    (8, 0.01), (9, 0.01), (10, 0.03), (11, 0.1), (12, 0.2), (13, 0.4), (14, 0.8), (15, 0.6),
+    (16, 1.5), (17, 1.0), (18, 1.8), (19, 3.0), (20, 3.8), (21, 4.5), (22, 10.0), (23, 8.5),
+    (24, 57.0), (25, 0.5), (26, 0.6), (27, 0.4), (28, 0.3), (29, 0.3), (30, 0.2), (32, 0.5),
+    )
+
+# fraction of prefixes created as more-specifics of earlier prefixes
+NESTED_FRACTION = 0.3
+
+DEFAULT_IFACES = ("sw0-eth1", "sw0-eth2", "sw0-eth3")
+
+def lengthToMask(length):
+    return (0xffffffff << (32 - length)) & 0xffffffff
+
+def generateRoutes(count, seed=0, ifaces=DEFAULT_IFACES, defaultRoute=True):
+    '''
+    List of \p count distinct routes (dest, gw, mask, ifName) with integer addresses and
+    internet-like prefix lengths; the first one is the default route if \p defaultRoute.
+    Gateways are hosts in 10.0.<n>.0/24 of the interface they are reached through
+    '''
+    rnd = random.Random(seed)
+    lengths, weights = zip(*PREFIX_LENGTHS)
+    seen = set()
+    routes = []
+
+    def add(dest, length):
+        mask = lengthToMask(length)
+        dest &= mask
+        if (dest, length) in seen:
+            return False
+        seen.add((dest, length))
+        n = rnd.randrange(len(ifaces))
+        routes.append((dest, 0x0a000000 | (n + 1) << 8 | rnd.randrange(1, 255), mask, ifaces[n]))
+        return True
+
+    if defaultRoute and count > 0:
+        add(0, 0)
+    while len(routes) < count:
+        length = rnd.choices(lengths, weights)[0]
+        if routes and rnd.random() < NESTED_FRACTION:
+            # more-specific of an existing shorter prefix
+            parent, gw, mask, ifName = routes[rnd.randrange(len(routes))]
+            parentLength = bin(mask).count('1')
+            if parentLength < length:
+                add(parent | rnd.getrandbits(32 - parentLength), length)
+                continue
+        add(rnd.getrandbits(32), length)
+    return routes
+
+def writeRtable(routes, fileName):
+    '''
+    Write \p routes (as returned by generateRoutes) into \p fileName in RTABLE format
+    '''
+    ntoa = lambda value: str(ipaddress.IPv4Address(value))
+    with open(fileName, "wt") as f:
+        for dest, gw, mask, ifName in routes:
+            f.write("%s\t%s\t%s\t%s\n" % (ntoa(dest), ntoa(gw), ntoa(mask), ifName))
@@ -0,0 +1,210 @@
+# -*- Mode: python; py-indent-offset: 4; indent-tabs-mode: nil; coding: utf-8; -*-
+# Copyright 2021 Alex Afanasyev
+#
+# This program is free software: you can redistribute it and/or modify it under the terms of
+# the GNU General Public License as published by the Free Software Foundation, either version
+# 3 of the License, or (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful, but WITHOUT ANY WARRANTY;
+# without even the implied warranty of MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.
+# See the GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License along with this program.
+# If not, see <http://www.gnu.org/licenses/>.
+
+
+# Compiled binary snapshots of RTABLE files
+#
+# RoutingTableBase.load (with snapshots enabled, see RoutingTableBase.setSnapshot) keeps
+# a compiled copy of the text file in <file>.snapshot and uses it instead of parsing the
+# text when the SHA-256 of the text matches the one recorded in the snapshot; otherwise
+# the text is parsed and the snapshot regenerated.
+#
+# The snapshot is memory-mapped.  Entries are stored column-wise as packed arrays (dest,
+# gw, mask as uint32, interface as uint16 index into the list of interned interface names),
+# and RoutingTableEntry objects are only created when an entry is accessed.  If the
+# routing table uses the dir-24-8 engine, the snapshot also holds its lookup arrays, so
+# loading does not rebuild the index either.
+#
+# File layout (native byte order, recorded in the header):
+#
+#     header                 HEADER
+#     section table          SECTION x N_SECTIONS: (offset, length) of each section
+#     sections               ifnames (utf-8, '\n'-separated), dest, gw, mask, ifindex,
+#                            tbl24, tblLong (empty if there is no prebuilt index);
+#                            each starts at a multiple of 8 bytes
+
+import collections.abc
+import hashlib
+import logging
+import mmap
+import os
+import struct
+import sys
+from array import array
+
+from .lpm import prefixLength
+
+log = logging.getLogger("riddikulus.rtable_snapshot")
+
+MAGIC = b"RTSNAP\r\n"
+VERSION = 1
+HEADER = struct.Struct("<8sIB32sII")  # magic, version, little-endian flag, source SHA-256, entries, interfaces
+SECTION = struct.Struct("<QQ")
+N_SECTIONS = 7
+IFNAMES, DEST, GW, MASK, IFINDEX, TBL24, TBLLONG = range(N_SECTIONS)
+SECTION_FORMATS = (None, 'I', 'I', 'I', 'H', 'I', 'I')
+_ALIGN = 8
+
+def snapshotPath(fileName):
+    return fileName + ".snapshot"
+
+def sourceHash(fileName):
+    '''
+    SHA-256 digest of the contents of \p fileName
+    '''
+    digest = hashlib.sha256()
+    with open(fileName, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b''):
+            digest.update(block)
+    return digest.digest()
+
+def readSource(fileName):
+    '''
+    Read RTABLE file \p fileName; returns (list of lines, SHA-256 digest of the bytes the
+    lines were decoded from), so a snapshot records the hash of exactly what was parsed
+    even if the file is changed in the meantime
+    '''
+    with open(fileName, "rb") as f:
+        data = f.read()
+    return data.decode().splitlines(), hashlib.sha256(data).digest()
+
+class Snapshot:
+    '''
+    Memory-mapped snapshot file \p fileName.  Raises RuntimeError if the file is not a
+    snapshot of the current version and byte order
+    '''
+
+    def __init__(self, fileName):
+        with open(fileName, "rb") as f:
+            self.map = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        buf = memoryview(self.map)
+        if len(buf) < HEADER.size + SECTION.size * N_SECTIONS:
+            raise RuntimeError("%s is not a routing table snapshot" % fileName)
+        magic, version, littleEndian, self.sourceHash, self.nEntries, nIfaces = HEADER.unpack_from(buf)
+        if magic != MAGIC or version != VERSION or littleEndian != (sys.byteorder == "little"):
+            raise RuntimeError("%s is not a routing table snapshot of version %d (native byte order)" % (fileName, VERSION))
+
+        sections = []
+        for n in range(N_SECTIONS):
+            offset, length = SECTION.unpack_from(buf, HEADER.size + n * SECTION.size)
+            if offset + length > len(buf):
+                raise RuntimeError("%s is truncated" % fileName)
+            data = buf[offset:offset + length]
+            sections.append(data.cast(SECTION_FORMATS[n]) if SECTION_FORMATS[n] else data)
+
+        self.names = bytes(sections[IFNAMES]).decode().split("\n") if nIfaces else []
+        self.dests, self.gws, self.masks, self.ifIndexes = sections[DEST:IFINDEX + 1]
+        if any(len(column) != self.nEntries for column in (self.dests, self.gws, self.masks, self.ifIndexes)):
+            raise RuntimeError("%s is corrupted" % fileName)
+        self.tables = (sections[TBL24], sections[TBLLONG]) if len(sections[TBL24]) else None
+
+def openSnapshot(fileName):
+    '''
+    Snapshot of RTABLE file \p fileName, or None if there is no snapshot or it is out of date
+    '''
+    try:
+        snapshot = Snapshot(snapshotPath(fileName))
+    except (OSError, ValueError, RuntimeError):
+        return None
+    if snapshot.sourceHash != sourceHash(fileName):
+        return None
+    return snapshot
+
+def saveSnapshot(fileName, digest, entries, tables=None):
+    '''
+    Write snapshot of RTABLE file \p fileName with \p entries (sequence of RoutingTableEntry)
+    and optional dir-24-8 lookup arrays \p tables = (tbl24, tblLong).  \p digest is the
+    SHA-256 of the text the entries were parsed from (see readSource).  The snapshot is
+    replaced atomically, so processes that have the old one mapped are not affected.
+    Returns False (and logs a warning) if the snapshot cannot be written
+    '''
+    names = {}
+    dests, gws, masks, ifIndexes = array('I'), array('I'), array('I'), array('H')
+    dests.extend(int(entry.dest) for entry in entries)
+    gws.extend(int(entry.gw) for entry in entries)
+    masks.extend(int(entry.mask) for entry in entries)
+    ifIndexes.extend(names.setdefault(entry.ifName, len(names)) for entry in entries)
+    sections = ["\n".join(names).encode(), dests, gws, masks, ifIndexes]
+    sections.extend(tables if tables is not None else (b'', b''))
+
+    header = HEADER.pack(MAGIC, VERSION, sys.byteorder == "little", digest, len(dests), len(names))
+    offset = HEADER.size + SECTION.size * N_SECTIONS
+    table = b''
+    for section in sections:
+        offset = (offset + _ALIGN - 1) // _ALIGN * _ALIGN
+        length = memoryview(section).nbytes
+        table += SECTION.pack(offset, length)
+        offset += length
+
+    path = snapshotPath(fileName)
+    tmpPath = "%s.%d.tmp" % (path, os.getpid())
+    try:
+        with open(tmpPath, "wb") as f:
+            f.write(header + table)
+            for section in sections:
+                f.write(b'\0' * (-f.tell() % _ALIGN))
+                f.write(section)
+        os.replace(tmpPath, path)
+    except OSError as e:
+        log.warning("Cannot write routing table snapshot %s: %s" % (path, e))
+        try:
+            os.unlink(tmpPath)
+        except OSError:
+            pass
+        return False
+    return True
+
+class SnapshotEntries(collections.abc.Sequence):
+    '''
+    Read-only sequence of \p entryClass (RoutingTableEntry) objects backed by \p snapshot;
+    an entry object is created on first access and reused afterwards
+    '''
+
+    def __init__(self, snapshot, entryClass):
+        self.snapshot = snapshot
+        self.entryClass = entryClass
+        self.created = {}
+
+    def __len__(self):
+        return self.snapshot.nEntries
+
+    def __getitem__(self, pos):
+        if isinstance(pos, slice):
+            return [self[n] for n in range(*pos.indices(len(self)))]
+        if pos < 0:
+            pos += len(self)
+        if not 0 <= pos < len(self):
+            raise IndexError("routing table entry index out of range")
+        entry = self.created.get(pos)
+        if entry is None:
+            snapshot = self.snapshot
+            entry = self.created.setdefault(pos, self.entryClass(snapshot.dests[pos], snapshot.gws[pos], snapshot.masks[pos],
+                                                                 snapshot.names[snapshot.ifIndexes[pos]]))
+        return entry
+
+    def __iter__(self):
+        for pos in range(len(self)):
+            yield self[pos]
+
+    def prefixes(self):
+        '''
+        Iterate over (masked prefix, prefix length, position) of all entries, without
+        creating entry objects
+        '''
+        lengths = {}
+        for pos, (dest, mask) in enumerate(zip(self.snapshot.dests, self.snapshot.masks)):
+            length = lengths.get(mask)
+            if length is None:
+                length = lengths[mask] = prefixLength(mask)
+            yield dest & mask, length, pos
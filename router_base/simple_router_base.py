@@ -12,12 +12,17 @@
 # You should have received a copy of the GNU General Public License along with this program.
 # If not, see <http://www.gnu.org/licenses/>.
 
-import Ice
 import os
 import logging
 import sys
-from .interface import Interface
+from .interface import Interface, InterfaceIndex
 from .ip_address import IpAddress
+from .packet_templates import PacketTemplates
+from .headers import _ipValue, _macValue
+from . import capture
+from .capture import Capture, INBOUND, OUTBOUND
+from .stats import ForwardingStats, addRatios
+from .arp_cache_base import QueueLimit, ARP_MAX_PACKETS_PER_REQUEST, ARP_MAX_QUEUED_BYTES, ARP_MAX_REQUESTS
 
 log = logging.getLogger("riddikulus.simple_router_base")
 
@@ -25,18 +30,182 @@ class SimpleRouterBase:
     def __init__(self, routingTable, arpCache):
         self.routingTable = routingTable
         self.arpCache = arpCache
-        self.ifaces = []
+        # routing table file, for reloadRoutingTable
+        self.routingTableFile = None
+        # PacketBatcher for outgoing packets (set up by PoxConnectorApp), None to send
+        # each packet with a separate pox.sendPacket call
+        self.batcher = None
+        # Capture of received and sent frames (startCapture/stopCapture), None if disabled
+        self.capture = None
+        self.captureConfig = {'prefix': "capture"}
+        # forwarding counters (see getStats and countDrop)
+        self.stats = ForwardingStats()
         self.ifNameToIpMap = {}
+        # interfaces and their indexes (replaced as a whole by reset)
+        self.ifaceIndex = InterfaceIndex()
+
+    # interface list, indexes keyed by name, integer IP and MAC bytes, and integer IP
+    # addresses of all router interfaces (read-only, from the current ifaceIndex)
+    ifaces = property(lambda self: self.ifaceIndex.ifaces)
+    ifacesByName = property(lambda self: self.ifaceIndex.byName)
+    ifacesByIp = property(lambda self: self.ifaceIndex.byIp)
+    ifacesByMac = property(lambda self: self.ifaceIndex.byMac)
+    localIps = property(lambda self: self.ifaceIndex.localIps)
 
     def sendPacket(self, packet, outIface):
-        self.pox.begin_sendPacket(packet, outIface)
+        if not isinstance(packet, bytes):
+            packet = bytes(packet) # memoryview or bytearray (e.g., from iface.templates)
+        self.stats.sent(outIface, len(packet))
+        if self.capture:
+            self.capture.record(packet, outIface, OUTBOUND)
+        if self.batcher:
+            self.batcher.send(packet, outIface)
+        else:
+            self.pox.begin_sendPacket(packet, outIface)
+
+    #
+    # Process received \p packet, recording it first if capture is enabled (connectors call
+    # this instead of handlePacket)
+    #
+    def receivePacket(self, packet, inIface):
+        self.stats.received(inIface, len(packet))
+        if self.capture:
+            self.capture.record(packet, inIface, INBOUND)
+        self.handlePacket(packet, inIface)
+
+    #
+    # Process a batch of received packets: \p packets is a sequence of (packet, inIface)
+    # tuples, passed to receivePacket() in order.  This is a transport-level entry point:
+    # it saves a connector call per packet and flushes packets generated while handling the
+    # batch together at the end, but each packet is still processed on its own.  An error
+    # in one packet is logged and does not abort the rest of the batch
+    #
+    def handlePackets(self, packets):
+        try:
+            for packet, inIface in packets:
+                try:
+                    self.receivePacket(packet, inIface)
+                except Exception:
+                    log.exception("Error while handling packet received on %s" % inIface)
+        finally:
+            if self.batcher:
+                self.batcher.flush()
+
+    #
+    # Configure routing table, interfaces and ARP cache from \p props (Ice.Properties, or any
+    # object with getPropertyWithDefault and getPropertyAsIntWithDefault methods)
+    #
+    def configure(self, props):
+        routingTable = self.getRoutingTable()
+        routingTable.setEngine(props.getPropertyWithDefault("RoutingTable.Engine", "trie"))
+        routingTable.setCacheSize(props.getPropertyAsIntWithDefault("RoutingTable.CacheSize", 1024))
+        routingTable.setSnapshot(props.getPropertyAsIntWithDefault("RoutingTable.Snapshot", 0) != 0)
+        self.loadRoutingTable(props.getPropertyWithDefault("RoutingTable", "RTABLE"))
+
+        self.loadIfconfig(props.getPropertyWithDefault("Ifconfig", "IP_CONFIG"))
+
+        arpResolution = props.getPropertyWithDefault("ArpCache.TimerResolution", "")
+        if arpResolution:
+            self.arpCache.setTimerResolution(float(arpResolution))
+
+        def arpQueueLimit(name, default):
+            return QueueLimit(props.getPropertyAsIntWithDefault("ArpCache.%s" % name, default.limit),
+                              props.getPropertyWithDefault("ArpCache.%s.Policy" % name, default.policy))
+
+        self.arpCache.setQueueLimits(maxPacketsPerRequest=arpQueueLimit("MaxPacketsPerRequest", ARP_MAX_PACKETS_PER_REQUEST),
+                                     maxQueuedBytes=arpQueueLimit("MaxQueuedBytes", ARP_MAX_QUEUED_BYTES),
+                                     maxRequests=arpQueueLimit("MaxRequests", ARP_MAX_REQUESTS))
+
+        self.captureConfig = {
+            'prefix': props.getPropertyWithDefault("SimpleRouter.Capture.Prefix", "capture"),
+            'slots': props.getPropertyAsIntWithDefault("SimpleRouter.Capture.Slots", capture.DEFAULT_SLOTS),
+            'snaplen': props.getPropertyAsIntWithDefault("SimpleRouter.Capture.Snaplen", capture.DEFAULT_SNAPLEN),
+            'fileSize': props.getPropertyAsIntWithDefault("SimpleRouter.Capture.FileSize", capture.DEFAULT_FILE_SIZE),
+            'fileCount': props.getPropertyAsIntWithDefault("SimpleRouter.Capture.FileCount", capture.DEFAULT_FILE_COUNT),
+        }
+        if props.getPropertyAsIntWithDefault("SimpleRouter.Capture", 0):
+            self.startCapture()
+
+    #
+    # Start capturing received and sent frames into <\p prefix>-NNNNN.pcapng files (prefix
+    # and other parameters default to SimpleRouter.Capture.* properties).  Returns description
+    # of the capture; raises RuntimeError if capture is already running
+    #
+    def startCapture(self, prefix=""):
+        if self.capture:
+            raise RuntimeError("Capture is already running (%s)" % self.capture.prefix)
+        config = dict(self.captureConfig)
+        if prefix:
+            config['prefix'] = prefix
+        self.capture = Capture(**config)
+        return "Capturing to %s-NNNNN.pcapng" % self.capture.prefix
+
+    #
+    # Stop capture, write out remaining frames and return summary
+    #
+    def stopCapture(self):
+        capture, self.capture = self.capture, None
+        if not capture:
+            return "Capture is not running"
+        stats = capture.stop()
+        summary = "Captured %d frames (%d lost) into %s" % (stats['written'], stats['lost'], ", ".join(stats['files']) or "no files")
+        if stats['deleted']:
+            summary += " (%d older files deleted by rotation)" % stats['deleted']
+        return summary
+
+    #
+    # Count packet dropped for \p reason (one of stats.DROP_* constants)
+    #
+    def countDrop(self, reason):
+        self.stats.drop(reason)
+
+    #
+    # Return forwarding statistics as a dictionary: per-interface packet and byte counters,
+    # dropped packets by reason, packets generated by the router (ARP and ICMP), and ARP
+    # and route cache counters
+    #
+    def getStats(self):
+        stats = self.stats.snapshot()
+        arpCache = self.getArp()
+        queue = arpCache.getQueueMemory()
+        stats['drops']['arp-queue'] = queue['droppedPackets']
+        stats['drops']['arp-unresolved'] = arpCache.unresolvedPackets
+        stats['arp'] = {
+            'hits': arpCache.hits,
+            'misses': arpCache.misses,
+            'entries': len(arpCache.cacheEntries),
+            'requests': queue['requests'],
+            'queuedPackets': queue['packets'],
+            'queuedBytes': queue['bytes'],
+        }
+        cache = self.getRoutingTable().cache
+        stats['routeCache'] = {'hits': cache.hits, 'misses': cache.misses, 'evictions': cache.evictions}
+        return addRatios(stats)
 
     #
     # Load routing table information from \p rtConfig file
     #
     def loadRoutingTable(self, rtConfig):
+        self.routingTableFile = rtConfig
         return self.routingTable.load(rtConfig)
 
+    #
+    # Reload routing table from the file it was loaded from, while packets are being
+    # forwarded (see RoutingTableBase.reload).  ARP cache and queued packets are kept.
+    # Returns summary of the changes
+    #
+    def reloadRoutingTable(self):
+        if not self.routingTableFile:
+            return "Routing table was not loaded from a file"
+        try:
+            added, removed = self.getRoutingTable().reload(self.routingTableFile)
+        except (OSError, ValueError, RuntimeError) as e:
+            log.error("Cannot reload routing table from %s: %s" % (self.routingTableFile, e))
+            return "Cannot reload routing table from %s: %s" % (self.routingTableFile, e)
+        log.info("Reloaded routing table from %s: %d entries added, %d removed" % (self.routingTableFile, added, removed))
+        return "Reloaded %s: %d entries added, %d removed, %d entries" % (self.routingTableFile, added, removed,
+                                                                         len(self.getRoutingTable().entries))
+
     #
     # Load local interface configuration
     #
@@ -69,20 +238,26 @@ class SimpleRouterBase:
     # Print router interfaces
     #
     def printIfaces(self, file):
-        if len(self.ifaces) == 0:
+        ifaces = self.ifaces
+        if len(ifaces) == 0:
             file.write( " Interface list empty \n")
 
-        for iface in self.ifaces:
+        for iface in ifaces:
                 file.write("%s\n" % iface)
 
     #
     # Reset ARP cache and interface list (e.g., when mininet restarted)
     #
+    # Each interface gets `.templates` (PacketTemplates) with pre-encoded ARP and ICMP
+    # packets originated from its addresses.  Interface list and indexes are built
+    # off to the side as one InterfaceIndex and published with a single assignment, so
+    # a lookup from another thread always sees a complete (old or new) index
+    #
     def reset(self, ports):
         print("Resetting SimpleRouter with %d ports" % len(ports), file=sys.stderr)
         self.arpCache.reset()
 
-        self.ifaces = []
+        ifaces = []
 
         for iface in ports:
             try:
@@ -91,33 +266,36 @@ class SimpleRouterBase:
                 print("IP_CONFIG missing information about interface `%s`. Skipping it" % iface.name, file=sys.stderr)
                 continue
             
-            self.ifaces.append(Interface(iface.name, iface.mac, ip))
+            newIface = Interface(iface.name, iface.mac, ip)
+            newIface.templates = PacketTemplates(newIface, generated=self.stats.generated)
+            ifaces.append(newIface)
+
+        self.stats.addInterfaces(iface.name for iface in ifaces)
+
+        self.ifaceIndex = InterfaceIndex(ifaces)
 
         self.printIfaces(file=sys.stderr)
 
+    #
+    # Check if \p ip (IpAddress, string, or integer) is one of router's addresses
+    #
+    def isLocalIp(self, ip):
+        return _ipValue(ip) in self.ifaceIndex.localIps
+
     #
     # Find interface based on interface's IP address
     #
     def findIfaceByIp(self, ip):
-        for iface in self.ifaces:
-            if iface.ip == ip:
-                return iface
-        return None
+        return self.ifaceIndex.byIp.get(_ipValue(ip))
 
     #
     # Find interface based on interface's MAC address
     #
     def findIfaceByMac(self, mac):
-        for iface in self.ifaces:
-            if iface.addr == mac:
-                return iface
-        return None
+        return self.ifaceIndex.byMac.get(_macValue(mac))
 
     #
     # Find interface based on interface's name
     #
     def findIfaceByName(self, ifName):
-        for iface in self.ifaces:
-            if iface.name == ifName:
-                return iface
-        return None
+        return self.ifaceIndex.byName.get(ifName)
@@ -0,0 +1,116 @@
+# -*- Mode: python; py-indent-offset: 4; indent-tabs-mode: nil; coding: utf-8; -*-
+# Copyright 2021 Alex Afanasyev
+#
+# This program is free software: you can redistribute it and/or modify it under the terms of
+# the GNU General Public License as published by the Free Software Foundation, either version
+# 3 of the License, or (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful, but WITHOUT ANY WARRANTY;
+# without even the implied warranty of MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.
+# See the GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License along with this program.
+# If not, see <http://www.gnu.org/licenses/>.
+
+# Stand-in controller for AsyncConnectorApp: serves the socket protocol (socket_protocol.py)
+# for a single router, reports the configured interfaces, answers keepalives, records
+# packets sent by the router and injects packets into it.  Runs either inside an event
+# loop (tests) or as a separate process:
+#
+#     python3 -m router_base.socket_controller unix:/tmp/riddikulus.sock sw0-eth1=00:00:00:00:00:01 ...
+#
+# which prints headers of all packets sent by the router.
+
+import asyncio
+import os
+import sys
+
+from .async_connector import Channel, parseEndpoint
+from .socket_protocol import HELLO, PACKET, PING, PONG, encodeMessage, encodePacket, encodeIfaces, decodePacket
+from .local_injector import Port
+from .mac_address import MacAddress
+
+class StandInController:
+    def __init__(self, ports, onPacket=None):
+        self.ports = list(ports)
+        self.onPacket = onPacket
+        self.received = []   # (packet, iface) sent by the router
+        self.peer = None     # (channel, addr) of the router
+        self.server = None
+        self.connected = asyncio.Event()
+        self.changed = asyncio.Event()
+
+    async def start(self, endpoint):
+        loop = asyncio.get_running_loop()
+        kind, address = parseEndpoint(endpoint)
+        factory = lambda: Channel(self.handleMessages, datagram=(kind == "udp"))
+        if kind == "udp":
+            transport, self.server = await loop.create_datagram_endpoint(factory, local_addr=address)
+        else:
+            if os.path.exists(address):
+                os.unlink(address)
+            self.server = await loop.create_unix_server(factory, address)
+
+    def close(self):
+        if self.peer:
+            self.peer[0].close()
+        if self.server:
+            self.server.close()
+
+    def handleMessages(self, channel, messages, addr):
+        for type, body in messages:
+            if type == HELLO:
+                self.peer = (channel, addr)
+                channel.send(encodeIfaces(self.ports), addr)
+                self.connected.set()
+            elif type == PING:
+                channel.send(encodeMessage(PONG), addr)
+            elif type == PACKET:
+                packet, iface = decodePacket(body)
+                self.received.append((packet, iface))
+                if self.onPacket:
+                    self.onPacket(packet, iface)
+        self.changed.set()
+
+    def inject(self, packets):
+        '''
+        Deliver \p packets (sequence of (packet, inIface)) to the router
+        '''
+        channel, addr = self.peer
+        data = b''.join(encodePacket(packet, iface) for packet, iface in packets)
+        channel.send(data, addr)
+
+    def resetRouter(self, ports):
+        self.ports = list(ports)
+        channel, addr = self.peer
+        channel.send(encodeIfaces(self.ports), addr)
+
+    async def waitForPackets(self, count, timeout=10):
+        '''
+        Wait until the router sent at least \p count packets, returns the received packets
+        '''
+        async def wait():
+            while len(self.received) < count:
+                self.changed.clear()
+                await self.changed.wait()
+        await asyncio.wait_for(wait(), timeout)
+        return self.received
+
+async def _main(endpoint, ports):
+    from .utils import print_hdrs
+    def onPacket(packet, iface):
+        print("Packet on %s:" % iface)
+        print_hdrs(packet)
+    controller = StandInController(ports, onPacket)
+    await controller.start(endpoint)
+    await asyncio.Event().wait()
+
+if __name__ == '__main__':
+    if len(sys.argv) < 2:
+        print("Usage: %s <endpoint> [<iface>=<mac> ...]" % sys.argv[0], file=sys.stderr)
+        sys.exit(1)
+    ports = [Port(name, MacAddress(mac).addr) for name, mac in (arg.split("=", 1) for arg in sys.argv[2:])]
+    try:
+        asyncio.run(_main(sys.argv[1], ports))
+    except KeyboardInterrupt:
+        pass
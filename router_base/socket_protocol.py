@@ -0,0 +1,103 @@
+# -*- Mode: python; py-indent-offset: 4; indent-tabs-mode: nil; coding: utf-8; -*-
+# Copyright 2021 Alex Afanasyev
+#
+# This program is free software: you can redistribute it and/or modify it under the terms of
+# the GNU General Public License as published by the Free Software Foundation, either version
+# 3 of the License, or (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful, but WITHOUT ANY WARRANTY;
+# without even the implied warranty of MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.
+# See the GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License along with this program.
+# If not, see <http://www.gnu.org/licenses/>.
+
+# Framing used by AsyncConnectorApp to talk to the controller over UDP or Unix-domain
+# sockets, instead of Ice.
+#
+# Every message is `length (4 bytes) | type (1 byte) | body`, where length is the size of
+# the body, all integers in network byte order.  On stream sockets messages follow each
+# other; a UDP datagram carries one or more complete messages.
+#
+#   HELLO    router -> controller   register router (PacketInjector::addPacketHandler)
+#   IFACES   controller -> router   count (2) | {name length (1) | name | mac (6)}...
+#                                   (PacketHandler::resetRouter; also the reply to HELLO)
+#   PACKET   both directions        iface length (1) | iface | frame
+#                                   (PacketHandler::handlePacket / PacketInjector::sendPacket)
+#   PING     router -> controller   keepalive, answered with PONG
+#   PONG     controller -> router
+
+import struct
+
+from .local_injector import Port
+
+HELLO = 1
+IFACES = 2
+PACKET = 3
+PING = 4
+PONG = 5
+
+HEADER = struct.Struct("!IB")
+_COUNT = struct.Struct("!H")
+MAC_LEN = 6
+
+def encodeMessage(type, body=b''):
+    return HEADER.pack(len(body), type) + body
+
+def encodePacket(packet, iface):
+    iface = iface.encode()
+    return HEADER.pack(1 + len(iface) + len(packet), PACKET) + bytes([len(iface)]) + iface + packet
+
+def decodePacket(body):
+    '''
+    Returns (frame, iface) of PACKET message body
+    '''
+    end = 1 + body[0]
+    return body[end:], bytes(body[1:end]).decode()
+
+def encodeIfaces(ports):
+    body = [_COUNT.pack(len(ports))]
+    for port in ports:
+        name = port.name.encode()
+        mac = bytes(port.mac)
+        if len(mac) != MAC_LEN:
+            raise RuntimeError("Invalid MAC address of interface `%s`" % port.name)
+        body.append(bytes([len(name)]) + name + mac)
+    return encodeMessage(IFACES, b''.join(body))
+
+def decodeIfaces(body):
+    '''
+    Returns list of Port of IFACES message body
+    '''
+    (count,) = _COUNT.unpack_from(body)
+    offset = _COUNT.size
+    ports = []
+    for i in range(count):
+        end = offset + 1 + body[offset]
+        name = bytes(body[offset + 1:end]).decode()
+        ports.append(Port(name, bytes(body[end:end + MAC_LEN])))
+        offset = end + MAC_LEN
+    return ports
+
+class MessageDecoder:
+    '''
+    Splits received bytes into (type, body) messages; feed() can be called with any
+    fragments of the stream
+    '''
+    def __init__(self):
+        self.buffer = bytearray()
+
+    def feed(self, data):
+        self.buffer += data
+        messages = []
+        offset = 0
+        buffer = self.buffer
+        while len(buffer) - offset >= HEADER.size:
+            length, type = HEADER.unpack_from(buffer, offset)
+            end = offset + HEADER.size + length
+            if end > len(buffer):
+                break
+            messages.append((type, bytes(buffer[offset + HEADER.size:end])))
+            offset = end
+        del buffer[:offset]
+        return messages
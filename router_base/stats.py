@@ -0,0 +1,170 @@
+# -*- Mode: python; py-indent-offset: 4; indent-tabs-mode: nil; coding: utf-8; -*-
+# Copyright 2021 Alex Afanasyev
+#
+# This program is free software: you can redistribute it and/or modify it under the terms of
+# the GNU General Public License as published by the Free Software Foundation, either version
+# 3 of the License, or (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful, but WITHOUT ANY WARRANTY;
+# without even the implied warranty of MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.
+# See the GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License along with this program.
+# If not, see <http://www.gnu.org/licenses/>.
+
+
+# Forwarding counters
+#
+# Counters are kept in preallocated arrays indexed by the constants below, so counting on
+# the packet path is a dictionary lookup (for the interface) and in-place increments of
+# array items, without locks or allocations.  Increments from concurrent threads are not
+# synchronized, so under contention a count may occasionally be lost; the counters are
+# meant for monitoring, not accounting.
+
+import json
+import time
+from array import array
+
+# per-interface counters
+RX_PACKETS, RX_BYTES, TX_PACKETS, TX_BYTES = range(4)
+IFACE_COUNTERS = ("rxPackets", "rxBytes", "txPackets", "txBytes")
+
+# reasons of dropped packets (see SimpleRouterBase.countDrop)
+DROP_UNKNOWN_IFACE = 0   # received on interface not in IP_CONFIG
+DROP_MALFORMED = 1       # truncated or invalid headers
+DROP_BAD_CHECKSUM = 2    # IP checksum mismatch
+DROP_TTL_EXPIRED = 3     # TTL would reach zero
+DROP_NO_ROUTE = 4        # no matching routing table entry
+DROP_NOT_FOR_US = 5      # e.g., ARP request for another host's address
+DROP_UNSUPPORTED = 6     # neither IP nor ARP, or protocol the router does not handle
+DROP_REASONS = ("unknown-iface", "malformed", "bad-checksum", "ttl-expired", "no-route",
+                "not-for-us", "unsupported")
+# packets dropped by the ARP cache are counted there and reported by SimpleRouterBase.getStats
+# as 'arp-queue' (queue limits) and 'arp-unresolved' (request was never answered)
+
+# packets originated by the router (counted by PacketTemplates)
+GEN_ARP_REQUEST = 0
+GEN_ARP_REPLY = 1
+GEN_ECHO_REPLY = 2
+GEN_TIME_EXCEEDED = 3
+GEN_PORT_UNREACHABLE = 4
+GENERATED = ("arp-request", "arp-reply", "icmp-echo-reply", "icmp-time-exceeded", "icmp-port-unreachable")
+
+def _counters(size):
+    return array('Q', bytes(8 * size))
+
+class ForwardingStats:
+    '''
+    Per-interface packet and byte counters, counters of dropped packets by reason and of
+    packets originated by the router
+    '''
+
+    def __init__(self):
+        self.interfaces = {}
+        self.drops = _counters(len(DROP_REASONS))
+        self.generated = _counters(len(GENERATED))
+        self.since = time.time()
+
+    def addInterfaces(self, names):
+        '''
+        Preallocate counters of interfaces \p names (counters of known interfaces are kept)
+        '''
+        for name in names:
+            self.interfaces.setdefault(name, _counters(len(IFACE_COUNTERS)))
+
+    def iface(self, name):
+        '''
+        Return counters (array indexed by RX_PACKETS, ...) of interface \p name
+        '''
+        counters = self.interfaces.get(name)
+        if counters is None:
+            counters = self.interfaces.setdefault(name, _counters(len(IFACE_COUNTERS)))
+        return counters
+
+    def received(self, name, size):
+        counters = self.interfaces.get(name) or self.iface(name)
+        counters[RX_PACKETS] += 1
+        counters[RX_BYTES] += size
+
+    def sent(self, name, size):
+        counters = self.interfaces.get(name) or self.iface(name)
+        counters[TX_PACKETS] += 1
+        counters[TX_BYTES] += size
+
+    def drop(self, reason):
+        self.drops[reason] += 1
+
+    def clear(self):
+        for counters in list(self.interfaces.values()) + [self.drops, self.generated]:
+            counters[:] = _counters(len(counters))
+        self.since = time.time()
+
+    def snapshot(self):
+        '''
+        Return current values as a dictionary (see SimpleRouterBase.getStats)
+        '''
+        interfaces = dict(self.interfaces)
+        return {
+            'since': self.since,
+            'interfaces': {name: dict(zip(IFACE_COUNTERS, counters)) for name, counters in sorted(interfaces.items())},
+            'drops': dict(zip(DROP_REASONS, self.drops)),
+            'generated': dict(zip(GENERATED, self.generated)),
+        }
+
+def mergeStats(statsList):
+    '''
+    Combine statistics (as returned by SimpleRouterBase.getStats) of several routers, e.g.,
+    of all worker processes: counters are added up, 'since' is the earliest one and ratios
+    are recomputed
+    '''
+    def merge(target, source):
+        for key, value in source.items():
+            if isinstance(value, dict):
+                merge(target.setdefault(key, {}), value)
+            elif key == 'since':
+                target[key] = min(target.get(key, value), value)
+            elif isinstance(value, int):
+                target[key] = target.get(key, 0) + value
+
+    merged = {}
+    for stats in statsList:
+        merge(merged, stats)
+    if 'arp' in merged:
+        addRatios(merged)
+    return merged
+
+def _ratio(hits, misses):
+    return hits / (hits + misses) if hits + misses else 0.0
+
+def addRatios(stats):
+    '''
+    Set hit ratios of ARP and route caches in \p stats
+    '''
+    for name in ('arp', 'routeCache'):
+        if name in stats:
+            stats[name]['hitRatio'] = _ratio(stats[name].get('hits', 0), stats[name].get('misses', 0))
+    return stats
+
+def formatStats(stats, format="table"):
+    '''
+    Format \p stats as JSON (\p format "json") or as a human-readable table
+    '''
+    if format == "json":
+        return json.dumps(stats, indent=2, sort_keys=True)
+
+    lines = ["Counters for the last %.1f seconds" % (time.time() - stats['since']), "",
+             "%-12s %12s %14s %12s %14s" % ("Interface", "RX packets", "RX bytes", "TX packets", "TX bytes")]
+    for name, counters in stats['interfaces'].items():
+        lines.append("%-12s %12d %14d %12d %14d" % ((name,) + tuple(counters[key] for key in IFACE_COUNTERS)))
+
+    def section(title, counters):
+        lines.extend(["", title])
+        for key, value in counters.items():
+            lines.append("  %-24s %s" % (key, ("%.3f" % value) if isinstance(value, float) else value))
+
+    section("Dropped packets", stats['drops'])
+    section("Generated packets", stats['generated'])
+    for key, title in (('arp', "ARP cache"), ('routeCache', "Route cache")):
+        if key in stats:
+            section(title, stats[key])
+    return "\n".join(lines)
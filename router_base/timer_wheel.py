@@ -0,0 +1,126 @@
+# -*- Mode: python; py-indent-offset: 4; indent-tabs-mode: nil; coding: utf-8; -*-
+# Copyright 2021 Alex Afanasyev
+#
+# This program is free software: you can redistribute it and/or modify it under the terms of
+# the GNU General Public License as published by the Free Software Foundation, either version
+# 3 of the License, or (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful, but WITHOUT ANY WARRANTY;
+# without even the implied warranty of MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.
+# See the GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License along with this program.
+# If not, see <http://www.gnu.org/licenses/>.
+
+import math
+import time
+
+DEFAULT_RESOLUTION = 0.1
+DEFAULT_SLOTS = 512
+
+class Timer:
+    __slots__ = ("tick", "item", "cancelled")
+
+    def __init__(self, tick, item):
+        self.tick = tick
+        self.item = item
+        self.cancelled = False
+
+class TimerWheel:
+    '''
+    Hashed timer wheel.  Deadlines are rounded up to multiples of \p resolution seconds
+    ("ticks") and hashed into one of \p slots buckets; advance() only visits buckets
+    for the ticks that elapsed since the previous call, so its cost depends on the
+    number of timers that are due, not on the total number of timers.
+
+    Times are absolute, in seconds (time.time() unless \p now is given explicitly).
+    The wheel is not thread-safe; the owner is expected to serialize calls.
+    '''
+
+    def __init__(self, resolution=DEFAULT_RESOLUTION, slots=DEFAULT_SLOTS, now=None):
+        if resolution <= 0:
+            raise RuntimeError("Timer resolution must be positive, got %s" % resolution)
+        if now is None:
+            now = time.time()
+        self.resolution = resolution
+        self.slots = [[] for i in range(slots)]
+        self.lastTick = math.floor(now / resolution)
+        self.size = 0
+
+    def __tick(self, deadline):
+        return math.ceil(deadline / self.resolution)
+
+    def schedule(self, deadline, item):
+        '''
+        Schedule \p item to be returned by advance() once \p deadline (absolute time in
+        seconds) has passed.  Returns handle that can be passed to cancel()
+        '''
+        tick = self.__tick(deadline)
+        if tick <= self.lastTick:
+            tick = self.lastTick + 1
+        timer = Timer(tick, item)
+        self.slots[tick % len(self.slots)].append(timer)
+        self.size += 1
+        return timer
+
+    def cancel(self, timer):
+        if timer is not None and not timer.cancelled:
+            timer.cancelled = True
+            self.size -= 1
+
+    def advance(self, now):
+        '''
+        Return list of items whose deadlines are not later than \p now, in deadline order
+        '''
+        current = math.floor(now / self.resolution)
+        if current <= self.lastTick:
+            return []
+
+        due = []
+        nSlots = len(self.slots)
+        # visiting more than one full revolution would only see the same buckets again
+        first = max(self.lastTick + 1, current - nSlots + 1)
+        for tick in range(first, current + 1):
+            bucket = self.slots[tick % nSlots]
+            if not bucket:
+                continue
+            remaining = []
+            for timer in bucket:
+                if timer.cancelled:
+                    continue
+                if timer.tick <= current:
+                    due.append(timer)
+                else:
+                    remaining.append(timer)
+            self.slots[tick % nSlots] = remaining
+
+        self.lastTick = current
+        due.sort(key=lambda timer: timer.tick)
+        for timer in due:
+            timer.cancelled = True
+        self.size -= len(due)
+        return [timer.item for timer in due]
+
+    def setResolution(self, resolution):
+        '''
+        Change tick length, rehashing all pending timers
+        '''
+        if resolution <= 0:
+            raise RuntimeError("Timer resolution must be positive, got %s" % resolution)
+        timers = [timer for bucket in self.slots for timer in bucket if not timer.cancelled]
+        self.slots = [[] for i in range(len(self.slots))]
+        self.lastTick = math.floor(self.lastTick * self.resolution / resolution)
+        for timer in timers:
+            timer.tick = max(math.ceil(timer.tick * self.resolution / resolution), self.lastTick + 1)
+            self.slots[timer.tick % len(self.slots)].append(timer)
+        self.resolution = resolution
+
+    def clear(self):
+        for bucket in self.slots:
+            for timer in bucket:
+                timer.cancelled = True
+            bucket.clear()
+        self.size = 0
+
+    def __len__(self):
+        return self.size
@@ -16,19 +16,30 @@ import sys
 from .headers import EtherHeader, IpHeader, ArpHeader, IcmpHeader, Stack
 
 def checksum(data):
-    sum = 0
-    for offset in range(0, len(data), 2):
-        val = int.from_bytes(data[offset:offset + 2], byteorder='little')
-        value = (val & 0xff) << 8 | (val & 0xff00) >> 8
-        sum = sum + value
+    '''
+    Internet checksum (RFC 1071) of \p data (bytes, bytearray or memoryview).
 
-    while sum > 0xffff:
-        sum = (sum >> 16) + (sum & 0xFFFF)
-    sum = ~sum & 0xffff
-    if sum:
-        return sum
-    else:
-        return 0xffff
+    Returns the one's complement of the one's complement sum of the 16-bit big-endian
+    words of \p data (odd length is padded with a zero byte).  A zero result is returned
+    as 0xffff, so checksum() of a buffer that includes a valid checksum is 0xffff.
+    '''
+    # 2^16 == 1 (mod 0xffff), so the one's complement sum of all 16-bit words is the
+    # whole buffer, taken as one big-endian number, modulo 0xffff
+    value = int.from_bytes(data, byteorder='big')
+    if len(data) & 1:
+        value <<= 8
+    return 0xffff - value % 0xffff
+
+def update_checksum(sum, old, new):
+    '''
+    Incrementally update checksum \p sum (as returned by checksum()) after a field changed
+    from \p old to \p new (RFC 1624).  The field must start at an even offset; its value
+    may be wider than 16 bits (e.g., a 32-bit IP address).  The result is the same as
+    checksum() recomputed over the updated data, e.g., for a TTL decrement:
+
+        hdr.sum = update_checksum(hdr.sum, hdr.ttl << 8 | hdr.p, (hdr.ttl - 1) << 8 | hdr.p)
+    '''
+    return 0xffff - (0xffff - sum - old + new) % 0xffff
 
     
 # prints all headers, starting from eth
@@ -38,7 +49,7 @@ def print_hdrs(buf, file=sys.stdout):
 
     while offset < len(buf):
         hdr = hdrClass()
-        offset = offset + hdr.decode(buf[offset:])
+        offset = offset + hdr.decode(buf, offset)
         print(hdr, file=file)
         try:
             nextLevel = Stack[hdr.__class__]
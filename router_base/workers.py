@@ -0,0 +1,422 @@
+# -*- Mode: python; py-indent-offset: 4; indent-tabs-mode: nil; coding: utf-8; -*-
+# Copyright 2021 Alex Afanasyev
+#
+# This program is free software: you can redistribute it and/or modify it under the terms of
+# the GNU General Public License as published by the Free Software Foundation, either version
+# 3 of the License, or (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful, but WITHOUT ANY WARRANTY;
+# without even the implied warranty of MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.
+# See the GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License along with this program.
+# If not, see <http://www.gnu.org/licenses/>.
+
+# Multi-process forwarding
+#
+# WorkerPool runs N copies of the router in separate processes.  The connector process
+# receives frames from POX and shards them across the workers; each worker runs its own
+# router (routing table, ARP cache) and handlePacket, and sends its output back to the
+# connector process, which is the single egress towards POX.
+#
+#                 +-- ingress ring --> worker 0 --- egress ring --+
+#     POX --> pool.dispatch()                                      +--> egress thread --> POX
+#                 +-- ingress ring --> worker 1 --- egress ring --+
+#
+# Frames travel through single-producer/single-consumer rings in shared memory.
+#
+# Sharding (flowShard):
+# - IPv4 packets are sharded by hash of (src, dst, protocol, src port, dst port), so all
+#   packets of a flow are handled, in order, by the same worker.  Fragmented packets and
+#   protocols without ports use (src, dst, protocol) only, so fragments stay together.
+# - ARP replies are delivered to all workers, so every worker learns the mapping (and the
+#   worker that queued packets for it sends them).  ARP requests are sharded by target IP.
+# - Anything else goes to worker 0.
+
+import multiprocessing
+import pickle
+import struct
+import threading
+import time
+import zlib
+import logging
+from multiprocessing import shared_memory
+
+from .local_injector import Port
+from .properties import PropertyDict
+from .stats import mergeStats
+
+log = logging.getLogger("riddikulus.workers")
+
+DEFAULT_RING_SIZE = 4 * 1024 * 1024
+WORKER_CHECK_INTERVAL = 0.1 # seconds between checks that worker processes are alive
+
+# message kinds
+PACKET = 0
+RESET = 1
+STOP = 2
+RELOAD = 3
+STATS = 4
+
+# flowShard result for frames that must be delivered to every worker
+ALL_WORKERS = -1
+
+_COUNTER = struct.Struct("<Q")
+_RECORD = struct.Struct("<IIBB") # record length (0 = wrap to the beginning), payload length, kind, iface length
+_HEAD_OFFSET = 0                 # written by the producer only
+_TAIL_OFFSET = 64                # written by the consumer only (separate cache line)
+_DATA_OFFSET = 128
+_ALIGN = 8
+
+class ShmRing:
+    '''
+    Single-producer/single-consumer ring of (kind, iface, payload) records in shared memory.
+
+    head and tail are monotonically increasing byte counters; each is written by one side
+    only, and a record is published by advancing head after it has been written, so no
+    locks are needed.  \p doorbell (multiprocessing.Semaphore) is released when a record is
+    pushed into an empty ring, to wake up the consumer waiting in wait().  A wakeup can still
+    be missed in a narrow race, so consumers should wait with a timeout.
+
+    Create with \p capacity (bytes) in the owner process, attach with \p name elsewhere.
+    '''
+
+    def __init__(self, capacity=DEFAULT_RING_SIZE, name=None, doorbell=None):
+        if name is None:
+            capacity = capacity // _ALIGN * _ALIGN
+            self.shm = shared_memory.SharedMemory(create=True, size=_DATA_OFFSET + capacity)
+            self.shm.buf[:_DATA_OFFSET] = bytes(_DATA_OFFSET)
+        else:
+            self.shm = shared_memory.SharedMemory(name=name)
+            capacity = (self.shm.size - _DATA_OFFSET) // _ALIGN * _ALIGN
+        self.buf = self.shm.buf
+        self.capacity = capacity
+        self.doorbell = doorbell if doorbell is not None else multiprocessing.Semaphore(0)
+
+    @property
+    def name(self):
+        return self.shm.name
+
+    def __reduce__(self):
+        return (ShmRing, (self.capacity, self.shm.name, self.doorbell))
+
+    def push(self, kind, iface, payload):
+        '''
+        Append record; returns False if there is not enough free space
+        '''
+        iface = iface.encode()
+        size = _RECORD.size + len(iface) + len(payload)
+        size = (size + _ALIGN - 1) // _ALIGN * _ALIGN
+        if size > self.capacity:
+            raise RuntimeError("Record of %d bytes does not fit into ring of %d bytes" % (size, self.capacity))
+
+        buf = self.buf
+        head = _COUNTER.unpack_from(buf, _HEAD_OFFSET)[0]
+        tail = _COUNTER.unpack_from(buf, _TAIL_OFFSET)[0]
+        pos = head % self.capacity
+        skip = self.capacity - pos if pos + size > self.capacity else 0
+        if head + skip + size - tail > self.capacity:
+            return False
+
+        if skip:
+            if skip >= _RECORD.size: # otherwise the consumer wraps without a marker
+                _RECORD.pack_into(buf, _DATA_OFFSET + pos, 0, 0, 0, 0)
+            pos = 0
+        start = _DATA_OFFSET + pos
+        _RECORD.pack_into(buf, start, size, len(payload), kind, len(iface))
+        start += _RECORD.size
+        buf[start:start + len(iface)] = iface
+        start += len(iface)
+        buf[start:start + len(payload)] = payload
+        _COUNTER.pack_into(buf, _HEAD_OFFSET, head + skip + size)
+
+        # ring was empty when we started, or the consumer drained it in the meantime
+        if head == tail or head == _COUNTER.unpack_from(buf, _TAIL_OFFSET)[0]:
+            self.doorbell.release()
+        return True
+
+    def pushWait(self, kind, iface, payload):
+        '''
+        Append record, waiting for the consumer to free space if necessary
+        '''
+        while not self.push(kind, iface, payload):
+            time.sleep(0.0001)
+
+    def pop(self):
+        '''
+        Remove and return the oldest record as (kind, iface, payload), or None if empty
+        '''
+        buf = self.buf
+        head = _COUNTER.unpack_from(buf, _HEAD_OFFSET)[0]
+        tail = _COUNTER.unpack_from(buf, _TAIL_OFFSET)[0]
+        if head == tail:
+            return None
+
+        pos = tail % self.capacity
+        # wrap marker, or too little space left before the end for a record header
+        size = _RECORD.unpack_from(buf, _DATA_OFFSET + pos)[0] if self.capacity - pos >= _RECORD.size else 0
+        if size == 0:
+            tail += self.capacity - pos
+            pos = 0
+        size, length, kind, ifaceLen = _RECORD.unpack_from(buf, _DATA_OFFSET + pos)
+        start = _DATA_OFFSET + pos + _RECORD.size + ifaceLen
+        iface = bytes(buf[start - ifaceLen:start]).decode()
+        payload = bytes(buf[start:start + length])
+        _COUNTER.pack_into(buf, _TAIL_OFFSET, tail + size)
+        return (kind, iface, payload)
+
+    def wait(self, timeout=None):
+        '''
+        pop(), waiting up to \p timeout seconds for a record to arrive
+        '''
+        record = self.pop()
+        if record is None and self.doorbell.acquire(timeout=timeout):
+            record = self.pop()
+        return record
+
+    def close(self, unlink=False):
+        self.buf = None
+        self.shm.close()
+        if unlink:
+            self.shm.unlink()
+
+def flowShard(frame, nWorkers):
+    '''
+    Index of the worker for Ethernet \p frame, or ALL_WORKERS
+    '''
+    if len(frame) < 14:
+        return 0
+    etherType = frame[12] << 8 | frame[13]
+    if etherType == 0x0800 and len(frame) >= 34:
+        proto = frame[23]
+        flow = zlib.crc32(frame[26:34], proto)
+        fragmented = (frame[20] << 8 | frame[21]) & 0x3fff # MF flag or fragment offset
+        ports = 14 + (frame[14] & 0x0f) * 4
+        if proto in (6, 17) and not fragmented and len(frame) >= ports + 4:
+            flow = zlib.crc32(frame[ports:ports + 4], flow)
+        return flow % nWorkers
+    elif etherType == 0x0806 and len(frame) >= 42:
+        if frame[21] == 2: # reply
+            return ALL_WORKERS
+        return zlib.crc32(frame[38:42]) % nWorkers
+    return 0
+
+class RingInjector:
+    '''
+    PacketInjector used by workers: sends packets to the egress ring
+    '''
+    def __init__(self, ring):
+        self.ring = ring
+
+    def sendPacket(self, packet, outIface, current=None):
+        self.ring.pushWait(PACKET, outIface, packet)
+
+    begin_sendPacket = sendPacket
+
+    def ice_ping(self):
+        pass
+
+def _workerMain(routerClass, props, ingress, egress, batchSize, ports=None):
+    router = routerClass()
+    router.configure(props)
+    router.pox = RingInjector(egress)
+    if ports is not None:
+        # restarted worker: interfaces were already reset in the pool
+        router.reset([Port(name, mac) for name, mac in pickle.loads(ports)])
+    reloaders = []
+
+    while True:
+        record = ingress.wait(timeout=0.01)
+        if record is None:
+            continue
+        kind, iface, payload = record
+        if kind == PACKET:
+            batch = [(payload, iface)]
+            while len(batch) < batchSize:
+                record = ingress.pop()
+                if record is None or record[0] != PACKET:
+                    break
+                batch.append((record[2], record[1]))
+            try:
+                router.handlePackets(batch)
+            except Exception:
+                log.exception("Error while handling a batch of %d packets" % len(batch))
+            if record is None or record[0] == PACKET:
+                continue
+            kind, iface, payload = record
+        if kind == STOP:
+            break
+        # an error in a control record is logged, the worker keeps forwarding
+        try:
+            if kind == RESET:
+                router.reset([Port(name, mac) for name, mac in pickle.loads(payload)])
+            elif kind == RELOAD:
+                # reload in a separate thread, the worker keeps forwarding meanwhile
+                reloader = threading.Thread(target=router.reloadRoutingTable, name="routing-table-reload")
+                reloader.start()
+                reloaders = [thread for thread in reloaders if thread.is_alive()] + [reloader]
+            elif kind == STATS:
+                # reply carries the request number (in the iface field) back
+                egress.pushWait(STATS, iface, pickle.dumps(router.getStats()))
+        except Exception:
+            log.exception("Error while handling control record of kind %d" % kind)
+
+    for reloader in reloaders:
+        reloader.join()
+    router.arpCache.stop()
+    ingress.close()
+    egress.close()
+
+class WorkerPool:
+    '''
+    Runs \p nWorkers processes, each with its own instance of \p routerClass (constructed
+    without arguments and configured with router.configure(\p props)), and sends their
+    output packets using \p send(packet, outIface) in the calling process.
+
+    Frames that do not fit into the ingress ring of their worker are dropped and counted in
+    `dropped`.  Workers are started with the "spawn" method, so \p routerClass has to be
+    importable (defined at module level).
+
+    A worker process that exits unexpectedly is restarted by the egress thread (counted in
+    `restarts`) with the same rings and the last interface list, and continues with the
+    frames queued in its ingress ring.  Its ARP cache and statistics are lost.
+    '''
+
+    def __init__(self, routerClass, props, nWorkers, send, ringSize=DEFAULT_RING_SIZE, batchSize=32):
+        self.nWorkers = nWorkers
+        self.send = send
+        self.dropped = 0
+        self.restarts = 0
+
+        self.context = multiprocessing.get_context("spawn")
+        self.workerArgs = (routerClass, PropertyDict(props), batchSize)
+        self.egressBell = self.context.Semaphore(0)
+        self.ingress = [ShmRing(ringSize, doorbell=self.context.Semaphore(0)) for i in range(nWorkers)]
+        self.egress = [ShmRing(ringSize, doorbell=self.egressBell) for i in range(nWorkers)]
+
+        # pickled interface list of the last reset, for restarted workers
+        self.ports = None
+        # workers are not restarted once stop() has been called
+        self.workersLock = threading.Lock()
+        self.stopping = False
+        self.workers = [self.__startWorker(i) for i in range(nWorkers)]
+
+        # replies to the current getStats request (collected by the egress thread)
+        self.statsLock = threading.Lock()
+        self.statsRequest = 0
+        self.statsReplies = []
+        self.statsDone = threading.Event()
+
+        self.shouldStop = False
+        self.egressThread = threading.Thread(target=self.__egress, name="router-egress")
+        self.egressThread.start()
+
+    def dispatch(self, packet, inIface):
+        '''
+        Deliver received \p packet to its worker(s)
+        '''
+        shard = flowShard(packet, self.nWorkers)
+        if shard == ALL_WORKERS:
+            for ring in self.ingress:
+                ring.pushWait(PACKET, inIface, packet)
+        elif not self.ingress[shard].push(PACKET, inIface, packet):
+            self.dropped += 1
+
+    def dispatchMany(self, packets):
+        for packet, inIface in packets:
+            self.dispatch(packet, inIface)
+
+    def reset(self, ports):
+        '''
+        Reset routers in all workers with interface list \p ports
+        '''
+        payload = pickle.dumps([(port.name, bytes(port.mac)) for port in ports])
+        self.ports = payload
+        for ring in self.ingress:
+            ring.pushWait(RESET, "", payload)
+
+    def reloadRoutingTable(self):
+        '''
+        Reload routing tables in all workers
+        '''
+        for ring in self.ingress:
+            ring.pushWait(RELOAD, "", b'')
+
+    def getStats(self, timeout=2.0):
+        '''
+        Collect forwarding statistics of all workers (waiting up to \p timeout seconds for
+        their replies) and return them combined.  Frames dropped because an ingress ring was
+        full are counted as 'worker-ring' drops.  Raises RuntimeError if no worker replied
+        '''
+        with self.statsLock:
+            self.statsRequest += 1
+            self.statsReplies = []
+            self.statsDone.clear()
+            for ring in self.ingress:
+                ring.pushWait(STATS, str(self.statsRequest), b'')
+            if not self.statsDone.wait(timeout):
+                log.warning("Only %d of %d workers reported statistics" % (len(self.statsReplies), self.nWorkers))
+            replies = list(self.statsReplies)
+        if not replies:
+            raise RuntimeError("No statistics received from workers")
+        stats = mergeStats(replies)
+        stats['drops']['worker-ring'] = self.dropped
+        return stats
+
+    def stop(self):
+        with self.workersLock:
+            self.stopping = True
+        for ring, worker in zip(self.ingress, self.workers):
+            if worker.exitcode is None: # a dead worker would never make space in its ring
+                ring.pushWait(STOP, "", b'')
+        for worker in self.workers:
+            worker.join()
+        self.shouldStop = True
+        self.egressBell.release()
+        self.egressThread.join()
+        for ring in self.ingress + self.egress:
+            ring.close(unlink=True)
+
+    def __startWorker(self, i, ports=None):
+        routerClass, props, batchSize = self.workerArgs
+        worker = self.context.Process(target=_workerMain, daemon=True, name="router-worker-%d" % i,
+                                      args=(routerClass, props, self.ingress[i], self.egress[i], batchSize, ports))
+        worker.start()
+        return worker
+
+    def __checkWorkers(self):
+        '''
+        Restart worker processes that exited, so their ingress rings do not fill up
+        '''
+        with self.workersLock:
+            for i, worker in enumerate(self.workers):
+                if self.stopping or worker.exitcode is None:
+                    continue
+                log.error("Worker %d exited with code %s, restarting" % (i, worker.exitcode))
+                self.workers[i] = self.__startWorker(i, self.ports)
+                self.restarts += 1
+
+    def __egress(self):
+        lastCheck = time.monotonic()
+        while True:
+            if time.monotonic() - lastCheck >= WORKER_CHECK_INTERVAL:
+                self.__checkWorkers()
+                lastCheck = time.monotonic()
+            idle = True
+            for ring in self.egress:
+                record = ring.pop()
+                while record is not None:
+                    idle = False
+                    kind, iface, payload = record
+                    if kind == STATS:
+                        if iface == str(self.statsRequest): # ignore late replies to earlier requests
+                            self.statsReplies.append(pickle.loads(payload))
+                            if len(self.statsReplies) == self.nWorkers:
+                                self.statsDone.set()
+                    else:
+                        self.send(payload, iface)
+                    record = ring.pop()
+            if idle:
+                if self.shouldStop:
+                    return
+                self.egressBell.acquire(timeout=0.01)
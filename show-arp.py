@@ -37,6 +37,14 @@ class Client(Ice.Application):
 
         if len(args) < 2 or args[1] == "arp":
             print(tester.getArp())
+        elif args[1] == "capture-start":
+            print(tester.startCapture(args[2] if len(args) > 2 else ""))
+        elif args[1] == "capture-stop":
+            print(tester.stopCapture())
+        elif args[1] == "reload":
+            print(tester.reloadRoutingTable())
+        elif args[1] == "stats":
+            print(tester.getStats("json" if "--json" in args[2:] else "table"))
         else:
             print(tester.getRoutingTable())
         return 0
@@ -1,4 +1,14 @@
 from .headers_t import *
 from .utils_t import *
 from .routing_table_base_t import *
-
+from .arp_cache_base_t import *
+from .packet_templates_t import *
+from .simple_router_base_t import *
+from .packet_batcher_t import *
+from .workers_t import *
+from .async_connector_t import *
+from .pcap_t import *
+from .capture_t import *
+from .benchmark_t import *
+from .rtable_gen_t import *
+from .stats_t import *
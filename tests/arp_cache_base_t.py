@@ -0,0 +1,216 @@
+# -*- Mode: python; py-indent-offset: 4; indent-tabs-mode: nil; coding: utf-8; -*-
+# Copyright 2021 Alex Afanasyev
+#
+# This program is free software: you can redistribute it and/or modify it under the terms of
+# the GNU General Public License as published by the Free Software Foundation, either version
+# 3 of the License, or (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful, but WITHOUT ANY WARRANTY;
+# without even the implied warranty of MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.
+# See the GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License along with this program.
+# If not, see <http://www.gnu.org/licenses/>.
+
+import unittest
+from router_base import arp_cache_base
+from router_base.ip_address import IpAddress
+from router_base.timer_wheel import TimerWheel
+import time
+import threading
+
+class ArpCache(arp_cache_base.ArpCacheBase):
+    def __init__(self):
+        super().__init__()
+        self.checked = []
+
+    def resendOrRemoveQueuedRequest(self, req):
+        self.checked.append(req)
+        if req.nTimesSent >= 2:
+            self.removeRequest(req)
+        else:
+            req.nTimesSent += 1
+            req.timeSent = req.timeSent + 1
+
+class TestArpCacheBase(unittest.TestCase):
+
+    def setUp(self):
+        self.cache = ArpCache()
+
+    def tearDown(self):
+        self.cache.stop()
+
+    def test_entries(self):
+        """Insert, replace and lookup ARP cache entries"""
+
+        ip = IpAddress("10.0.1.100")
+        self.assertIsNone(self.cache.lookup(ip))
+
+        self.assertIsNone(self.cache.insertArpEntry("00:00:00:00:00:01", ip))
+        self.assertEqual(str(self.cache.lookup(ip).mac), "00:00:00:00:00:01")
+        self.assertEqual(str(self.cache.lookup(int(ip)).mac), "00:00:00:00:00:01")
+
+        # entry for the same IP is replaced, not duplicated
+        self.cache.insertArpEntry("00:00:00:00:00:02", ip)
+        self.assertEqual(len(self.cache.cacheEntries), 1)
+        self.assertEqual(str(self.cache.lookup(ip).mac), "00:00:00:00:00:02")
+        self.assertEqual(str(self.cache).count("10.0.1.100"), 1)
+
+        self.cache.lookup(ip).isValid = False
+        self.assertIsNone(self.cache.lookup(ip))
+
+    def test_lockfree_lookup(self):
+        """Lookups read the cache entries without taking the mutex"""
+
+        ip = IpAddress("10.0.1.100")
+        self.cache.insertArpEntry("00:00:00:00:00:01", ip)
+        entries = self.cache.cacheEntries
+        with self.assertRaises(TypeError):
+            entries[1] = None
+
+        result = []
+        with self.cache.mutex:
+            reader = threading.Thread(target=lambda: result.append(self.cache.lookup(ip)))
+            reader.start()
+            reader.join(timeout=5)
+            self.assertFalse(reader.is_alive())
+        self.assertEqual(str(result[0].mac), "00:00:00:00:00:01")
+
+        # writers update the entries in place, cacheEntries is a read-only view of them
+        self.cache.insertArpEntry("00:00:00:00:00:02", IpAddress("10.0.1.101"))
+        self.assertIs(self.cache.cacheEntries, entries)
+        self.assertEqual(len(entries), 2)
+
+        self.cache.removeEntries([self.cache.lookup(ip)])
+        self.assertIsNone(self.cache.lookup(ip))
+        self.assertEqual(len(self.cache.cacheEntries), 1)
+
+    def test_requests(self):
+        """Queue and remove ARP requests"""
+
+        ip = IpAddress("10.0.1.100")
+        self.assertFalse(self.cache.queueRequest(ip, b'packet1', "eth0"))
+        self.assertTrue(self.cache.queueRequest(ip, b'packet2', "eth0"))
+        self.assertFalse(self.cache.queueRequest(IpAddress("10.0.1.101"), b'packet3', "eth0"))
+        self.assertEqual(len(self.cache.arpRequests), 2)
+
+        request = self.cache.insertArpEntry("00:00:00:00:00:01", ip)
+        self.assertEqual(request.packets, [b'packet1', b'packet2'])
+        self.assertEqual(self.cache.getQueueMemory()['bytes'], 21)
+
+        self.cache.removeRequest(request)
+        self.assertEqual(len(self.cache.arpRequests), 1)
+        self.assertIsNone(self.cache.insertArpEntry("00:00:00:00:00:01", ip))
+
+        # removing request that is no longer queued is a no-op
+        self.cache.removeRequest(request)
+        self.assertEqual(len(self.cache.arpRequests), 1)
+
+    def test_timers(self):
+        """Expiration and retransmission handled by the timer wheel"""
+
+        now = time.time()
+        self.cache.insertArpEntry("00:00:00:00:00:01", IpAddress("10.0.1.1"))
+        self.cache.tick(now + 1)
+        self.assertIsNotNone(self.cache.lookup(IpAddress("10.0.1.1")))
+        self.cache.tick(now + arp_cache_base.SR_ARPCACHE_TO + 1)
+        self.assertIsNone(self.cache.lookup(IpAddress("10.0.1.1")))
+        self.assertEqual(len(self.cache.cacheEntries), 0)
+
+        now = now + 1000 # well ahead of the ticker thread
+        self.cache.queueRequest(IpAddress("10.0.1.2"), b'packet', "eth0")
+        request = self.cache.arpRequests[int(IpAddress("10.0.1.2"))]
+        request.timeSent = now
+        self.cache.timers.cancel(request.timer)
+        request.timer = self.cache.timers.schedule(now + arp_cache_base.ARP_REQUEST_INTERVAL, request)
+
+        self.cache.tick(now + 0.5)
+        self.assertEqual(self.cache.checked, [])
+
+        self.cache.tick(now + 1.2)
+        self.assertEqual(self.cache.checked, [request])
+        self.cache.tick(now + 1.5)
+        self.assertEqual(len(self.cache.checked), 1)
+        self.cache.tick(now + 2.2)
+        self.cache.tick(now + 3.2)
+        self.assertEqual(len(self.cache.checked), 3)
+        self.assertEqual(len(self.cache.arpRequests), 0)
+        self.assertEqual(len(self.cache.timers), 0)
+
+    def test_queue_limits(self):
+        """Bounded ARP request queue with drop accounting"""
+
+        ip1, ip2, ip3 = IpAddress("10.0.1.1"), IpAddress("10.0.1.2"), IpAddress("10.0.1.3")
+        self.cache.setQueueLimits(maxPacketsPerRequest=arp_cache_base.QueueLimit(2, arp_cache_base.DROP_OLDEST),
+                                  maxQueuedBytes=arp_cache_base.QueueLimit(10, arp_cache_base.DROP_NEWEST),
+                                  maxRequests=arp_cache_base.QueueLimit(2, arp_cache_base.DROP_NEWEST))
+
+        self.cache.queueRequest(ip1, b'a', "eth0")
+        self.cache.queueRequest(ip1, b'b', "eth0")
+        self.cache.queueRequest(ip1, b'c', "eth0")
+        self.assertEqual(self.cache.arpRequests[int(ip1)].packets, [b'b', b'c'])
+        self.assertEqual((self.cache.droppedPackets, self.cache.droppedBytes), (1, 1))
+
+        self.assertFalse(self.cache.queueRequest(ip2, b'12345678', "eth0"))
+        self.assertTrue(self.cache.queueRequest(ip2, b'x', "eth0")) # exceeds 10 bytes
+        self.assertEqual((self.cache.droppedPackets, self.cache.droppedBytes), (2, 2))
+
+        self.assertTrue(self.cache.queueRequest(ip3, b'y', "eth0")) # too many requests
+        self.assertEqual(len(self.cache.arpRequests), 2)
+        self.assertEqual(self.cache.droppedPackets, 3)
+
+        usage = self.cache.getQueueMemory()
+        self.assertEqual((usage['requests'], usage['packets'], usage['bytes']), (2, 3, 10))
+
+        # drop-oldest: make room by dropping the oldest packets / requests
+        self.cache.setQueueLimits(maxQueuedBytes=arp_cache_base.QueueLimit(10, arp_cache_base.DROP_OLDEST),
+                                  maxRequests=arp_cache_base.QueueLimit(2, arp_cache_base.DROP_OLDEST))
+        self.assertFalse(self.cache.queueRequest(ip3, b'zz', "eth0"))
+        self.assertNotIn(int(ip1), self.cache.arpRequests)
+        self.assertEqual(self.cache.queuedBytes, 10)
+        self.cache.queueRequest(ip3, b'w', "eth0")
+        self.assertEqual(self.cache.arpRequests[int(ip2)].packets, [])
+        self.assertEqual(self.cache.queuedBytes, 3)
+        self.assertEqual((self.cache.droppedPackets, self.cache.droppedBytes), (6, 13))
+
+        self.cache.removeRequest(self.cache.arpRequests[int(ip3)])
+        self.assertEqual(self.cache.queuedBytes, 0)
+
+        # a new request is not kept if its only packet is dropped (and no ARP request should be sent)
+        ip4 = IpAddress("10.0.1.4")
+        for policy in (arp_cache_base.DROP_NEWEST, arp_cache_base.DROP_OLDEST):
+            self.cache.setQueueLimits(maxQueuedBytes=arp_cache_base.QueueLimit(10, policy))
+            self.assertTrue(self.cache.queueRequest(ip4, b'z' * 20, "eth0"))
+            self.assertNotIn(int(ip4), self.cache.arpRequests)
+        self.assertEqual(self.cache.queuedBytes, 0)
+
+        with self.assertRaises(RuntimeError):
+            arp_cache_base.QueueLimit(1, "drop-random")
+
+class TestTimerWheel(unittest.TestCase):
+
+    def test_wheel(self):
+        """Timer wheel scheduling and cancellation"""
+
+        wheel = TimerWheel(resolution=0.25, slots=8, now=100)
+        wheel.schedule(100.3, "a")
+        b = wheel.schedule(100.6, "b")
+        wheel.schedule(110, "c") # more than one revolution ahead
+        wheel.schedule(100.1, "d")
+        self.assertEqual(len(wheel), 4)
+
+        self.assertEqual(wheel.advance(100.2), [])
+        self.assertEqual(wheel.advance(100.5), ["d", "a"])
+        wheel.cancel(b)
+        self.assertEqual(wheel.advance(105), [])
+        wheel.setResolution(0.1)
+        self.assertEqual(wheel.advance(109.95), [])
+        self.assertEqual(wheel.advance(200), ["c"])
+        self.assertEqual(len(wheel), 0)
+
+        # deadlines in the past fire on the next advance
+        wheel.schedule(0, "e")
+        self.assertEqual(wheel.advance(200.25), ["e"])
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,108 @@
+# -*- Mode: python; py-indent-offset: 4; indent-tabs-mode: nil; coding: utf-8; -*-
+# Copyright 2021 Alex Afanasyev
+#
+# This program is free software: you can redistribute it and/or modify it under the terms of
+# the GNU General Public License as published by the Free Software Foundation, either version
+# 3 of the License, or (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful, but WITHOUT ANY WARRANTY;
+# without even the implied warranty of MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.
+# See the GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License along with this program.
+# If not, see <http://www.gnu.org/licenses/>.
+
+import unittest
+import asyncio
+import os
+import tempfile
+from router_base.async_connector import AsyncConnectorApp, parseEndpoint
+from router_base.socket_controller import StandInController
+from router_base.socket_protocol import MessageDecoder, encodePacket, encodeIfaces, decodeIfaces, PACKET, IFACES
+from router_base.properties import PropertyDict, loadProperties
+from router_base.simple_router_base import SimpleRouterBase
+from router_base.routing_table_base import RoutingTableBase
+from router_base.arp_cache_base import ArpCacheBase
+from router_base.local_injector import Port
+
+class EchoRouter(SimpleRouterBase):
+    def __init__(self):
+        super().__init__(RoutingTableBase(), ArpCacheBase())
+
+    def handlePacket(self, packet, inIface):
+        if packet == b'bad':
+            raise ValueError("malformed packet")
+        self.sendPacket(b'echo:' + packet, inIface)
+
+PORTS = [Port("sw0-eth1", b'\0\0\0\0\0\1'), Port("sw0-eth3", b'\0\0\0\0\0\3')]
+
+class TestAsyncConnector(unittest.TestCase):
+
+    def test_framing(self):
+        """Socket protocol message framing"""
+
+        data = encodePacket(b'frame1', "eth1") + encodeIfaces(PORTS) + encodePacket(b'', "eth2")
+        decoder = MessageDecoder()
+        messages = []
+        for i in range(0, len(data), 5):
+            messages += decoder.feed(data[i:i + 5])
+        self.assertEqual([type for type, body in messages], [PACKET, IFACES, PACKET])
+        ports = decodeIfaces(messages[1][1])
+        self.assertEqual([(port.name, port.mac) for port in ports], [(port.name, port.mac) for port in PORTS])
+
+        self.assertEqual(parseEndpoint("udp:127.0.0.1:8889"), ("udp", ("127.0.0.1", 8889)))
+        with self.assertRaises(RuntimeError):
+            parseEndpoint("tcp:127.0.0.1:8889")
+
+    def test_properties(self):
+        """Ice-style property files"""
+
+        props = loadProperties("router.config", ["prog", "--RoutingTable.CacheSize=7"])
+        self.assertEqual(props.getPropertyWithDefault("SimpleRouter.Proxy", ""), "SimpleRouter:tcp -h 127.0.0.1 -p 8888")
+        self.assertEqual(props.getPropertyAsIntWithDefault("RoutingTable.CacheSize", 0), 7)
+        self.assertEqual(props.getPropertyAsIntWithDefault("Missing", 3), 3)
+
+    def runRouter(self, endpoint):
+        router = EchoRouter()
+        app = AsyncConnectorApp(router)
+        props = PropertyDict({"RoutingTable": "tests/RTABLE", "Ifconfig": "IP_CONFIG",
+                              "SimpleRouter.Endpoint": endpoint, "SimpleRouter.Keepalive": "0.05"})
+
+        async def scenario():
+            controller = StandInController(PORTS)
+            await controller.start(endpoint)
+            routerTask = asyncio.get_running_loop().create_task(app.run(props))
+            await asyncio.wait_for(controller.connected.wait(), 10)
+
+            # an error in one packet is logged, later packets and the connection are not affected
+            with self.assertLogs("riddikulus", "ERROR") as logs:
+                controller.inject([(b'one', "sw0-eth1"), (b'bad', "sw0-eth1"), (b'two', "sw0-eth3")])
+                await controller.waitForPackets(2)
+                controller.inject([(b'bad', "sw0-eth3")])
+                await asyncio.sleep(0.05)
+                controller.inject([(b'three', "sw0-eth1")])
+                received = await controller.waitForPackets(3)
+            self.assertEqual(len(logs.records), 2)
+            self.assertEqual(received, [(b'echo:one', "sw0-eth1"), (b'echo:two', "sw0-eth3"), (b'echo:three', "sw0-eth1")])
+            self.assertEqual([iface.name for iface in router.ifaces], ["sw0-eth1", "sw0-eth3"])
+            self.assertFalse(router.arpCache.tickerThread.is_alive())
+
+            # keepalives keep the connection up; router exits when controller goes away
+            await asyncio.sleep(0.3)
+            self.assertFalse(routerTask.done())
+            controller.close()
+            return await asyncio.wait_for(routerTask, 10)
+
+        return asyncio.run(scenario())
+
+    def test_unix(self):
+        """End-to-end over Unix-domain socket"""
+        with tempfile.TemporaryDirectory() as tmp:
+            self.assertEqual(self.runRouter("unix:%s" % os.path.join(tmp, "controller.sock")), 1)
+
+    def test_udp(self):
+        """End-to-end over UDP"""
+        self.assertEqual(self.runRouter("udp:127.0.0.1:%d" % (20000 + os.getpid() % 20000)), 1)
+
+if __name__ == '__main__':
+    unittest.main()
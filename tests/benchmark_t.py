@@ -0,0 +1,73 @@
+# -*- Mode: python; py-indent-offset: 4; indent-tabs-mode: nil; coding: utf-8; -*-
+# Copyright 2019 Alex Afanasyev
+#
+# This program is free software: you can redistribute it and/or modify it under the terms of
+# the GNU General Public License as published by the Free Software Foundation, either version
+# 3 of the License, or (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful, but WITHOUT ANY WARRANTY;
+# without even the implied warranty of MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.
+# See the GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License along with this program.
+# If not, see <http://www.gnu.org/licenses/>.
+
+
+import unittest
+import time
+import types
+from router_base.benchmark import Benchmark, findBenchmarks, runBenchmarks, compareResults, formatComparison, timeOperation
+
+class SumBenchmark(Benchmark):
+    def setUp(self):
+        self.values = list(range(100))
+
+    def bench_sum(self):
+        return lambda: sum(self.values)
+
+    def bench_len(self):
+        return lambda: len(self.values)
+
+    def helper(self):
+        pass
+
+class TestBenchmark(unittest.TestCase):
+
+    def test_run(self):
+        """Find and run benchmarks"""
+
+        module = types.SimpleNamespace(SumBenchmark=SumBenchmark, Benchmark=Benchmark, other=1)
+        found = findBenchmarks(module)
+        self.assertEqual([name for name, cls, method in found], ["SumBenchmark.len", "SumBenchmark.sum"])
+        self.assertEqual([name for name, cls, method in findBenchmarks(module, ["SumBenchmark.s"])], ["SumBenchmark.sum"])
+
+        results = runBenchmarks(found, repeat=2, minTime=0.001)
+        self.assertEqual(set(results['benchmarks']), {"SumBenchmark.len", "SumBenchmark.sum"})
+        for result in results['benchmarks'].values():
+            self.assertGreater(result['ns'], 0)
+            self.assertLessEqual(result['ns'], result['median'])
+            self.assertGreaterEqual(result['calls'], 1)
+
+    def test_warm_up(self):
+        """Slow first call is not included in calibration and timing"""
+
+        calls = []
+        def operation():
+            if not calls:
+                time.sleep(0.05) # e.g., lazy initialization
+            calls.append(1)
+
+        result = timeOperation(operation, repeat=2, minTime=0.01)
+        self.assertGreater(result['calls'], 1)
+        self.assertLess(result['ns'], 1e6)
+
+    def test_compare(self):
+        """Compare results with baseline"""
+
+        baseline = {'benchmarks': {"A.x": {'ns': 100.0}, "A.y": {'ns': 100.0}, "A.z": {'ns': 100.0}, "A.gone": {'ns': 1.0}}}
+        results = {'benchmarks': {"A.x": {'ns': 105.0}, "A.y": {'ns': 125.0}, "A.z": {'ns': 50.0}, "A.new": {'ns': 1.0}}}
+        comparison = compareResults(baseline, results, threshold=0.1)
+        self.assertEqual([(name, status) for name, base, current, ratio, status in comparison],
+                         [("A.x", ""), ("A.y", "regression"), ("A.z", "improvement")])
+        self.assertAlmostEqual(comparison[1][3], 1.25)
+        self.assertIn("+25.0% REGRESSION", formatComparison(comparison))
@@ -0,0 +1,108 @@
+# -*- Mode: python; py-indent-offset: 4; indent-tabs-mode: nil; coding: utf-8; -*-
+# Copyright 2021 Alex Afanasyev
+#
+# This program is free software: you can redistribute it and/or modify it under the terms of
+# the GNU General Public License as published by the Free Software Foundation, either version
+# 3 of the License, or (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful, but WITHOUT ANY WARRANTY;
+# without even the implied warranty of MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.
+# See the GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License along with this program.
+# If not, see <http://www.gnu.org/licenses/>.
+
+
+import unittest
+import os
+import glob
+import struct
+import tempfile
+from router_base.capture import Capture, INBOUND, OUTBOUND
+from router_base.pcap import PcapReader, readFrames
+from router_base.local_injector import LocalPacketInjector, Port
+from .pcap_t import ReplyRouter, corpusFrames
+
+def epbFlags(fileName):
+    '''
+    Direction flags of enhanced packet blocks in pcapng file written by PcapngWriter
+    '''
+    with open(fileName, "rb") as f:
+        data = f.read()
+    flags = []
+    offset = 0
+    while offset < len(data):
+        type, length = struct.unpack_from("<II", data, offset)
+        if type == 6:
+            captured = struct.unpack_from("<I", data, offset + 20)[0]
+            options = offset + 28 + (captured + 3) // 4 * 4
+            flags.append(struct.unpack_from("<I", data, options + 4)[0] if options < offset + length - 4 else 0)
+        offset += length
+    return flags
+
+class TestCapture(unittest.TestCase):
+
+    def test_router_capture(self):
+        """Capture received and sent frames of the router"""
+
+        router = ReplyRouter()
+        injector = LocalPacketInjector([Port("sw0-eth1", "00:00:00:00:00:01"), Port("sw0-eth2", "00:00:00:00:00:02")])
+        injector.attach(router)
+        self.addCleanup(router.arpCache.stop)
+        frames = corpusFrames()
+
+        with tempfile.TemporaryDirectory() as tmp:
+            prefix = os.path.join(tmp, "cap")
+            router.startCapture(prefix)
+            self.assertRaises(RuntimeError, router.startCapture, prefix)
+            injector.deliver([(frame, "sw0-eth1") for frame in frames])
+            injector.deliver([(frame, "sw0-eth2") for frame in frames], batchSize=4)
+            summary = router.stopCapture()
+            self.assertIsNone(router.capture)
+            self.assertIn("Captured 14 frames (0 lost)", summary)
+
+            fileName = prefix + "-00001.pcapng"
+            # every received frame, followed by the reply to it for IP packets
+            expected = []
+            for frame in frames:
+                expected.append((frame, INBOUND))
+                if frame[12:14] == b'\x08\x00':
+                    expected.append((frame, OUTBOUND))
+            self.assertEqual(readFrames(fileName), [frame for frame, direction in expected] * 2)
+            self.assertEqual(epbFlags(fileName), [direction for frame, direction in expected] * 2)
+            with open(fileName, "rb") as f:
+                data = f.read()
+            self.assertIn(b"sw0-eth1", data)
+            self.assertIn(b"sw0-eth2", data)
+
+            self.assertEqual(router.stopCapture(), "Capture is not running")
+
+    def test_rotation(self):
+        """Capture file rotation, snaplen and overrun"""
+
+        frame = bytes(range(100))
+        with tempfile.TemporaryDirectory() as tmp:
+            prefix = os.path.join(tmp, "cap")
+            capture = Capture(prefix, slots=1024, snaplen=64, fileSize=1000, fileCount=3)
+            for n in range(100):
+                capture.record(frame, "eth0", INBOUND)
+            stats = capture.stop()
+            self.assertEqual(stats['written'], 100)
+            self.assertEqual(stats['lost'], 0)
+            # only files that are still on disk are reported
+            self.assertGreater(stats['deleted'], 0)
+            self.assertEqual(sorted(glob.glob(prefix + "-*.pcapng")), stats['files'])
+            self.assertEqual(len(stats['files']), 3)
+            self.assertEqual(stats['files'][0], "%s-%05d.pcapng" % (prefix, stats['deleted'] + 1))
+            with PcapReader(stats['files'][-1]) as reader:
+                self.assertEqual([bytes(f) for t, f in reader][0], frame[:64])
+
+            # ring overrun: frames overwritten before the writer gets to them are counted as lost
+            capture = Capture(os.path.join(tmp, "small"), slots=8, snaplen=128)
+            for n in range(1000):
+                capture.record(n.to_bytes(4, 'big'), "eth0", OUTBOUND)
+            stats = capture.stop()
+            self.assertEqual(stats['written'] + stats['lost'], 1000)
+            self.assertGreaterEqual(stats['lost'], 992)
+            frames = readFrames(stats['files'][0])
+            self.assertEqual(frames[-1], (999).to_bytes(4, 'big'))
@@ -126,5 +126,63 @@ class TestHeaders(unittest.TestCase):
         self.assertEqual(str(h1), str(h3))
         self.assertEqual(h3.encode(), TestHeaders.EtherIpIcmpHddr[34:34+64])
 
+    def test_memoryview(self):
+        """Decode headers from memoryview at offsets, without copying"""
+
+        buf = memoryview(TestHeaders.EtherIpIcmpHddr)
+
+        eth = headers.EtherHeader()
+        self.assertEqual(eth.decode(buf), 14)
+        self.assertEqual(str(eth), str(headers.EtherHeader(TestHeaders.EtherIpIcmpHddr)))
+
+        ip = headers.IpHeader()
+        self.assertEqual(ip.decode(buf, 14), 20)
+        self.assertEqual(str(ip), str(headers.IpHeader(TestHeaders.EtherIpIcmpHddr[14:])))
+        self.assertEqual(str(headers.IpHeader(buf[14:])), str(ip))
+
+        icmp = headers.IcmpHeader()
+        self.assertEqual(icmp.decode(buf, 34), 64)
+        self.assertIsInstance(icmp.data, memoryview)
+        self.assertIs(icmp.data.obj, TestHeaders.EtherIpIcmpHddr)
+        self.assertEqual(str(icmp), str(headers.IcmpHeader(TestHeaders.EtherIpIcmpHddr[34:])))
+        self.assertEqual(icmp.encode(), TestHeaders.EtherIpIcmpHddr[34:])
+
+        arp = headers.ArpHeader()
+        self.assertEqual(arp.decode(memoryview(TestHeaders.EtherArpHdr), 14), 28)
+        self.assertEqual(str(arp), str(headers.ArpHeader(TestHeaders.EtherArpHdr[14:])))
+
+    def test_generated(self):
+        """Slotted header classes generated from field specification"""
+
+        h1 = headers.IpHeader(TestHeaders.EtherIpIcmpHddr[14:])
+        self.assertFalse(hasattr(h1, '__dict__'))
+        with self.assertRaises(AttributeError):
+            h1.foo = 1
+        self.assertEqual(headers.IpHeader.SIZE, 20)
+        self.assertEqual(h1.STRUCT.format, "!BBHHHBBHLL")
+
+        # encodeInto writes the same bytes as encode, at an offset
+        buf = bytearray(len(TestHeaders.EtherIpIcmpHddr))
+        offset = headers.EtherHeader(TestHeaders.EtherIpIcmpHddr).encodeInto(buf)
+        offset += h1.encodeInto(buf, offset)
+        offset += headers.IcmpHeader(TestHeaders.EtherIpIcmpHddr[34:]).encodeInto(buf, offset)
+        self.assertEqual(bytes(buf), TestHeaders.EtherIpIcmpHddr)
+
+        # address fields accept strings, integers, and address objects
+        h1.src = 0x02020202
+        self.assertEqual(str(h1.src), "2.2.2.2")
+        h1.dst = h1.src
+        self.assertEqual(str(h1.dst), "2.2.2.2")
+        eth = headers.EtherHeader(dhost=b'\xff' * 6, shost=headers.MacAddress("01:02:03:04:05:06"))
+        self.assertEqual(str(eth.dhost), "ff:ff:ff:ff:ff:ff")
+        self.assertEqual(str(eth.shost), "01:02:03:04:05:06")
+
+        arp = headers.ArpHeader()
+        arp.hrd = 6
+        with self.assertRaises(RuntimeError):
+            arp.sha = "ff:ff:ff:ff:ff:ff"
+        with self.assertRaises(RuntimeError):
+            headers.ArpHeader(arp.encode())
+
 if __name__ == '__main__':
     unittest.main()
@@ -0,0 +1,82 @@
+# -*- Mode: python; py-indent-offset: 4; indent-tabs-mode: nil; coding: utf-8; -*-
+# Copyright 2021 Alex Afanasyev
+#
+# This program is free software: you can redistribute it and/or modify it under the terms of
+# the GNU General Public License as published by the Free Software Foundation, either version
+# 3 of the License, or (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful, but WITHOUT ANY WARRANTY;
+# without even the implied warranty of MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.
+# See the GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License along with this program.
+# If not, see <http://www.gnu.org/licenses/>.
+
+import unittest
+import time
+from router_base.packet_batcher import PacketBatcher
+from router_base.local_injector import LocalPacketInjector
+
+class TestPacketBatcher(unittest.TestCase):
+
+    def makeBatcher(self, injector, **kwargs):
+        batcher = PacketBatcher(injector.sendPacket, injector.sendPackets, **kwargs)
+        self.addCleanup(batcher.stop)
+        return batcher
+
+    def test_size_limits(self):
+        """Batches are flushed when full"""
+
+        injector = LocalPacketInjector()
+        batcher = self.makeBatcher(injector, maxPackets=4, maxBytes=100, maxDelay=10**6)
+        expected = [(b'%d' % i, "eth%d" % (i % 3)) for i in range(10)]
+        for packet, iface in expected:
+            batcher.send(packet, iface)
+        self.assertEqual((injector.nSendCalls, len(injector.sent)), (2, 8))
+
+        batcher.send(b'x' * 100, "eth1") # exceeds byte limit
+        self.assertEqual((injector.nSendCalls, len(injector.sent)), (3, 11))
+        self.assertEqual(injector.sent, expected + [(b'x' * 100, "eth1")])
+
+        batcher.send(b'y', "eth2")
+        batcher.flush()
+        self.assertEqual(injector.sent[-1], (b'y', "eth2"))
+        self.assertEqual(injector.nSendCalls, 4)
+
+    def test_deadline(self):
+        """Partial batches are flushed after the deadline"""
+
+        injector = LocalPacketInjector()
+        batcher = self.makeBatcher(injector, maxPackets=64, maxDelay=1000)
+        batcher.send(b'a', "eth1")
+        batcher.send(b'b', "eth2")
+        for i in range(500):
+            if injector.sent:
+                break
+            time.sleep(0.01)
+        self.assertEqual(injector.sent, [(b'a', "eth1"), (b'b', "eth2")])
+        self.assertEqual(injector.nSendCalls, 1)
+
+        batcher.send(b'c', "eth1")
+        batcher.stop()
+        self.assertEqual(injector.sent[-1], (b'c', "eth1"))
+
+    def test_fallback(self):
+        """Packets are sent one by one if the peer lacks sendPackets"""
+
+        injector = LocalPacketInjector(supportsBatches=False)
+        batcher = self.makeBatcher(injector, maxPackets=2)
+        for i in range(5):
+            batcher.send(b'%d' % i, "eth1")
+        self.assertFalse(batcher.batching)
+        self.assertEqual([packet for packet, iface in injector.sent], [b'0', b'1', b'2', b'3', b'4'])
+        self.assertEqual(injector.nSendCalls, 5)
+
+        # batching disabled by configuration
+        injector = LocalPacketInjector()
+        batcher = self.makeBatcher(injector, maxPackets=1)
+        batcher.send(b'0', "eth1")
+        self.assertEqual(injector.sent, [(b'0', "eth1")])
+
+if __name__ == '__main__':
+    unittest.main()
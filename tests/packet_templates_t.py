@@ -0,0 +1,76 @@
+# -*- Mode: python; py-indent-offset: 4; indent-tabs-mode: nil; coding: utf-8; -*-
+# Copyright 2021 Alex Afanasyev
+#
+# This program is free software: you can redistribute it and/or modify it under the terms of
+# the GNU General Public License as published by the Free Software Foundation, either version
+# 3 of the License, or (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful, but WITHOUT ANY WARRANTY;
+# without even the implied warranty of MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.
+# See the GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License along with this program.
+# If not, see <http://www.gnu.org/licenses/>.
+
+import unittest
+from router_base.headers import EtherHeader, IpHeader, ArpHeader, IcmpHeader
+from router_base.interface import Interface
+from router_base.packet_templates import PacketTemplates
+from router_base.utils import checksum
+
+class TestPacketTemplates(unittest.TestCase):
+
+    def setUp(self):
+        self.iface = Interface("eth1", "1c:f2:9a:a0:28:21", "192.168.100.1")
+        self.templates = PacketTemplates(self.iface)
+        self.request = open("tests/raw-packets/raw-icmp-request.bin", "rb").read()
+
+    def test_arp(self):
+        """ARP request and reply templates"""
+
+        packet = self.templates.arpRequest("192.168.100.151")
+        ether = EtherHeader(packet)
+        self.assertEqual((str(ether.dhost), str(ether.shost), ether.type), ("ff:ff:ff:ff:ff:ff", "1c:f2:9a:a0:28:21", 0x0806))
+        arp = ArpHeader()
+        arp.decode(packet, EtherHeader.SIZE)
+        self.assertEqual((arp.hrd, arp.pro, arp.hln, arp.pln, arp.op), (1, 0x0800, 6, 4, ArpHeader.Opcode.Request))
+        self.assertEqual((str(arp.sha), str(arp.sip), str(arp.tip)), ("1c:f2:9a:a0:28:21", "192.168.100.1", "192.168.100.151"))
+
+        packet = self.templates.arpReply("f0:18:98:96:e3:18", "192.168.100.156")
+        expected = EtherHeader(dhost="f0:18:98:96:e3:18", shost=self.iface.mac, type=0x0806).encode() + \
+            ArpHeader(hln=6, pln=4, op=ArpHeader.Opcode.Reply, sha=self.iface.mac, sip=self.iface.ip,
+                      tha="f0:18:98:96:e3:18", tip="192.168.100.156").encode()
+        self.assertEqual(packet, expected)
+
+    def test_echo_reply(self):
+        """Echo reply template"""
+
+        echo = IcmpHeader()
+        echo.decode(self.request, 34)
+        packet = self.templates.echoReply("f0:18:98:96:e3:18", "192.168.100.156", echo.id, echo.seqNum, echo.data, ipId=42)
+
+        ip = IpHeader(hl=5, len=20 + 8 + len(echo.data), id=42, ttl=64, p=1, src=self.iface.ip, dst="192.168.100.156")
+        ip.sum = checksum(ip.encode())
+        icmp = IcmpHeader(type=0, id=echo.id, seqNum=echo.seqNum, data=echo.data)
+        icmp.sum = checksum(icmp.encode())
+        expected = EtherHeader(dhost="f0:18:98:96:e3:18", shost=self.iface.mac, type=0x0800).encode() + ip.encode() + icmp.encode()
+        self.assertEqual(packet, expected)
+        self.assertEqual(checksum(packet[14:34]), 0xffff)
+        self.assertEqual(checksum(packet[34:]), 0xffff)
+
+    def test_errors(self):
+        """Time exceeded and port unreachable templates"""
+
+        for method, type, code in ((self.templates.timeExceeded, 11, 0), (self.templates.portUnreachable, 3, 3)):
+            packet = method("f0:18:98:96:e3:18", "192.168.100.156", self.request[14:])
+            self.assertEqual(len(packet), 14 + 20 + 8 + 28)
+            ip = IpHeader(packet[14:])
+            self.assertEqual((ip.len, ip.p, str(ip.src), str(ip.dst)), (56, 1, "192.168.100.1", "192.168.100.156"))
+            self.assertEqual(checksum(packet[14:34]), 0xffff)
+            icmp = IcmpHeader()
+            icmp.decode(packet, 34)
+            self.assertEqual((icmp.type, icmp.code, bytes(icmp.data)), (type, code, self.request[14:42]))
+            self.assertEqual(checksum(packet[34:]), 0xffff)
+
+if __name__ == '__main__':
+    unittest.main()
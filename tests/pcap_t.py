@@ -0,0 +1,107 @@
+# -*- Mode: python; py-indent-offset: 4; indent-tabs-mode: nil; coding: utf-8; -*-
+# Copyright 2021 Alex Afanasyev
+#
+# This program is free software: you can redistribute it and/or modify it under the terms of
+# the GNU General Public License as published by the Free Software Foundation, either version
+# 3 of the License, or (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful, but WITHOUT ANY WARRANTY;
+# without even the implied warranty of MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.
+# See the GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License along with this program.
+# If not, see <http://www.gnu.org/licenses/>.
+
+import unittest
+import os
+import struct
+import tempfile
+from router_base.pcap import PcapReader, PcapWriter, readFrames
+from router_base.replay import replay, percentile
+from router_base.simple_router_base import SimpleRouterBase
+from router_base.routing_table_base import RoutingTableBase
+from router_base.arp_cache_base import ArpCacheBase
+from router_base.properties import PropertyDict
+
+CORPUS = ["raw-arp-request.bin", "raw-icmp-request.bin", "raw-icmp-reply.bin", "raw-udp.bin"]
+
+def corpusFrames():
+    return [open("tests/raw-packets/%s" % name, "rb").read() for name in CORPUS]
+
+def pcapngBlock(type, body):
+    body += b'\0' * (-len(body) % 4)
+    return struct.pack("<II", type, len(body) + 12) + body + struct.pack("<I", len(body) + 12)
+
+class ReplyRouter(SimpleRouterBase):
+    '''
+    Sends every received IP packet back
+    '''
+    def __init__(self):
+        super().__init__(RoutingTableBase(), ArpCacheBase())
+
+    def handlePacket(self, packet, inIface):
+        if packet[12:14] == b'\x08\x00':
+            self.sendPacket(packet, inIface)
+
+class TestPcap(unittest.TestCase):
+
+    def test_pcap(self):
+        """Read and write pcap files"""
+
+        with PcapReader("tests/raw-packets/corpus.pcap") as reader:
+            records = [(timestamp, bytes(frame)) for timestamp, frame in reader]
+        self.assertEqual([frame for timestamp, frame in records], corpusFrames())
+        self.assertAlmostEqual(records[1][0], 1635000000.25, places=5)
+
+        with tempfile.TemporaryDirectory() as tmp:
+            fileName = os.path.join(tmp, "out.pcap")
+            with PcapWriter(fileName, snaplen=64) as writer:
+                for frame in corpusFrames():
+                    writer.write(frame, 10.5)
+            self.assertEqual(readFrames(fileName), [frame[:64] for frame in corpusFrames()])
+
+            # files that are not captures are single raw frames
+            self.assertEqual(readFrames("tests/raw-packets/raw-udp.bin"), corpusFrames()[3:])
+
+    def test_pcapng(self):
+        """Read pcapng files"""
+
+        frames = corpusFrames()
+        data = pcapngBlock(0x0a0d0d0a, struct.pack("<IHHq", 0x1a2b3c4d, 1, 0, -1))
+        # interface with nanosecond timestamps (if_tsresol = 9)
+        data += pcapngBlock(1, struct.pack("<HHI", 1, 0, 0) + struct.pack("<HHB", 9, 1, 9) + b'\0' * 3 + struct.pack("<HH", 0, 0))
+        for n, frame in enumerate(frames[:3]):
+            ts = 1635000000 * 10**9 + n
+            data += pcapngBlock(6, struct.pack("<IIIII", 0, ts >> 32, ts & 0xffffffff, len(frame), len(frame)) + frame)
+        data += pcapngBlock(3, struct.pack("<I", len(frames[3])) + frames[3])
+        data += pcapngBlock(0x0bad, b'unknown block')
+
+        with tempfile.TemporaryDirectory() as tmp:
+            fileName = os.path.join(tmp, "trace.pcapng")
+            with open(fileName, "wb") as f:
+                f.write(data)
+            with PcapReader(fileName) as reader:
+                records = [(timestamp, bytes(frame)) for timestamp, frame in reader]
+        self.assertEqual([frame for timestamp, frame in records], frames)
+        self.assertAlmostEqual(records[2][0], 1635000000.000000002, places=5)
+
+    def test_replay(self):
+        """Replay frames through the router"""
+
+        router = ReplyRouter()
+        self.addCleanup(router.arpCache.stop)
+        router.configure(PropertyDict({"RoutingTable": "tests/RTABLE", "Ifconfig": "IP_CONFIG"}))
+        report = replay(router, readFrames("tests/raw-packets/corpus.pcap"), "sw0-eth3", repeat=5)
+
+        self.assertEqual((report['input'], report['output']), (20, 15))
+        self.assertEqual(sorted(iface.name for iface in router.ifaces), ["sw0-eth1", "sw0-eth2", "sw0-eth3"])
+        self.assertGreater(report['pps'], 0)
+        latency = report['latency']
+        self.assertTrue(0 < latency['p50'] <= latency['p90'] <= latency['p99'] <= latency['max'])
+
+        self.assertEqual(percentile(list(range(1, 101)), 50), 50)
+        self.assertEqual(percentile(list(range(1, 101)), 99), 99)
+        self.assertEqual(percentile([7], 99.9), 7)
+
+if __name__ == '__main__':
+    unittest.main()
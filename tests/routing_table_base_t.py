@@ -14,7 +14,45 @@
 
 import unittest
 import io
-from router_base import routing_table_base
+import os
+import random
+import tempfile
+import threading
+from router_base import routing_table_base, rtable_snapshot
+from router_base.rtable_gen import generateRoutes, writeRtable
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+def referenceEntries(table):
+    return [(int(entry.dest) & int(entry.mask), int(entry.mask), entry) for entry in table.entries]
+
+def linearLookup(reference, ip):
+    '''Reference longest prefix match: linear scan over (dest, mask, entry) list'''
+    ip = int(ip)
+    best = None
+    bestMask = -1
+    for dest, mask, entry in reference:
+        if (ip & mask) == dest and mask > bestMask:
+            best = entry
+            bestMask = mask
+    return best
+
+def randomTable(table, count, seed):
+    rnd = random.Random(seed)
+    entries = []
+    for i in range(count):
+        length = rnd.choice([0, 8, 12, 16, 16, 20, 22, 24, 24, 24, 25, 28, 30, 32])
+        mask = (0xffffffff << (32 - length)) & 0xffffffff
+        dest = rnd.getrandbits(32)
+        if i % 7 == 0 and len(entries) > 0:
+            # reuse existing prefix to exercise duplicates and nesting
+            dest = int(rnd.choice(entries).dest)
+        entries.append(routing_table_base.RoutingTableEntry(dest, "0.0.0.0", mask, "eth%d" % i))
+    table.addEntries(entries)
+    return rnd
 
 class TestRoutingTableBase(unittest.TestCase):
 
@@ -45,5 +83,311 @@ class TestRoutingTableBase(unittest.TestCase):
 172.64.3.10        255.255.0.0        172.64.3.10        sw0-eth2
 """)
 
+    def test_lookup(self):
+        """Longest prefix match using each of the prefix index engines"""
+
+        for engine in routing_table_base.Engines:
+            with self.subTest(engine=engine):
+                table = routing_table_base.RoutingTableBase(engine)
+                table.load("tests/RTABLE")
+                self.assertEqual(table.longestPrefixMatch(routing_table_base.IpAddress("192.168.2.10")).ifName, "sw0-eth1")
+                self.assertEqual(table.longestPrefixMatch(routing_table_base.IpAddress("172.64.200.1")).ifName, "sw0-eth2")
+                self.assertEqual(table.longestPrefixMatch(routing_table_base.IpAddress("8.8.8.8")).ifName, "sw0-eth3")
+
+                table = routing_table_base.RoutingTableBase(engine)
+                self.assertIsNone(table.longestPrefixMatch(0x01020304))
+
+                rnd = randomTable(table, 500, 1)
+                reference = referenceEntries(table)
+                for i in range(2000):
+                    if i % 2:
+                        ip = rnd.getrandbits(32)
+                    else:
+                        ip = int(rnd.choice(table.entries).dest) ^ rnd.getrandbits(rnd.randint(0, 12))
+                    self.assertIs(table.longestPrefixMatch(ip), linearLookup(reference, ip))
+
+                with self.assertRaises(RuntimeError):
+                    table.addEntry(routing_table_base.RoutingTableEntry("1.0.0.0", "0.0.0.0", "255.0.255.0", "eth0"))
+
+    def test_engine(self):
+        """Switching routing table engine"""
+
+        table = routing_table_base.RoutingTableBase()
+        table.load("tests/RTABLE")
+        table.setEngine("dir-24-8")
+        self.assertEqual(table.engine, "dir-24-8")
+        self.assertEqual(table.longestPrefixMatch(routing_table_base.IpAddress("172.64.200.1")).ifName, "sw0-eth2")
+
+        # entries added after the lookup arrays were built; arrays are rebuilt by addEntry
+        table.addEntry(routing_table_base.RoutingTableEntry("172.64.200.0", "0.0.0.0", "255.255.255.128", "eth0"))
+        self.assertFalse(table.index.dirty)
+        self.assertEqual(table.longestPrefixMatch(routing_table_base.IpAddress("172.64.200.1")).ifName, "eth0")
+        self.assertEqual(table.longestPrefixMatch(routing_table_base.IpAddress("172.64.200.129")).ifName, "sw0-eth2")
+
+        with self.assertRaises(RuntimeError):
+            table.setEngine("hash")
+
+    def test_concurrent_build(self):
+        """Lookups keep using the published dir-24-8 arrays while entries are added"""
+
+        index = routing_table_base.Engines["dir-24-8"]()
+        index.insert(0x0a000000, 8, 0)
+        self.assertIsNone(index.lookup(0x0a010203)) # not built yet
+        self.assertEqual(index.getTables(), index.tables)
+        index.insert(0x0a010200, 24, 1)
+        self.assertEqual(index.lookup(0x0a010203), 0) # arrays of the previous build
+        index.getTables()
+        self.assertEqual(index.lookup(0x0a010203), 1)
+
+        table = routing_table_base.RoutingTableBase("dir-24-8")
+        table.addEntries([routing_table_base.RoutingTableEntry("10.0.0.0", "0.0.0.0", "255.0.0.0", "eth1")])
+        published = table.index
+        results = set()
+        stop = threading.Event()
+        def lookup():
+            while not stop.is_set():
+                results.add(table.longestPrefixMatch(0x0a010203).ifName)
+        thread = threading.Thread(target=lookup)
+        thread.start()
+        try:
+            table.addEntries([routing_table_base.RoutingTableEntry("10.1.2.0", "0.0.0.0", "255.255.255.0", "eth2")])
+        finally:
+            stop.set()
+            thread.join()
+
+        # new arrays are built in a copy, the published index is not modified
+        self.assertIsNot(table.index, published)
+        self.assertFalse(published.dirty)
+        self.assertEqual(published.lookup(0x0a010203), 0)
+        self.assertEqual(table.longestPrefixMatch(0x0a010203).ifName, "eth2")
+        self.assertTrue(results <= {"eth1", "eth2"})
+
+    def test_route_cache(self):
+        """Route cache counters and invalidation"""
+
+        table = routing_table_base.RoutingTableBase(cacheSize=2)
+        table.load("tests/RTABLE")
+        ip = routing_table_base.IpAddress("172.64.200.1")
+
+        self.assertEqual(table.longestPrefixMatch(ip).ifName, "sw0-eth2")
+        self.assertEqual((table.cache.hits, table.cache.misses), (0, 1))
+
+        # cache hit does not touch the index
+        index, table.index = table.index, None
+        self.assertEqual(table.longestPrefixMatch(ip).ifName, "sw0-eth2")
+        self.assertEqual((table.cache.hits, table.cache.misses), (1, 1))
+        table.index = index
+
+        table.addEntry(routing_table_base.RoutingTableEntry("172.64.200.0", "0.0.0.0", "255.255.255.0", "eth0"))
+        self.assertEqual(len(table.cache), 0)
+        self.assertEqual(table.longestPrefixMatch(ip).ifName, "eth0")
+
+        table.longestPrefixMatch(0x01010101)
+        table.longestPrefixMatch(0x02020202)
+        self.assertEqual(len(table.cache), 2)
+        self.assertEqual(table.cache.evictions, 1)
+
+        # disabled cache does not count lookups
+        table.setCacheSize(0)
+        counters = (table.cache.hits, table.cache.misses)
+        self.assertEqual(table.longestPrefixMatch(ip).ifName, "eth0")
+        self.assertEqual(len(table.cache), 0)
+        self.assertEqual((table.cache.hits, table.cache.misses), counters)
+
+    @unittest.skipIf(numpy is None, "NumPy is not installed")
+    def test_lookup_many(self):
+        """Vectorized batch lookup matches scalar lookup"""
+
+        table = routing_table_base.RoutingTableBase()
+        self.assertEqual(table.lookupMany(numpy.array([1, 2], dtype=numpy.uint32)).tolist(), [-1, -1])
+
+        rnd = randomTable(table, 500, 2)
+        addrs = [rnd.getrandbits(32) for i in range(1000)] + \
+                [int(rnd.choice(table.entries).dest) ^ rnd.getrandbits(rnd.randint(0, 12)) for i in range(1000)]
+        result = table.lookupMany(numpy.array(addrs, dtype=numpy.uint32))
+        self.assertEqual(result.dtype, numpy.int64)
+        for addr, pos in zip(addrs, result.tolist()):
+            entry = table.longestPrefixMatch(addr)
+            self.assertEqual(pos, table.entries.index(entry) if entry is not None else -1)
+
+        # index is rebuilt after the table changes
+        table.addEntry(routing_table_base.RoutingTableEntry(addrs[0], "0.0.0.0", "255.255.255.255", "eth0"))
+        self.assertEqual(table.lookupMany(numpy.array(addrs[:1], dtype=numpy.uint32)).tolist(), [len(table.entries) - 1])
+
+    def test_snapshot(self):
+        """Load routing table through compiled snapshot"""
+
+        def load(fileName, engine):
+            table = routing_table_base.RoutingTableBase(engine, cacheSize=0)
+            table.setSnapshot(True)
+            table.load(fileName)
+            return table
+
+        with tempfile.TemporaryDirectory() as tmp:
+            fileName = os.path.join(tmp, "RTABLE")
+            writeRtable(generateRoutes(300, seed=5), fileName)
+            with open(fileName, "at") as f:
+                f.write("192.168.2.2 192.168.2.2 255.255.255.0 sw0-eth1\n") # dest with host bits
+
+            text = load(fileName, "trie")
+            self.assertIsInstance(text.entries, list)
+            self.assertTrue(os.path.exists(rtable_snapshot.snapshotPath(fileName)))
+            rnd = random.Random(6)
+            addrs = [rnd.getrandbits(32) for i in range(500)] + [int(entry.dest) for entry in text.entries]
+
+            for engine in ("trie", "dir-24-8", "dir-24-8"):
+                table = load(fileName, engine)
+                self.assertIsInstance(table.entries, rtable_snapshot.SnapshotEntries)
+                self.assertEqual([str(entry) for entry in table.entries], [str(entry) for entry in text.entries])
+                self.assertIs(table.entries[-1], table.entries[len(table.entries) - 1])
+                for addr in addrs:
+                    self.assertEqual(str(table.longestPrefixMatch(addr)), str(text.longestPrefixMatch(addr)))
+            # the second dir-24-8 load uses the index saved by the first one
+            self.assertIsNotNone(rtable_snapshot.openSnapshot(fileName).tables)
+            self.assertIsNone(table.index.prefixes)
+
+            # snapshot entries become a list when the table is modified
+            table.addEntry(routing_table_base.RoutingTableEntry("11.0.0.0", "0.0.0.0", "255.255.255.255", "eth9"))
+            self.assertIsInstance(table.entries, list)
+            self.assertEqual(table.longestPrefixMatch(0x0b000000).ifName, "eth9")
+            self.assertEqual(str(table.longestPrefixMatch(addrs[0])), str(text.longestPrefixMatch(addrs[0])))
+
+            # changed text invalidates the snapshot
+            with open(fileName, "at") as f:
+                f.write("11.0.0.0 0.0.0.0 255.255.255.255 eth9\n")
+            self.assertIsNone(rtable_snapshot.openSnapshot(fileName))
+            table = load(fileName, "trie")
+            self.assertIsInstance(table.entries, list)
+            self.assertEqual(len(table.entries), len(text.entries) + 1)
+            self.assertEqual(len(load(fileName, "trie").entries), len(text.entries) + 1)
+
+    def test_snapshot_edited_file(self):
+        """Snapshot records the hash of the parsed text, not of the file edited afterwards"""
+
+        readSource = rtable_snapshot.readSource
+        def readAndEdit(fileName):
+            result = readSource(fileName)
+            with open(fileName, "at") as f:
+                f.write("11.0.0.0 0.0.0.0 255.255.255.255 eth9\n")
+            return result
+
+        with tempfile.TemporaryDirectory() as tmp:
+            fileName = os.path.join(tmp, "RTABLE")
+            for reload in (False, True):
+                writeRtable(generateRoutes(50, seed=11), fileName)
+                table = routing_table_base.RoutingTableBase(cacheSize=0)
+                table.setSnapshot(True)
+                if reload:
+                    table.load(fileName)
+                    writeRtable(generateRoutes(60, seed=11), fileName)
+                rtable_snapshot.readSource = readAndEdit
+                try:
+                    table.reload(fileName) if reload else table.load(fileName)
+                finally:
+                    rtable_snapshot.readSource = readSource
+                self.assertIsNone(rtable_snapshot.openSnapshot(fileName))
+
+                table = routing_table_base.RoutingTableBase(cacheSize=0)
+                table.setSnapshot(True)
+                table.load(fileName)
+                self.assertEqual(table.longestPrefixMatch(0x0b000000).ifName, "eth9")
+
+    def test_reload_duplicates(self):
+        """Reload gives the same table as a fresh load when prefixes are duplicated"""
+
+        rnd = random.Random(10)
+        prefixes = [(0x0a000000, 0xff000000), (0x0a010000, 0xffff0000), (0x0a010200, 0xffffff00), (0x0a010203, 0xffffffff)]
+        def randomRoutes(count):
+            return [rnd.choice(prefixes) + (rnd.randrange(4),) for i in range(count)]
+        def toRoutes(items):
+            return [(dest, 0x0b000000 + gw, mask, "eth%d" % gw) for dest, mask, gw in items]
+        addrs = [0x0a010203, 0x0a010204, 0x0a010304, 0x0a020304, 0x0b000000]
+
+        with tempfile.TemporaryDirectory() as tmp:
+            fileName = os.path.join(tmp, "RTABLE")
+            for engine in ("list", "trie", "dir-24-8"):
+                table = routing_table_base.RoutingTableBase(engine)
+                items = randomRoutes(8)
+                writeRtable(toRoutes(items), fileName)
+                table.load(fileName)
+                for trial in range(30):
+                    # drop, duplicate, reorder and add routes
+                    items = [item for item in items if rnd.random() < 0.8]
+                    items += [rnd.choice(items) for i in range(rnd.randrange(3))] if items else []
+                    rnd.shuffle(items)
+                    items[rnd.randrange(len(items) + 1):0] = randomRoutes(rnd.randrange(4))
+                    writeRtable(toRoutes(items), fileName)
+                    table.reload(fileName)
+
+                    reference = routing_table_base.RoutingTableBase(engine, cacheSize=0)
+                    reference.load(fileName)
+                    self.assertEqual(list(map(routing_table_base.routeKey, table.entries)), toRoutes(items))
+                    for addr in addrs:
+                        self.assertEqual(str(table.longestPrefixMatch(addr)), str(reference.longestPrefixMatch(addr)), (engine, trial))
+
+    def test_reload(self):
+        """Reload routing table with incremental diff and atomic swap"""
+
+        routes = generateRoutes(400, seed=7)
+        # new version: 100 routes removed, 60 added, one duplicate prefix with another gateway
+        newRoutes = routes[:150] + routes[250:] + generateRoutes(460, seed=8)[400:] + [routes[10][:1] + (0x0a0000fe,) + routes[10][2:]]
+        rnd = random.Random(9)
+        addrs = [rnd.getrandbits(32) for i in range(300)] + [dest | 1 for dest, gw, mask, ifName in routes + newRoutes]
+
+        with tempfile.TemporaryDirectory() as tmp:
+            oldFile = os.path.join(tmp, "RTABLE.old")
+            newFile = os.path.join(tmp, "RTABLE.new")
+            writeRtable(routes, oldFile)
+            writeRtable(newRoutes, newFile)
+
+            for engine in ("list", "trie", "dir-24-8"):
+                reference = routing_table_base.RoutingTableBase(engine, cacheSize=0)
+                reference.load(newFile)
+
+                table = routing_table_base.RoutingTableBase(engine)
+                table.load(oldFile)
+                kept = table.entries[0]
+                self.assertEqual(table.reload(newFile), (61, 100))
+                self.assertEqual(len(table.entries), len(newRoutes))
+                self.assertIn(kept, table.entries)
+                self.assertEqual(list(map(routing_table_base.routeKey, table.entries)), newRoutes)
+                for addr in addrs:
+                    self.assertEqual(str(table.longestPrefixMatch(addr)), str(reference.longestPrefixMatch(addr)), engine)
+
+                self.assertEqual(table.reload(newFile), (0, 0))
+                self.assertEqual(table.reload(oldFile), (100, 61))
+                self.assertEqual(list(map(routing_table_base.routeKey, table.entries)), routes)
+
+                # the table is not changed if the file cannot be parsed
+                with open(os.path.join(tmp, "RTABLE.bad"), "wt") as f:
+                    f.write("10.0.0.0 0.0.0.0 255.0.0.0\n")
+                entries = table.entries
+                with self.assertRaises(ValueError):
+                    table.reload(os.path.join(tmp, "RTABLE.bad"))
+                self.assertIs(table.entries, entries)
+
+            # concurrent lookups see either the old or the new table
+            old = routing_table_base.RoutingTableBase(cacheSize=0)
+            old.load(oldFile)
+            new = routing_table_base.RoutingTableBase(cacheSize=0)
+            new.load(newFile)
+            expected = [(str(old.longestPrefixMatch(addr)), str(new.longestPrefixMatch(addr))) for addr in addrs]
+            table = routing_table_base.RoutingTableBase(cacheSize=16)
+            table.load(oldFile)
+            done = threading.Event()
+            unexpected = []
+            def lookups():
+                while not done.is_set():
+                    for addr, results in zip(addrs, expected):
+                        if str(table.longestPrefixMatch(addr)) not in results:
+                            unexpected.append(addr)
+            thread = threading.Thread(target=lookups)
+            thread.start()
+            for i in range(6):
+                table.reload(newFile if i % 2 == 0 else oldFile)
+            done.set()
+            thread.join()
+            self.assertEqual(unexpected, [])
+
 if __name__ == '__main__':
     unittest.main()
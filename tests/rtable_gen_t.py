@@ -0,0 +1,83 @@
+# -*- Mode: python; py-indent-offset: 4; indent-tabs-mode: nil; coding: utf-8; -*-
+# Copyright 2019 Alex Afanasyev
+#
+# This program is free software: you can redistribute it and/or modify it under the terms of
+# the GNU General Public License as published by the Free Software Foundation, either version
+# 3 of the License, or (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful, but WITHOUT ANY WARRANTY;
+# without even the implied warranty of MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.
+# See the GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License along with this program.
+# If not, see <http://www.gnu.org/licenses/>.
+
+
+import unittest
+import os
+import tempfile
+from router_base.rtable_gen import generateRoutes, writeRtable, lengthToMask
+from router_base.lpm_check import ReferenceLpm, randomAddresses, crossCheck, measure
+from router_base.routing_table_base import RoutingTableEntry
+from ridikkulus_routing_table import RoutingTable
+
+class TestRtableGen(unittest.TestCase):
+
+    def test_generate(self):
+        """Generate synthetic routing table"""
+
+        routes = generateRoutes(5000, seed=1)
+        self.assertEqual(len(routes), 5000)
+        self.assertEqual(routes[0][0], 0)
+        self.assertEqual(routes[0][2], 0)
+        self.assertEqual(len({(dest, mask) for dest, gw, mask, ifName in routes}), 5000)
+        for dest, gw, mask, ifName in routes:
+            self.assertEqual(dest & mask, dest)
+        lengths = [bin(mask).count('1') for dest, gw, mask, ifName in routes]
+        self.assertGreater(lengths.count(24), 2000)
+        self.assertEqual(routes, generateRoutes(5000, seed=1))
+
+        with tempfile.TemporaryDirectory() as tmp:
+            fileName = os.path.join(tmp, "RTABLE")
+            writeRtable(routes, fileName)
+            table = RoutingTable()
+            table.load(fileName)
+            self.assertEqual([(int(e.dest), int(e.gw), int(e.mask), e.ifName) for e in table.entries], routes)
+
+    def test_cross_check(self):
+        """Cross-check lookups of each engine with the ipaddress-based reference"""
+
+        routes = generateRoutes(2000, seed=2)
+        for engine in ("list", "trie", "dir-24-8"):
+            table = RoutingTable(engine=engine, cacheSize=0)
+            table.addEntries([RoutingTableEntry(dest, gw, mask, ifName) for dest, gw, mask, ifName in routes])
+            addrs = randomAddresses(table, 2000, seed=3)
+            self.assertEqual(crossCheck(table, addrs), [], engine)
+
+        # reference: longest match wins, first of duplicates wins, no match without default
+        entries = [RoutingTableEntry("10.0.0.0", "0.0.0.0", "255.0.0.0", "a"),
+                   RoutingTableEntry("10.1.0.0", "0.0.0.0", "255.255.0.0", "b"),
+                   RoutingTableEntry("10.1.0.7", "0.0.0.0", "255.255.0.0", "c")]
+        reference = ReferenceLpm(entries)
+        self.assertIs(reference.lookup(0x0a010203), entries[1])
+        self.assertIs(reference.lookup(0x0a020304), entries[0])
+        self.assertIsNone(reference.lookup(0x0b000000))
+
+        # mismatches are reported
+        table = RoutingTable(cacheSize=0)
+        for entry in entries[:1]:
+            table.addEntry(entry)
+        self.assertEqual(crossCheck(table, [0x0a010203], reference), [(0x0a010203, entries[0], entries[1])])
+
+    def test_measure(self):
+        """Measure load time, memory and lookup rate"""
+
+        with tempfile.TemporaryDirectory() as tmp:
+            fileName = os.path.join(tmp, "RTABLE")
+            writeRtable(generateRoutes(500, seed=4), fileName)
+            row = measure(RoutingTable, fileName, "trie", nLookups=1000)
+        self.assertEqual(row['entries'], 500)
+        self.assertEqual(row['checked'], 1000)
+        self.assertEqual(row['mismatches'], 0)
+        self.assertGreater(row['memoryBytes'], 0)
+        self.assertGreater(row['lookupsPerSecond'], 0)
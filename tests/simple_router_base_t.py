@@ -0,0 +1,154 @@
+# -*- Mode: python; py-indent-offset: 4; indent-tabs-mode: nil; coding: utf-8; -*-
+# Copyright 2021 Alex Afanasyev
+#
+# This program is free software: you can redistribute it and/or modify it under the terms of
+# the GNU General Public License as published by the Free Software Foundation, either version
+# 3 of the License, or (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful, but WITHOUT ANY WARRANTY;
+# without even the implied warranty of MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.
+# See the GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License along with this program.
+# If not, see <http://www.gnu.org/licenses/>.
+
+import unittest
+import os
+import tempfile
+import threading
+from router_base.simple_router_base import SimpleRouterBase
+from router_base.routing_table_base import RoutingTableBase
+from router_base.arp_cache_base import ArpCacheBase
+from router_base.ip_address import IpAddress
+from router_base.mac_address import MacAddress
+from router_base.local_injector import LocalPacketInjector, Port
+
+class EchoRouter(SimpleRouterBase):
+    '''
+    Sends every received packet back on the incoming interface
+    '''
+    def __init__(self, *args):
+        super().__init__(*args)
+        self.received = []
+        # called for each packet, e.g., to check the ARP cache is available to other threads
+        self.onPacket = None
+
+    def handlePacket(self, packet, inIface):
+        self.received.append((packet, inIface))
+        if self.onPacket:
+            self.onPacket()
+        self.sendPacket(packet, inIface)
+
+class TestSimpleRouterBase(unittest.TestCase):
+
+    def setUp(self):
+        self.arpCache = ArpCacheBase()
+        self.router = EchoRouter(None, self.arpCache)
+        self.router.ifNameToIpMap = {"eth1": IpAddress("10.0.1.1"), "eth2": IpAddress("10.0.2.1")}
+
+    def tearDown(self):
+        self.arpCache.stop()
+
+    def test_iface_indexes(self):
+        """Interface lookups by name, IP and MAC"""
+
+        self.router.reset([Port("eth1", "00:00:00:00:00:01"), Port("eth2", "00:00:00:00:00:02"),
+                           Port("eth3", "00:00:00:00:00:03")]) # eth3 is not in IP config
+        self.assertEqual([iface.name for iface in self.router.ifaces], ["eth1", "eth2"])
+
+        eth1 = self.router.findIfaceByName("eth1")
+        self.assertEqual(str(eth1.ip), "10.0.1.1")
+        self.assertIsNotNone(eth1.templates)
+        self.assertIsNone(self.router.findIfaceByName("eth3"))
+
+        for key in (IpAddress("10.0.1.1"), "10.0.1.1", int(IpAddress("10.0.1.1"))):
+            self.assertIs(self.router.findIfaceByIp(key), eth1)
+            self.assertTrue(self.router.isLocalIp(key))
+        self.assertIsNone(self.router.findIfaceByIp("10.0.1.2"))
+        self.assertFalse(self.router.isLocalIp("10.0.1.2"))
+
+        for key in (MacAddress("00:00:00:00:00:02"), "00:00:00:00:00:02", b'\0\0\0\0\0\2'):
+            self.assertEqual(self.router.findIfaceByMac(key).name, "eth2")
+        self.assertIsNone(self.router.findIfaceByMac("00:00:00:00:00:03"))
+
+        # indexes are replaced on reset as a whole, the previous index is not modified
+        previous = self.router.ifaceIndex
+        self.router.reset([Port("eth2", "00:00:00:00:00:12")])
+        self.assertIsNot(self.router.ifaceIndex, previous)
+        self.assertIs(previous.byName["eth1"], eth1)
+        self.assertEqual(previous.localIps, {int(IpAddress("10.0.1.1")), int(IpAddress("10.0.2.1"))})
+        self.assertIsNone(self.router.findIfaceByName("eth1"))
+        self.assertIsNone(self.router.findIfaceByMac("00:00:00:00:00:02"))
+        self.assertEqual(self.router.findIfaceByMac("00:00:00:00:00:12").name, "eth2")
+        self.assertEqual(self.router.localIps, {int(IpAddress("10.0.2.1"))})
+
+    def test_handle_packets(self):
+        """Batched delivery of received packets"""
+
+        injector = LocalPacketInjector([Port("eth1", "00:00:00:00:00:01"), Port("eth2", "00:00:00:00:00:02")])
+        injector.attach(self.router, batcher={"maxPackets": 64, "maxDelay": 10**6})
+        self.addCleanup(self.router.batcher.stop)
+        frames = [(b'%d' % i, "eth%d" % (i % 2 + 1)) for i in range(10)]
+
+        # other threads (e.g., ARP timers) can use the ARP cache while a batch is handled
+        blocked = []
+        def queueFromThread():
+            thread = threading.Thread(target=self.arpCache.queueRequest, args=(IpAddress("10.0.1.100"), b'packet', "eth1"))
+            thread.start()
+            thread.join(1)
+            blocked.append(thread.is_alive())
+        self.router.onPacket = queueFromThread
+
+        injector.deliver(frames, batchSize=4)
+        self.assertEqual(self.router.received, frames)
+        self.assertEqual(blocked, [False] * len(frames))
+        # replies to each batch are flushed together
+        self.assertEqual(injector.sent, frames)
+        self.assertEqual(injector.nSendCalls, 3)
+
+    def test_handle_packets_error(self):
+        """Error in one packet does not abort the rest of the batch"""
+
+        injector = LocalPacketInjector([Port("eth1", "00:00:00:00:00:01")])
+        injector.attach(self.router, batcher={"maxPackets": 64, "maxDelay": 10**6})
+        self.addCleanup(self.router.batcher.stop)
+        frames = [(b'%d' % i, "eth1") for i in range(4)]
+
+        def failOnSecond():
+            if len(self.router.received) == 2:
+                raise ValueError("malformed packet")
+        self.router.onPacket = failOnSecond
+
+        with self.assertLogs("riddikulus.simple_router_base", "ERROR"):
+            injector.deliver(frames, batchSize=4)
+        self.assertEqual(self.router.received, frames)
+        # replies to the other packets are still flushed at the end of the batch
+        self.assertEqual(injector.sent, frames[:1] + frames[2:])
+        self.assertEqual(injector.nSendCalls, 1)
+
+    def test_reload_routing_table(self):
+        """Reload routing table without losing ARP cache"""
+
+        router = EchoRouter(RoutingTableBase(), self.arpCache)
+        self.assertEqual(router.reloadRoutingTable(), "Routing table was not loaded from a file")
+        with tempfile.TemporaryDirectory() as tmp:
+            fileName = os.path.join(tmp, "RTABLE")
+            with open(fileName, "wt") as f:
+                f.write("10.0.1.0 0.0.0.0 255.255.255.0 eth1\n0.0.0.0 10.0.1.100 0.0.0.0 eth1\n")
+            router.loadRoutingTable(fileName)
+            self.arpCache.insertArpEntry("00:00:00:00:00:10", IpAddress("10.0.1.100"))
+            self.assertEqual(router.getRoutingTable().longestPrefixMatch(IpAddress("10.0.2.5")).ifName, "eth1")
+
+            with open(fileName, "wt") as f:
+                f.write("10.0.1.0 0.0.0.0 255.255.255.0 eth1\n10.0.2.0 0.0.0.0 255.255.255.0 eth2\n")
+            self.assertEqual(router.reloadRoutingTable(), "Reloaded %s: 1 entries added, 1 removed, 2 entries" % fileName)
+            self.assertEqual(router.getRoutingTable().longestPrefixMatch(IpAddress("10.0.2.5")).ifName, "eth2")
+            self.assertIsNone(router.getRoutingTable().longestPrefixMatch(IpAddress("8.8.8.8")))
+            self.assertIsNotNone(self.arpCache.lookup(IpAddress("10.0.1.100")))
+
+            os.unlink(fileName)
+            self.assertIn("Cannot reload routing table", router.reloadRoutingTable())
+            self.assertEqual(len(router.getRoutingTable().entries), 2)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,122 @@
+# -*- Mode: python; py-indent-offset: 4; indent-tabs-mode: nil; coding: utf-8; -*-
+# Copyright 2021 Alex Afanasyev
+#
+# This program is free software: you can redistribute it and/or modify it under the terms of
+# the GNU General Public License as published by the Free Software Foundation, either version
+# 3 of the License, or (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful, but WITHOUT ANY WARRANTY;
+# without even the implied warranty of MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.
+# See the GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License along with this program.
+# If not, see <http://www.gnu.org/licenses/>.
+
+
+import unittest
+import json
+from router_base.simple_router_base import SimpleRouterBase
+from router_base.routing_table_base import RoutingTableBase
+from router_base.arp_cache_base import ArpCacheBase
+from router_base.ip_address import IpAddress
+from router_base.local_injector import LocalPacketInjector, Port
+from router_base.stats import ForwardingStats, mergeStats, formatStats, RX_PACKETS, RX_BYTES, \
+    DROP_UNKNOWN_IFACE, DROP_NO_ROUTE
+
+class PingRouter(SimpleRouterBase):
+    '''
+    Answers every packet received on a known interface with an echo reply, drops the rest
+    '''
+    def handlePacket(self, packet, inIface):
+        iface = self.findIfaceByName(inIface)
+        if not iface:
+            self.countDrop(DROP_UNKNOWN_IFACE)
+            return
+        self.arpCache.lookup(IpAddress("10.0.1.100"))
+        self.sendPacket(iface.templates.echoReply(b'\0' * 6, "10.0.1.100", 1, 1, b''), inIface)
+
+class TestStats(unittest.TestCase):
+
+    def test_counters(self):
+        """Interface, drop and generated packet counters"""
+
+        stats = ForwardingStats()
+        stats.addInterfaces(["eth1"])
+        stats.received("eth1", 100)
+        stats.received("eth1", 60)
+        stats.received("eth9", 10) # not preallocated
+        stats.sent("eth1", 42)
+        stats.drop(DROP_NO_ROUTE)
+
+        self.assertEqual(list(stats.iface("eth1")), [2, 160, 1, 42])
+        self.assertEqual(stats.iface("eth9")[RX_PACKETS], 1)
+        snapshot = stats.snapshot()
+        self.assertEqual(snapshot['interfaces']['eth1'], {'rxPackets': 2, 'rxBytes': 160, 'txPackets': 1, 'txBytes': 42})
+        self.assertEqual(snapshot['drops']['no-route'], 1)
+        self.assertEqual(snapshot['drops']['ttl-expired'], 0)
+
+        stats.clear()
+        self.assertEqual(stats.snapshot()['interfaces']['eth1']['rxBytes'], 0)
+        self.assertEqual(stats.snapshot()['drops']['no-route'], 0)
+
+    def test_router_stats(self):
+        """Statistics collected by SimpleRouterBase"""
+
+        arpCache = ArpCacheBase()
+        self.addCleanup(arpCache.stop)
+        router = PingRouter(RoutingTableBase(), arpCache)
+        router.ifNameToIpMap = {"eth1": IpAddress("10.0.1.1"), "eth2": IpAddress("10.0.2.1")}
+        injector = LocalPacketInjector([Port("eth1", "00:00:00:00:00:01"), Port("eth2", "00:00:00:00:00:02"),
+                                        Port("eth3", "00:00:00:00:00:03")])
+        injector.attach(router)
+
+        injector.deliver([(b'\0' * 60, "eth1")] * 3 + [(b'\0' * 100, "eth3")])
+        arpCache.insertArpEntry("00:00:00:00:00:10", IpAddress("10.0.1.100"))
+        injector.deliver([(b'\0' * 60, "eth1")])
+
+        stats = router.getStats()
+        self.assertEqual(stats['interfaces']['eth1']['rxPackets'], 4)
+        self.assertEqual(stats['interfaces']['eth1']['rxBytes'], 240)
+        self.assertEqual(stats['interfaces']['eth1']['txPackets'], 4)
+        self.assertEqual(stats['interfaces']['eth1']['txBytes'], sum(len(packet) for packet, iface in injector.sent))
+        self.assertEqual(stats['interfaces']['eth2']['rxPackets'], 0) # preallocated by reset
+        self.assertEqual(stats['interfaces']['eth3']['rxPackets'], 1)
+        self.assertEqual(stats['drops']['unknown-iface'], 1)
+        self.assertEqual(stats['generated']['icmp-echo-reply'], 4)
+        self.assertEqual((stats['arp']['hits'], stats['arp']['misses'], stats['arp']['entries']), (1, 3, 1))
+        self.assertEqual(stats['arp']['hitRatio'], 0.25)
+
+        # packets of an unanswered request are counted when the request is given up
+        for ip in ("10.0.9.9", "10.0.9.10"):
+            arpCache.queueRequest(IpAddress(ip), b'\0' * 60, "eth1")
+            arpCache.queueRequest(IpAddress(ip), b'\0' * 60, "eth1")
+        answered = arpCache.insertArpEntry("00:00:00:00:00:11", IpAddress("10.0.9.10"))
+        arpCache.removeRequest(answered)
+        arpCache.removeRequest(arpCache.arpRequests[int(IpAddress("10.0.9.9"))])
+        self.assertEqual(router.getStats()['drops']['arp-unresolved'], 2)
+
+        # counters are kept across reset
+        router.reset([Port("eth1", "00:00:00:00:00:01")])
+        self.assertEqual(router.getStats()['interfaces']['eth1']['rxPackets'], 4)
+        self.assertEqual(router.getStats()['generated']['icmp-echo-reply'], 4)
+
+        text = formatStats(stats)
+        self.assertIn("unknown-iface", text)
+        self.assertRegex(text, r"eth1 +4 +240 +4")
+        self.assertEqual(json.loads(formatStats(stats, "json"))['drops']['unknown-iface'], 1)
+
+    def test_merge(self):
+        """Combining statistics of several routers"""
+
+        first = {'since': 10.0, 'interfaces': {'eth1': {'rxPackets': 1}}, 'drops': {'no-route': 2},
+                 'arp': {'hits': 1, 'misses': 1, 'hitRatio': 0.5}}
+        second = {'since': 5.0, 'interfaces': {'eth1': {'rxPackets': 2}, 'eth2': {'rxPackets': 3}}, 'drops': {'no-route': 1},
+                  'arp': {'hits': 2, 'misses': 0, 'hitRatio': 1.0}}
+        merged = mergeStats([first, second])
+        self.assertEqual(merged['since'], 5.0)
+        self.assertEqual(merged['interfaces'], {'eth1': {'rxPackets': 3}, 'eth2': {'rxPackets': 3}})
+        self.assertEqual(merged['drops'], {'no-route': 3})
+        self.assertEqual(merged['arp'], {'hits': 3, 'misses': 1, 'hitRatio': 0.75})
+
+if __name__ == '__main__':
+    unittest.main()
@@ -14,6 +14,7 @@
 
 import unittest
 import io
+import random
 from router_base import utils, headers
 
 class TestUtils(unittest.TestCase):
@@ -61,6 +62,51 @@ Unrecognized payload type [17] for IpHeader
             sum = utils.checksum(hdr.encode())
             self.assertEqual(sum, testData['sum'])
 
+    @staticmethod
+    def referenceChecksum(data):
+        sum = 0
+        for offset in range(0, len(data), 2):
+            sum = sum + int.from_bytes(data[offset:offset + 2].ljust(2, b'\0'), byteorder='big')
+        while sum > 0xffff:
+            sum = (sum >> 16) + (sum & 0xffff)
+        sum = ~sum & 0xffff
+        return sum if sum else 0xffff
+
+    def test_checksum_reference(self):
+        """Checksum matches word-by-word calculation"""
+        rng = random.Random(1)
+        buffers = [b'', b'\0', b'\0\0', b'\xff', b'\xff\xff', b'\xff\xff' * 3, b'\xff\xfe\x00\x01']
+        buffers += [bytes(rng.getrandbits(8) for i in range(rng.randrange(1, 1600))) for n in range(200)]
+        for data in buffers:
+            expected = TestUtils.referenceChecksum(data)
+            self.assertEqual(utils.checksum(data), expected)
+            self.assertEqual(utils.checksum(bytearray(data)), expected)
+            self.assertEqual(utils.checksum(memoryview(data)), expected)
+
+    def test_update_checksum(self):
+        """Incremental checksum update (RFC 1624)"""
+        rng = random.Random(2)
+        for n in range(500):
+            hdr = headers.IpHeader(ttl=rng.randrange(1, 256), p=rng.randrange(256), id=rng.randrange(65536),
+                                   src=rng.getrandbits(32), dst=rng.getrandbits(32), len=rng.randrange(65536))
+            hdr.sum = utils.checksum(hdr.encode())
+
+            word = hdr.ttl << 8 | hdr.p
+            newSum = utils.update_checksum(hdr.sum, word, word - 0x100)
+            hdr.ttl -= 1
+            hdr.sum = newSum
+            self.assertEqual(utils.checksum(hdr.encode()), 0xffff)
+            hdr.sum = 0
+            self.assertEqual(newSum, utils.checksum(hdr.encode()))
+
+            # 32-bit field
+            hdr.sum = newSum
+            newDst = rng.getrandbits(32)
+            newSum = utils.update_checksum(hdr.sum, int(hdr.dst), newDst)
+            hdr.dst = newDst
+            hdr.sum = 0
+            self.assertEqual(newSum, utils.checksum(hdr.encode()))
+
     def test_print_hdrs(self):
         """Check packet header printing"""
         for fname, testData in TestUtils.Files.items():
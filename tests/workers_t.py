@@ -0,0 +1,209 @@
+# -*- Mode: python; py-indent-offset: 4; indent-tabs-mode: nil; coding: utf-8; -*-
+# Copyright 2021 Alex Afanasyev
+#
+# This program is free software: you can redistribute it and/or modify it under the terms of
+# the GNU General Public License as published by the Free Software Foundation, either version
+# 3 of the License, or (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful, but WITHOUT ANY WARRANTY;
+# without even the implied warranty of MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.
+# See the GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License along with this program.
+# If not, see <http://www.gnu.org/licenses/>.
+
+import unittest
+import struct
+import threading
+import time
+import os
+from router_base.workers import ShmRing, WorkerPool, flowShard, PACKET, RESET, ALL_WORKERS
+from router_base.simple_router_base import SimpleRouterBase
+from router_base.routing_table_base import RoutingTableBase
+from router_base.arp_cache_base import ArpCacheBase
+from router_base.local_injector import Port
+from router_base.headers import EtherHeader, IpHeader, ArpHeader
+
+def ipFrame(src, dst, proto=17, sport=1000, dport=2000, off=0, seq=0):
+    ip = IpHeader(hl=5, len=20 + 8, off=off, ttl=64, p=proto, src=src, dst=dst)
+    return EtherHeader(type=0x0800).encode() + ip.encode() + struct.pack("!HHI", sport, dport, seq)
+
+class WorkerRouter(SimpleRouterBase):
+    '''
+    Returns every received packet on the incoming interface, prefixed with the worker's
+    number of known interfaces and ARP entries
+    '''
+    def __init__(self):
+        super().__init__(RoutingTableBase(), ArpCacheBase())
+
+    def handlePacket(self, packet, inIface):
+        if packet[12:14] == b'\x08\x06':
+            arp = ArpHeader()
+            arp.decode(packet, 14)
+            self.arpCache.insertArpEntry(arp.sha, arp.sip)
+        self.sendPacket(bytes([len(self.ifaces), len(self.arpCache.cacheEntries)]) + packet, inIface)
+
+class FragileRouter(WorkerRouter):
+    '''
+    WorkerRouter that fails on b'bad' frames and crashes the worker process on b'exit'
+    '''
+    def handlePacket(self, packet, inIface):
+        if packet == b'bad':
+            raise ValueError("malformed packet")
+        if packet == b'exit':
+            os._exit(3)
+        super().handlePacket(packet, inIface)
+
+class TestWorkers(unittest.TestCase):
+
+    def test_ring(self):
+        """Shared-memory SPSC ring"""
+
+        ring = ShmRing(256)
+        self.addCleanup(ring.close, True)
+        self.assertIsNone(ring.pop())
+
+        # wraps around many times
+        expected = []
+        received = []
+        for i in range(200):
+            record = (PACKET if i % 5 else RESET, "eth%d" % (i % 3), b'x' * (i % 37))
+            while not ring.push(*record):
+                received.append(ring.pop())
+            expected.append(record)
+        while True:
+            record = ring.wait(timeout=0)
+            if record is None:
+                break
+            received.append(record)
+        self.assertEqual(received, expected)
+
+        # full ring
+        while ring.push(PACKET, "eth1", b'y' * 50):
+            pass
+        self.assertEqual(ring.pop(), (PACKET, "eth1", b'y' * 50))
+        self.assertTrue(ring.push(PACKET, "eth1", b'y' * 50))
+
+        with self.assertRaises(RuntimeError):
+            ring.push(PACKET, "eth1", b'z' * 300)
+
+    def test_ring_wrap_near_end(self):
+        """Ring wraps when less than a record header is left before its end"""
+
+        ring = ShmRing(256)
+        self.addCleanup(ring.close, True)
+        # 10-byte header + 4-byte iface + 234-byte payload = 248 bytes, leaving 8 bytes
+        first = (PACKET, "eth1", b'a' * 234)
+        self.assertTrue(ring.push(*first))
+        self.assertEqual(ring.pop(), first)
+        self.assertEqual(ring.capacity - 248, 8)
+
+        for i in range(3):
+            record = (PACKET, "eth2", bytes([i]) * 20)
+            self.assertTrue(ring.push(*record))
+            self.assertEqual(ring.pop(), record)
+        self.assertIsNone(ring.pop())
+
+    def test_flow_shard(self):
+        """Flow hash sharding"""
+
+        for n in range(1, 5):
+            flow = [flowShard(ipFrame("10.0.1.1", "10.0.2.1", seq=i), n) for i in range(10)]
+            self.assertEqual(len(set(flow)), 1)
+            self.assertTrue(0 <= flow[0] < n)
+
+        # ports spread flows between the same hosts
+        shards = {flowShard(ipFrame("10.0.1.1", "10.0.2.1", sport=port), 4) for port in range(1000, 1100)}
+        self.assertEqual(shards, {0, 1, 2, 3})
+
+        # fragments (first one has MF flag) are sharded without ports
+        fragments = {flowShard(ipFrame("10.0.1.1", "10.0.2.1", sport=port, off=0x2000), 4) for port in range(1000, 1100)}
+        fragments.add(flowShard(ipFrame("10.0.1.1", "10.0.2.1", off=100), 4))
+        self.assertEqual(len(fragments), 1)
+
+        arp = ArpHeader(hln=6, pln=4, op=ArpHeader.Opcode.Reply, sip="10.0.1.1", tip="10.0.1.2")
+        self.assertEqual(flowShard(EtherHeader(type=0x0806).encode() + arp.encode(), 4), ALL_WORKERS)
+        arp.op = ArpHeader.Opcode.Request
+        self.assertEqual(len({flowShard(EtherHeader(type=0x0806).encode() + arp.encode(), 4) for i in range(3)}), 1)
+
+    def test_pool(self):
+        """Packets processed by worker processes"""
+
+        sent = []
+        done = threading.Event()
+        nPackets = 200
+        def send(packet, iface):
+            sent.append((packet, iface))
+            if len(sent) == nPackets + 3:
+                done.set()
+
+        props = {"RoutingTable": "tests/RTABLE", "Ifconfig": "IP_CONFIG"}
+        pool = WorkerPool(WorkerRouter, props, 3, send)
+        try:
+            pool.reset([Port("sw0-eth1", b'\0\0\0\0\0\1'), Port("sw0-eth2", b'\0\0\0\0\0\2')])
+            arp = ArpHeader(hln=6, pln=4, op=ArpHeader.Opcode.Reply, sha=b'\0\0\0\0\0\3', sip="10.0.1.100", tip="10.0.1.1")
+            pool.dispatch(EtherHeader(type=0x0806).encode() + arp.encode(), "sw0-eth3")
+
+            frames = [(ipFrame("10.0.1.%d" % (i % 7), "10.0.2.1", seq=i), "sw0-eth%d" % (i % 2 + 1)) for i in range(nPackets)]
+            pool.reloadRoutingTable() # runs next to packet processing in the workers
+            pool.dispatchMany(frames)
+            self.assertTrue(done.wait(30))
+
+            stats = pool.getStats()
+            self.assertEqual(sum(counters['rxPackets'] for counters in stats['interfaces'].values()), nPackets + 3)
+            self.assertEqual(sum(counters['txPackets'] for counters in stats['interfaces'].values()), nPackets + 3)
+            self.assertEqual(stats['interfaces']['sw0-eth1']['rxPackets'], nPackets // 2)
+            self.assertEqual(stats['drops']['worker-ring'], 0)
+        finally:
+            pool.stop()
+
+        self.assertEqual(pool.dropped, 0)
+        # ARP reply reached all workers, before the packets
+        self.assertEqual([packet[:2] for packet, iface in sent if iface == "sw0-eth3"], [b'\x02\x01'] * 3)
+        forwarded = [(packet[2:], iface) for packet, iface in sent if iface != "sw0-eth3"]
+        self.assertEqual({packet[:2] for packet, iface in sent if iface != "sw0-eth3"}, {b'\x02\x01'})
+        self.assertEqual(sorted(forwarded), sorted(frames))
+        # per-flow order is preserved
+        for src in range(7):
+            flow = [packet for packet, iface in forwarded if packet[26:30] == bytes([10, 0, 1, src])]
+            self.assertEqual(flow, [packet for packet, iface in frames if packet[26:30] == bytes([10, 0, 1, src])])
+
+    def test_pool_errors(self):
+        """Worker survives bad packets and control records, and is restarted if it exits"""
+
+        sent = []
+        def send(packet, iface):
+            sent.append((packet, iface))
+
+        def waitFor(condition):
+            deadline = time.monotonic() + 30
+            while not condition() and time.monotonic() < deadline:
+                time.sleep(0.01)
+            self.assertTrue(condition())
+
+        props = {"RoutingTable": "tests/RTABLE", "Ifconfig": "IP_CONFIG"}
+        pool = WorkerPool(FragileRouter, props, 1, send)
+        try:
+            pool.reset([Port("sw0-eth1", b'\0\0\0\0\0\1'), Port("sw0-eth2", b'\0\0\0\0\0\2')])
+            # exceptions in packets and control records are logged by the worker
+            pool.dispatchMany([(b'one', "sw0-eth1"), (b'bad', "sw0-eth1"), (b'two', "sw0-eth2")])
+            pool.ingress[0].pushWait(RESET, "", b'not a pickle')
+            pool.dispatch(b'three', "sw0-eth1")
+            waitFor(lambda: len(sent) == 3)
+            self.assertEqual(sent, [(b'\x02\x00one', "sw0-eth1"), (b'\x02\x00two', "sw0-eth2"), (b'\x02\x00three', "sw0-eth1")])
+            self.assertEqual(pool.restarts, 0)
+
+            # worker that exited is restarted with the current interfaces
+            with self.assertLogs("riddikulus.workers", "ERROR"):
+                pool.dispatch(b'exit', "sw0-eth1")
+                waitFor(lambda: pool.restarts == 1)
+            pool.dispatch(b'four', "sw0-eth2")
+            waitFor(lambda: len(sent) == 4)
+            self.assertEqual(sent[3], (b'\x02\x00four', "sw0-eth2"))
+            self.assertEqual(pool.getStats()['interfaces']['sw0-eth2']['rxPackets'], 1)
+        finally:
+            pool.stop()
+        self.assertEqual(pool.restarts, 1)
+
+if __name__ == '__main__':
+    unittest.main()